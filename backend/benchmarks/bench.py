@@ -0,0 +1,290 @@
+"""
+Reproducible benchmarks for LanceDBManager and the HTTP API.
+
+Generates synthetic local Lance tables with the deterministic simple embedder, times every manager
+method and HTTP endpoint, and writes the latency percentiles and throughput to a JSON file that
+compare.py can diff against the results of another commit.
+
+    python benchmarks/bench.py --scales 10k --dims 64
+    python benchmarks/bench.py --scales 10k,1m --dims 64,1536 --iterations 50 --output results/main.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+
+# the backend modules import each other relative to src/
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "src"))
+
+from lancedb.embeddings import get_registry  # noqa: E402
+import embeddings  # noqa: E402,F401  registers the simple embedder
+from routes.manager import LanceDBManager  # noqa: E402
+from routes.setup import AppConfig, DatabaseConfig  # noqa: E402
+from storage.provider import StorageConfig  # noqa: E402
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+CATEGORIES = ["greeting", "question", "farewell", "statement", "verse", "docs"]
+GENERATE_BATCH_ROWS = 50_000
+
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value)
+
+
+def table_name(rows: int, dims: int) -> str:
+    return f"bench_{rows}_{dims}"
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--", "src"], cwd=BACKEND_DIR, text=True).strip())
+        return commit, dirty
+    except Exception:
+        return None, None
+
+
+def generate_table(manager: LanceDBManager, rows: int, dims: int, seed: int):
+    """Create a table of `rows` synthetic documents with `dims`-dimensional vectors unless it already exists"""
+    name = table_name(rows, dims)
+    if name in manager.list_tables() and manager.get_table(name).count_rows() == rows:
+        print(f"reusing {name}")
+        return name
+
+    embedder = get_registry().get("simple").create(dims=dims)
+    rng = np.random.default_rng(seed)
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.string()),
+        ("text", pa.string()),
+        ("category", pa.string()),
+        ("score", pa.float64()),
+        ("vector", pa.list_(pa.float32(), dims)),
+    ])
+    manager.create_table(name, schema=schema, overwrite=True)
+    table = manager.get_table(name)
+    started = time.perf_counter()
+    for start in range(0, rows, GENERATE_BATCH_ROWS):
+        ids = np.arange(start, min(start + GENERATE_BATCH_ROWS, rows))
+        texts = [f"synthetic document {i}" for i in ids]
+        vectors = np.asarray(embedder.generate_embeddings(texts), dtype=np.float32)
+        table.add(pa.table({
+            "id": pa.array(ids, pa.int64()),
+            "user_id": pa.array([f"key-{i:012d}" for i in ids]),
+            "text": pa.array(texts),
+            "category": pa.array(rng.choice(CATEGORIES, len(ids))),
+            "score": pa.array(rng.random(len(ids))),
+            "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), dims),
+        }, schema=schema))
+    print(f"generated {name} in {time.perf_counter() - started:.1f}s")
+    return name
+
+
+def measure(fn, iterations: int, warmup: int, concurrency: int = 1):
+    """Run fn warmup + iterations times and return latency percentiles in ms and throughput in ops/s"""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+
+    def timed(i):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(timed, range(iterations)))
+    else:
+        for i in range(iterations):
+            timed(i)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "mean_ms": statistics.fmean(latencies),
+        "min_ms": latencies[0],
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": latencies[-1],
+        "throughput_ops": iterations / wall if wall else None,
+    }
+
+
+def manager_benchmarks(manager: LanceDBManager, name: str, rows: int, dims: int):
+    """Benchmarks of the manager methods as (name, fn(i)) pairs"""
+    embedder = get_registry().get("simple").create(dims=dims)
+    manager.embedder = embedder
+    deep_page = max(1, rows // 10 // 2)
+    added_base = rows + 1_000_000_000
+
+    def add_batch(i):
+        # half of every batch already exists, so the dedup path does real work
+        records = []
+        for j in range(20):
+            row_id = (i * 10 + j) if j < 10 else added_base + i * 10 + j
+            text = f"synthetic document {row_id}"
+            records.append({
+                "id": row_id,
+                "user_id": f"key-{row_id:012d}",
+                "text": text,
+                "category": CATEGORIES[j % len(CATEGORIES)],
+                "score": 0.5,
+                "vector": embedder.generate_embeddings([text])[0].astype(np.float32),
+            })
+        manager.add_data(name, records, unique_field="user_id")
+
+    return [
+        ("fetch_data.first_page", lambda i: manager.fetch_data(name, page=1, per_page=10, columns_to_exclude=["vector"])),
+        ("fetch_data.deep_page", lambda i: manager.fetch_data(name, page=deep_page, per_page=10, columns_to_exclude=["vector"])),
+        ("fetch_data.filtered", lambda i: manager.fetch_data(name, page=1, per_page=10, filter="category = 'verse' AND score > 0.5", columns_to_exclude=["vector"])),
+        ("fetch_data.with_vectors", lambda i: manager.fetch_data(name, page=1, per_page=100)),
+        ("vector_search", lambda i: manager.vector_search(name, f"synthetic document {i * 7919 % rows}", limit=10, columns_to_exclude=["vector"])),
+        ("add_data.dedup", add_batch),
+        ("update_data", lambda i: manager.update_data(name, [{"user_id": f"key-{(i * 104729) % rows:012d}", "score": float(i)}], unique_field="user_id")),
+    ], lambda: manager.delete_rows(name, f"id >= {added_base}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ApiServer:
+    """Serve the FastAPI app with uvicorn on a background thread, pointed at the benchmark manager"""
+
+    def __init__(self, manager: LanceDBManager):
+        import uvicorn
+        import main
+        from routes import router_database
+
+        router_database.db_manager = manager
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def http_benchmarks(base_url: str, name: str, rows: int):
+    import requests
+
+    session = requests.Session()
+    deep_page = max(1, rows // 10 // 2)
+
+    def get(path, **params):
+        def call(i):
+            response = session.get(base_url + path, params=params)
+            response.raise_for_status()
+        return call
+
+    def vector_search(i):
+        response = session.post(base_url + "/api/vector-search/", json={
+            "table": name, "query": f"synthetic document {i * 7919 % rows}", "limit": 10, "columns_to_exclude": "vector",
+        })
+        response.raise_for_status()
+
+    return [
+        ("GET /api/fetch-data.first_page", get(f"/api/fetch-data/{name}/", per_page=10, columns_to_exclude="vector")),
+        ("GET /api/fetch-data.deep_page", get(f"/api/fetch-data/{name}/", page=deep_page, per_page=10, columns_to_exclude="vector")),
+        ("GET /api/fetch-data.filtered", get(f"/api/fetch-data/{name}/", per_page=10, filter="category = 'verse' AND score > 0.5", columns_to_exclude="vector")),
+        ("GET /api/fetch-data.with_vectors", get(f"/api/fetch-data/{name}/", per_page=100)),
+        ("POST /api/vector-search", vector_search),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10k", help="Comma separated row counts, e.g. 10k,1m,10m")
+    parser.add_argument("--dims", default="64", help="Comma separated vector dimensions, e.g. 64,768,1536")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel callers for the HTTP benchmarks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-path", default=os.path.join(BACKEND_DIR, "benchmarks", "data"), help="Where the synthetic tables are kept between runs")
+    parser.add_argument("--output", default=None, help="Result file, defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--only", default=None, help="Only run benchmarks whose name contains this string")
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=args.db_path))))
+    results = []
+
+    def record(suite, bench_name, rows, dims, stats):
+        results.append({"suite": suite, "name": bench_name, "rows": rows, "dims": dims, **stats})
+        print(f"{suite:8} {bench_name:34} rows={rows:<9} dims={dims:<5} p50={stats['p50_ms']:9.2f}ms "
+              f"p99={stats['p99_ms']:9.2f}ms {stats['throughput_ops']:9.1f} ops/s")
+
+    for scale in args.scales.split(","):
+        rows = parse_scale(scale)
+        for dims in (int(d) for d in args.dims.split(",")):
+            name = generate_table(manager, rows, dims, args.seed)
+            benchmarks, cleanup = manager_benchmarks(manager, name, rows, dims)
+            try:
+                for bench_name, fn in benchmarks:
+                    if args.only and args.only not in bench_name:
+                        continue
+                    record("manager", bench_name, rows, dims, measure(fn, args.iterations, args.warmup))
+            finally:
+                cleanup()
+
+            if args.skip_http:
+                continue
+            with ApiServer(manager) as base_url:
+                for bench_name, fn in http_benchmarks(base_url, name, rows):
+                    if args.only and args.only not in bench_name:
+                        continue
+                    record("http", bench_name, rows, dims, measure(fn, args.iterations, args.warmup, args.concurrency))
+
+    import lancedb
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"{(commit or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "dirty": dirty,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "lancedb": lancedb.__version__,
+                "args": vars(args),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"wrote {output}")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
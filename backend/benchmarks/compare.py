@@ -0,0 +1,56 @@
+"""
+Compare two benchmark result files written by bench.py.
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 10
+
+Exits with status 1 when any benchmark's p50 or p99 got slower than the threshold (in percent).
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data["meta"], {(r["suite"], r["name"], r["rows"], r["dims"]): r for r in data["results"]}
+
+
+def change(base, head):
+    return (head - base) / base * 100 if base else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent")
+    args = parser.parse_args(argv)
+
+    base_meta, base = load(args.base)
+    head_meta, head = load(args.head)
+    print(f"base {base_meta.get('commit')}  head {head_meta.get('commit')}")
+    print(f"{'benchmark':60} {'p50 base':>10} {'p50 head':>10} {'Δp50':>8} {'p99 base':>10} {'p99 head':>10} {'Δp99':>8}")
+
+    regressions = []
+    for key in sorted(set(base) & set(head)):
+        b, h = base[key], head[key]
+        p50, p99 = change(b["p50_ms"], h["p50_ms"]), change(b["p99_ms"], h["p99_ms"])
+        flag = ""
+        if p50 > args.threshold or p99 > args.threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        label = f"{key[0]}:{key[1]} rows={key[2]} dims={key[3]}"
+        print(f"{label:60} {b['p50_ms']:10.2f} {h['p50_ms']:10.2f} {p50:7.1f}% {b['p99_ms']:10.2f} {h['p99_ms']:10.2f} {p99:7.1f}%{flag}")
+
+    for key in sorted(set(base) ^ set(head)):
+        print(f"only in {'base' if key in base else 'head'}: {key}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than {args.threshold}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Import-time and startup-time report for the backend.
+
+Imports the app in a fresh interpreter with `-X importtime`, runs its startup, and reports the total
+import and startup time, the slowest packages and modules, and whether any cloud SDK was loaded for a
+configuration that doesn't need it. Exits non-zero when the startup budget is exceeded or a provider
+SDK leaked into a local startup, so it can guard container cold start in CI.
+
+    python benchmarks/startup.py --budget-ms 4000
+    STORAGE_PROVIDER=s3 python benchmarks/startup.py --allow boto3
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC_DIR = os.path.join(BACKEND_DIR, "src")
+
+# Modules that only the Azure/OpenAI/S3 providers need
+PROVIDER_MODULES = ("openai", "azure.identity", "azure.storage.blob", "azure.keyvault.secrets", "boto3", "botocore")
+
+_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def start():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(start())
+ready = time.perf_counter()
+print("STARTUP_REPORT" + json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - started) * 1000,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_probe(python: str):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", _PROBE],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True,
+    )
+    report_line = next((line for line in result.stdout.splitlines() if line.startswith("STARTUP_REPORT")), None)
+    if result.returncode != 0 or report_line is None:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"startup probe failed with exit code {result.returncode}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            imports.append({"module": match.group(4), "self_us": int(match.group(1)), "cumulative_us": int(match.group(2))})
+    return json.loads(report_line[len("STARTUP_REPORT"):]), imports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", 5000)),
+                        help="Fail when startup takes longer than this (default: $STARTUP_BUDGET_MS or 5000)")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages and modules to list")
+    parser.add_argument("--allow", action="append", default=[], help="Provider module that may be loaded, e.g. boto3")
+    parser.add_argument("--json", dest="json_output", default=None, help="Also write the report to this file")
+    parser.add_argument("--python", default=sys.executable)
+    args = parser.parse_args(argv)
+
+    report, imports = run_probe(args.python)
+
+    packages = defaultdict(int)
+    for entry in imports:
+        packages[entry["module"].split(".")[0]] += entry["self_us"]
+    top_packages = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    top_modules = sorted(imports, key=lambda entry: entry["self_us"], reverse=True)[:args.top]
+
+    loaded_providers = [
+        name for name in PROVIDER_MODULES
+        if name in report["modules"] and not any(name.startswith(allowed) for allowed in args.allow)
+    ]
+
+    print(f"import  {report['import_ms']:8.0f} ms")
+    print(f"startup {report['startup_ms']:8.0f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"\nslowest packages (self time)")
+    for package, self_us in top_packages:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+    print(f"\nslowest modules (self time)")
+    for entry in top_modules:
+        print(f"  {entry['self_us'] / 1000:8.1f} ms  {entry['module']}")
+
+    failures = []
+    if report["startup_ms"] > args.budget_ms:
+        failures.append(f"startup took {report['startup_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if loaded_providers:
+        failures.append(f"provider SDKs loaded without being configured: {', '.join(loaded_providers)}")
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({
+                "import_ms": report["import_ms"],
+                "startup_ms": report["startup_ms"],
+                "budget_ms": args.budget_ms,
+                "packages": [{"package": p, "self_ms": us / 1000} for p, us in top_packages],
+                "modules": [{"module": e["module"], "self_ms": e["self_us"] / 1000} for e in top_modules],
+                "loaded_provider_modules": loaded_providers,
+                "failures": failures,
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
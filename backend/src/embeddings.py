@@ -1,20 +1,20 @@
+import hashlib
 import logging
 from typing import List, Union
 import numpy as np
 from functools import cached_property
-from openai import AzureOpenAI
 from lancedb.embeddings import TextEmbeddingFunction
 from lancedb.embeddings.registry import register
-from azure.identity import DefaultAzureCredential
-from routes.setup import AzureOpenAiConfig
+from routes.setup import TEXT_EMBEDDING_DEPLOYMENT
 
-openai_config = AzureOpenAiConfig()
+# openai and azure.identity are only imported once the Azure embedder is actually created,
+# so EMBEDDER_PROVIDER=simple never loads them
 
 @register("azure_openai")
 class AzureOpenAIEmbeddings(TextEmbeddingFunction):
     """Azure OpenAI embeddings implementation"""
     
-    name: str = openai_config.text_embedder_lagre.deployment_name
+    name: str = TEXT_EMBEDDING_DEPLOYMENT
     
     def __init__(self):
         try:
@@ -36,7 +36,7 @@ class AzureOpenAIEmbeddings(TextEmbeddingFunction):
         self.azure_api_version = self.config.text_embedder_lagre.api_version
 
     def ndims(self) -> int:
-        return openai_config.text_embedder_lagre.ndims
+        return self.config.text_embedder_lagre.ndims
 
     def generate_embeddings(self, texts: Union[List[str], np.ndarray]) -> List[np.array]:
         try:
@@ -51,9 +51,10 @@ class AzureOpenAIEmbeddings(TextEmbeddingFunction):
 
     @cached_property
     def _azure_openai_client(self):
+        from openai import AzureOpenAI
         return AzureOpenAI(
-            azure_endpoint=openai_config.endpoint,
-            api_version=openai_config.api_version,
+            azure_endpoint=self.config.endpoint,
+            api_version=self.config.api_version,
             api_key=self.azure_api_key,
             max_retries=5,
         )
@@ -62,9 +63,9 @@ class AzureOpenAIEmbeddings(TextEmbeddingFunction):
 class SimpleEmbeddings(TextEmbeddingFunction):
     """Simple embeddings for testing - uses hash of text"""
     
-    def __init__(self):
-        super().__init__()
-        self._dimensions = 64  # Small dimension for testing
+    def __init__(self, dims: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self._dimensions = dims  # Small dimension for testing by default
         
     def ndims(self) -> int:
         return self._dimensions
@@ -82,10 +83,11 @@ class SimpleEmbeddings(TextEmbeddingFunction):
             
         embeddings = []
         for text in texts:
-            # Create a bounded hash value (between 0 and 2**32 - 1)
-            hash_val = hash(text) & 0xFFFFFFFF  # Mask to 32 bits
-            np.random.seed(hash_val)
-            embedding = np.random.normal(0, 1, self._dimensions)
+            # Seed from a sha256 of the text rather than hash(), which is salted per process,
+            # so the same text gets the same vector across restarts and benchmark runs
+            seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+            rng = np.random.default_rng(seed)
+            embedding = rng.normal(0, 1, self._dimensions)
             # Normalize the embedding
             embedding = embedding / np.linalg.norm(embedding)
             embeddings.append(embedding)
@@ -1,11 +1,17 @@
+import time
+# Taken before any other import so the startup report covers the import time of the app as well
+STARTUP_STARTED = time.perf_counter()
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 # routes for the API
-from routes import router_database
+from routes import router_changes, router_database, router_jobs, router_metrics, router_sql
+from routes.metrics import MetricsMiddleware, REGISTRY, Gauge
+from routes.compression import CompressionMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG,
@@ -14,14 +20,41 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+startup_seconds = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_seconds[()] = time.perf_counter() - STARTUP_STARTED
+    logger.info(f"Startup completed in {startup_seconds[()] * 1000:.0f} ms")
+    # picks up the jobs queued or interrupted before a restart
+    router_jobs.jobs.start()
+    yield
+    router_jobs.jobs.shutdown()
+    # commits the rows still waiting in write buffers
+    router_database.get_db_manager().flush_write_buffers()
+
+
+REGISTRY.register(Gauge(
+    "lancedb_startup_seconds",
+    "Time from the first import of the app until it was ready to serve requests.",
+    (),
+    lambda: startup_seconds,
+))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="LanceDB API",
     description="API for LanceDB Viewer project",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 app.include_router(router_database.router)
+app.include_router(router_metrics.router)
+app.include_router(router_changes.router)
+app.include_router(router_sql.router)
+app.include_router(router_jobs.router)
 
 # CORS middleware configuration
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -32,7 +65,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # lets the viewer read the version tag of fetch-data responses
+    expose_headers=["ETag"],
 )
+# a manager replaced by /api/connect/ is closed only after the responses using it were sent
+app.add_middleware(router_database.ManagerLeaseMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Outermost so the recorded latency covers CORS handling and compression as well
+app.add_middleware(MetricsMiddleware)
 
 
 # Tailwind HTML Template
@@ -78,5 +118,18 @@ async def home(request: Request):
 
 # Run the FastAPI app
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the LanceDB Viewer backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("LANCEDB_WORKERS", 0)),
+        help="Worker processes for production. Without it one process runs and reloads on code changes.",
+    )
+    args = parser.parse_args()
+    if args.workers:
+        # the workers share the active connection and the job queue through LANCEDB_STATE_DIR
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
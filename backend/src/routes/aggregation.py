@@ -0,0 +1,190 @@
+"""
+Group-by aggregations streamed over the Lance scanner.
+
+Only the group keys and aggregated columns are scanned. Every batch is reduced to one partial row per
+group, which is merged into the running partials right away, so memory follows the number of groups
+instead of the number of rows. Means are carried as a sum and a count and divided at the end.
+
+    {"group_by": ["book_name"],
+     "aggregates": [{"op": "count"}, {"op": "mean", "column": "score", "as": "avg_score"}]}
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from routes.metrics import record_cache
+from routes.sorting import parse_order_by
+
+AGGREGATE_OPS = ("count", "sum", "mean", "min", "max")
+# how partial results of a batch are folded into the running partials
+_MERGE = {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+# rows per scanned batch, each is reduced to its groups before the next one is read
+SCAN_BATCH_ROWS = 65536
+# aggregation results kept per table version
+AGGREGATE_CACHE_SIZE = int(os.getenv("LANCEDB_AGGREGATE_CACHE_SIZE", 128))
+
+
+class AggregationError(ValueError):
+    """An aggregation request that is malformed or doesn't match the table schema"""
+
+
+class Aggregation:
+    """A validated group-by request, see the module docstring"""
+
+    def __init__(self, schema: pa.Schema, group_by: List[str], aggregates: List[Dict[str, Any]]):
+        if not isinstance(group_by, list) or not all(isinstance(column, str) for column in group_by):
+            raise AggregationError("group_by must be a list of column names")
+        if not isinstance(aggregates, list) or not aggregates:
+            raise AggregationError("aggregates must be a non-empty list")
+        self.group_by = group_by
+        for column in group_by:
+            data_type = _column_type(schema, column)
+            if pa.types.is_nested(data_type):
+                raise AggregationError(f"Can't group by '{column}' of type {data_type}")
+
+        self.outputs: List[Tuple[str, str, List[str]]] = []  # (name, op, partials)
+        self._partials: "OrderedDict[str, Tuple[str, str, Any]]" = OrderedDict()  # name -> (column, function, options)
+        for aggregate in aggregates:
+            if not isinstance(aggregate, dict) or aggregate.get("op") not in AGGREGATE_OPS:
+                raise AggregationError(f"Aggregates need an op, one of {', '.join(AGGREGATE_OPS)}: {aggregate!r}")
+            op, column = aggregate["op"], aggregate.get("column")
+            if column is None and op != "count":
+                raise AggregationError(f"'{op}' needs a column")
+            if column is not None:
+                data_type = _column_type(schema, column)
+                if op in ("sum", "mean") and not (pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type)):
+                    raise AggregationError(f"Can't {op} '{column}' of type {data_type}")
+                if op in ("min", "max") and pa.types.is_nested(data_type):
+                    raise AggregationError(f"Can't {op} '{column}' of type {data_type}")
+            name = aggregate.get("as") or (f"{op}_{column}" if column else op)
+            if name in group_by or name in [output[0] for output in self.outputs]:
+                raise AggregationError(f"Duplicate output column '{name}'")
+            if op == "mean":
+                partials = [self._partial(column, "sum"), self._partial(column, "count")]
+            else:
+                partials = [self._partial(column, op)]
+            self.outputs.append((name, op, partials))
+
+        referenced = list(group_by) + [column for column, _, _ in self._partials.values() if column is not None]
+        self.columns = list(dict.fromkeys(referenced))
+
+    def _partial(self, column: Optional[str], function: str) -> str:
+        name = f"{column if column is not None else '*'}:{function}"
+        if name not in self._partials:
+            options = pc.CountOptions(mode="all") if column is None else None
+            self._partials[name] = (column, function, options)
+        return name
+
+    def key(self) -> Hashable:
+        return (tuple(self.group_by), tuple((name, op, tuple(partials)) for name, op, partials in self.outputs))
+
+    def _reduce(self, table: pa.Table, aggregations, names: List[str]) -> pa.Table:
+        result = table.group_by(self.group_by, use_threads=False).aggregate(aggregations)
+        keys_first = result.column_names[:len(self.group_by)] == self.group_by
+        columns = self.group_by + names if keys_first else names + self.group_by
+        return result.rename_columns(columns).select(self.group_by + names)
+
+    def partial(self, batch: pa.RecordBatch) -> pa.Table:
+        """Reduce one batch to a row of partial aggregates per group"""
+        table = pa.Table.from_batches([batch])
+        # count(*) counts the rows of any scanned column, nulls included
+        any_column = self.columns[0]
+        aggregations = [
+            (column if column is not None else any_column, function, options) if options is not None else (column, function)
+            for column, function, options in self._partials.values()
+        ]
+        return self._reduce(table, aggregations, list(self._partials))
+
+    def merge(self, partials: pa.Table) -> pa.Table:
+        """Fold partial rows of the same group into one"""
+        names = list(self._partials)
+        return self._reduce(partials, [(name, _MERGE[self._partials[name][1]]) for name in names], names)
+
+    def counted(self, rows: int) -> pa.Table:
+        """The result of a global aggregate that only counts rows, answered without a scan"""
+        return self.finish(pa.table({name: pa.array([rows], pa.int64()) for name in self._partials}))
+
+    def finish(self, partials: Optional[pa.Table]) -> pa.Table:
+        """Final result columns from the merged partials"""
+        if partials is None:
+            if self.group_by:
+                return pa.table({name: [] for name in self.group_by + [output[0] for output in self.outputs]})
+            # no row matched, a global aggregate still has its one row
+            partials = pa.table({name: pa.array([0 if function == "count" else None], pa.int64() if function == "count" else pa.null())
+                                 for name, (_, function, _) in self._partials.items()})
+        columns = {name: partials.column(name) for name in self.group_by}
+        for name, op, parts in self.outputs:
+            if op == "mean":
+                total, count = partials.column(parts[0]), partials.column(parts[1])
+                columns[name] = pc.divide(pc.cast(total, pa.float64()), pc.if_else(pc.equal(count, 0), None, pc.cast(count, pa.float64())))
+            else:
+                columns[name] = partials.column(parts[0])
+        return pa.table(columns)
+
+
+def _column_type(schema: pa.Schema, column: str) -> pa.DataType:
+    index = schema.get_field_index(column)
+    if index < 0:
+        raise AggregationError(f"Unknown column '{column}'")
+    return schema.field(index).type
+
+
+def aggregate_batches(aggregation: Aggregation, batches: Iterable[pa.RecordBatch]) -> pa.Table:
+    """
+    Run an aggregation over a stream of batches, holding only the partial rows of the groups seen so far.
+
+    Returns:
+        pa.Table: One row per group with the group keys and the aggregate columns.
+    """
+    merged = None
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        partial = aggregation.partial(batch)
+        merged = partial if merged is None else aggregation.merge(pa.concat_tables([merged, partial]))
+    return aggregation.finish(merged)
+
+
+def order_and_limit(result: pa.Table, group_by: List[str], order_by: Optional[str], limit: Optional[int]) -> pa.Table:
+    """Sort the groups, by their keys unless `order_by` names result columns, and keep the first `limit`"""
+    if order_by:
+        sort_keys = parse_order_by(order_by, result.schema)[:-1]  # no _rowid to break ties on here
+    else:
+        sort_keys = [(column, "ascending") for column in group_by]
+    if sort_keys and result.num_rows > 1:
+        result = result.take(pc.sort_indices(result, sort_keys=sort_keys))
+    return result.slice(0, limit) if limit is not None else result
+
+
+class ResultCache:
+    """LRU cache of small results that belong to one table version, so they never go stale"""
+
+    def __init__(self, name: str, max_entries: int = AGGREGATE_CACHE_SIZE):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        record_cache(self.name, value is not None)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table_name: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == table_name]:
+                del self._entries[key]
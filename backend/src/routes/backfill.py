@@ -0,0 +1,146 @@
+"""
+Resumable backfill of the vector column of an existing table.
+
+Only rows whose vector is missing, or was made by another model when a model column is tracked, are read,
+and only their key and text. Each chunk is embedded in concurrent batches and written back with one
+merge_insert of the key, vector (and model) columns, which is one commit per chunk.
+
+Progress is checkpointed after every commit. Committed rows no longer match the pending filter, so a
+backfill that crashed or was stopped simply starts again and continues with the rows that are left.
+"""
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, List, Optional
+
+import pyarrow as pa
+
+from routes.filters import quote_identifier, quote_literal
+
+# rows per merge_insert commit
+BACKFILL_CHUNK_ROWS = int(os.getenv("LANCEDB_BACKFILL_CHUNK_ROWS", 2048))
+# texts per embedding call, the batches of a chunk are embedded concurrently
+EMBED_BATCH_ROWS = int(os.getenv("LANCEDB_BACKFILL_EMBED_BATCH_ROWS", 128))
+
+
+def embedder_model(embedder) -> str:
+    """Identifies the model vectors were made with, a new model or dimension makes old vectors stale"""
+    return f"{getattr(embedder, 'name', None) or type(embedder).__name__}/{embedder.ndims()}"
+
+
+@dataclass
+class BackfillCheckpoint:
+    """Progress of a backfill, saved after every committed chunk"""
+    table: str
+    source_column: str
+    vector_column: str
+    model: str
+    model_column: Optional[str] = None
+    status: str = "running"  # running, stopped, failed, done
+    rows_total: int = 0
+    rows_done: int = 0
+    chunks: int = 0
+    version: Optional[int] = None  # table version after the last commit
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    error: Optional[str] = None
+
+    @staticmethod
+    def path(directory: str, table: str, vector_column: str) -> str:
+        return os.path.join(directory, "backfill", f"{table}.{vector_column}.json")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BackfillCheckpoint"]:
+        try:
+            with open(path) as f:
+                return cls(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable backfill checkpoint {path}: {e}")
+            return None
+
+    def save(self, path: str):
+        self.updated_at = time.time()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + ".partial"
+        with open(partial, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(partial, path)
+
+    def to_dict(self) -> dict:
+        progress = self.rows_done / self.rows_total if self.rows_total else 1.0
+        elapsed = self.updated_at - self.started_at
+        rate = self.rows_done / elapsed if elapsed > 0 else 0.0
+        return {
+            **asdict(self),
+            "progress": progress,
+            "eta_seconds": (self.rows_total - self.rows_done) / rate if rate and self.status == "running" else None,
+        }
+
+
+def pending_filter(source_column: str, vector_column: str, model_column: str = None, model: str = None) -> str:
+    """Rows that have text but no vector, or a vector of another model"""
+    stale = f"{quote_identifier(vector_column)} IS NULL"
+    if model_column:
+        stale += f" OR {quote_identifier(model_column)} IS NULL OR {quote_identifier(model_column)} != {quote_literal(model)}"
+    return f"{quote_identifier(source_column)} IS NOT NULL AND ({stale})"
+
+
+def run_backfill(
+    snapshot,
+    key: str,
+    checkpoint: BackfillCheckpoint,
+    checkpoint_path: str,
+    embed_batches: Callable[[List[List[str]]], List[List[Any]]],
+    write: Callable[[pa.Table], int],
+    vector_type: pa.DataType,
+    should_stop: Callable[[], bool] = None,
+    on_progress: Callable[[BackfillCheckpoint], None] = None,
+) -> BackfillCheckpoint:
+    """
+    Embed the pending rows of a table snapshot chunk by chunk.
+
+    Args:
+        snapshot (lancedb.table.Table): The table checked out at the version the backfill started from.
+        key (str): Unique column the vectors are merged back on.
+        checkpoint (BackfillCheckpoint): Progress so far, updated and saved after every chunk.
+        checkpoint_path (str): Where the checkpoint is saved.
+        embed_batches (Callable): Embeds a list of text batches, returning their vectors in order.
+        write (Callable): Merges a table of key, vector (and model) columns, returning the new version.
+        vector_type (pa.DataType): Type of the vector column.
+        should_stop (Callable): Polled between chunks, stops the backfill (resumable) when it returns True.
+        on_progress (Callable): Called with the checkpoint after every chunk.
+
+    Returns:
+        BackfillCheckpoint: The final progress, with status done or stopped.
+    """
+    pending = pending_filter(checkpoint.source_column, checkpoint.vector_column, checkpoint.model_column, checkpoint.model)
+    query = snapshot.search().select([key, checkpoint.source_column]).where(pending).limit(None)
+    for batch in query.to_batches(BACKFILL_CHUNK_ROWS):
+        if should_stop is not None and should_stop():
+            checkpoint.status = "stopped"
+            break
+        if batch.num_rows == 0:
+            continue
+        texts = [str(text) for text in batch.column(checkpoint.source_column).to_pylist()]
+        batches = [texts[start:start + EMBED_BATCH_ROWS] for start in range(0, len(texts), EMBED_BATCH_ROWS)]
+        vectors = [vector for embedded in embed_batches(batches) for vector in embedded]
+        columns = {
+            key: batch.column(key),
+            checkpoint.vector_column: pa.array([list(map(float, vector)) for vector in vectors], vector_type),
+        }
+        if checkpoint.model_column:
+            columns[checkpoint.model_column] = pa.array([checkpoint.model] * batch.num_rows, pa.string())
+        checkpoint.version = write(pa.table(columns))
+        checkpoint.rows_done += batch.num_rows
+        checkpoint.chunks += 1
+        checkpoint.save(checkpoint_path)
+        if on_progress is not None:
+            on_progress(checkpoint)
+    else:
+        checkpoint.status = "done"
+    checkpoint.save(checkpoint_path)
+    return checkpoint
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# seconds between version checks of a watched table
+POLL_INTERVAL_SECONDS = float(os.getenv("LANCEDB_CHANGE_FEED_POLL_SECONDS", 1.0))
+# rows per category sent with one change, larger changes are marked truncated so clients refetch
+MAX_ROWS_PER_EVENT = int(os.getenv("LANCEDB_CHANGE_FEED_MAX_ROWS", 1000))
+# events buffered for a subscriber that reads slower than the table changes
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class TableWatcher:
+    """Polls the version of one table and fans every change out to the queues of its subscribers"""
+
+    def __init__(self, use_manager: Callable, table_name: str, key: Optional[str]):
+        self.use_manager = use_manager
+        self.table_name = table_name
+        self.key = key
+        self.subscribers: List[asyncio.Queue] = []
+        self.version: Optional[int] = None
+        self.polls = 0
+        self.changes = 0
+        # the manager of the connection the table belongs to
+        self.manager = None
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+
+    async def start(self):
+        try:
+            with self.use_manager() as manager:
+                self.manager = manager
+                self.version = await manager.concurrency.run("read", manager.latest_version, self.table_name)
+            self.task = asyncio.ensure_future(self._poll())
+        finally:
+            self.ready.set()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            try:
+                with self.use_manager() as manager:
+                    if manager is not self.manager:
+                        # the app connected to another database, whose table of that name is another table
+                        self._publish({"type": "closed", "table": self.table_name, "detail": "The database connection changed"})
+                        return
+                    latest = await manager.concurrency.run("read", manager.latest_version, self.table_name)
+                    self.polls += 1
+                    if latest == self.version:
+                        continue
+                    diff = await manager.concurrency.run(
+                        "read", manager.diff_versions, self.table_name, self.version,
+                        to_version=latest, key=self.key, limit=MAX_ROWS_PER_EVENT,
+                    )
+                self.version = latest
+                self.changes += 1
+                self._publish(_change_event(diff))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error watching table '{self.table_name}' for changes: {e}")
+                self._publish({"type": "error", "table": self.table_name, "detail": str(e)})
+
+    def _publish(self, event: Dict[str, Any]):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # the subscriber fell behind, it gets told to refetch instead of an unbounded backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "table": self.table_name, "version": self.version})
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def stale(self, manager) -> bool:
+        """Whether the watcher failed to start or watches the database of a previous connection"""
+        return self.ready.is_set() and (self.task is None or self.task.done() or self.manager is not manager)
+
+
+def _change_event(diff: Dict[str, Any]) -> Dict[str, Any]:
+    rows = diff["rows"]
+    return {
+        "type": "change",
+        "table": diff["table"],
+        "from_version": diff["from_version"],
+        "version": diff["to_version"],
+        "rows": {**rows, "delta": rows["after"] - rows["before"]},
+        "schema": diff["schema"],
+        "added": diff["added"],
+        "updated": diff["updated"],
+        "deleted": diff["deleted"],
+        "truncated": any(rows[category] > len(diff[category]) for category in ("added", "updated", "deleted")),
+    }
+
+
+class ChangeFeed:
+    """
+    Live changes of tables for any number of subscribers.
+
+    Subscribers of the same table (and key column) share one TableWatcher, so N open viewers cost one
+    version check per poll interval, and a change is diffed once no matter how many clients receive it.
+    Watchers start with their first subscriber and stop with their last, or when the app connects to another
+    database, which ends their subscriptions with a `closed` event. All state lives on the event loop.
+    """
+
+    def __init__(self, use_manager: Callable):
+        # a context manager factory yielding the manager of the active connection and keeping it open meanwhile
+        self.use_manager = use_manager
+        self._watchers: Dict[Tuple[str, Optional[str]], TableWatcher] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, table_name: str, key: str = None):
+        """
+        Subscribe to the changes of a table.
+
+        Args:
+            table_name (str): Name of the table.
+            key (str): Column identifying a row across versions, lets changes report updates instead of
+                a deleted and an added row.
+
+        Yields:
+            Tuple[asyncio.Queue, int]: The queue the change events arrive on and the version they start from.
+        """
+        watcher_key = (table_name, key)
+        watcher = self._watchers.get(watcher_key)
+        if watcher is not None:
+            with self.use_manager() as manager:
+                if watcher.stale(manager):
+                    self._drop(watcher_key, watcher)
+                    watcher = None
+        if watcher is None:
+            watcher = self._watchers[watcher_key] = TableWatcher(self.use_manager, table_name, key)
+            try:
+                await watcher.start()
+            except BaseException:
+                # also when the request is cancelled while starting, the next subscriber starts a new watcher
+                self._drop(watcher_key, watcher)
+                raise
+        else:
+            # another subscriber is starting the watcher
+            await watcher.ready.wait()
+            if watcher.task is None:
+                raise RuntimeError(f"Could not watch table '{table_name}' for changes")
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        watcher.subscribers.append(queue)
+        try:
+            yield queue, watcher.version
+        finally:
+            watcher.subscribers.remove(queue)
+            if not watcher.subscribers:
+                watcher.stop()
+                self._drop(watcher_key, watcher)
+
+    def _drop(self, watcher_key: Tuple[str, Optional[str]], watcher: TableWatcher):
+        # a stale watcher may already have been replaced by a new one for the same table
+        if self._watchers.get(watcher_key) is watcher:
+            del self._watchers[watcher_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "poll_interval_seconds": POLL_INTERVAL_SECONDS,
+            "watchers": [
+                {"table": table_name, "key": key, "subscribers": len(watcher.subscribers),
+                 "version": watcher.version, "polls": watcher.polls, "changes": watcher.changes}
+                for (table_name, key), watcher in self._watchers.items()
+            ],
+        }
+
+
+def without_columns(event: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    """Drop columns (e.g. vectors) from the rows of an event for one subscriber"""
+    if not columns or event.get("type") != "change":
+        return event
+
+    def strip(row):
+        return {name: value for name, value in row.items() if name not in columns}
+
+    return {
+        **event,
+        "added": [strip(row) for row in event["added"]],
+        "deleted": [strip(row) for row in event["deleted"]],
+        "updated": [{"before": strip(pair["before"]), "after": strip(pair["after"])} for pair in event["updated"]],
+    }
@@ -0,0 +1,130 @@
+"""
+Negotiated compression of large responses, zstd or gzip by the client's Accept-Encoding.
+
+zstd comes with pyarrow, so it needs no extra dependency. Only complete bodies are compressed: streamed
+responses (SQL results, change feeds) pass through untouched so their chunks aren't held back.
+"""
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+import pyarrow as pa
+
+from routes.http_cache import encoded_etag
+from routes.metrics import Counter, REGISTRY
+
+# smaller bodies cost more to compress than to send
+COMPRESS_MIN_BYTES = int(os.getenv("LANCEDB_COMPRESS_MIN_BYTES", 1024))
+# bodies from this size are compressed on a worker thread instead of the event loop
+COMPRESS_THREAD_MIN_BYTES = 256 * 1024
+COMPRESSIBLE_TYPES = ("application/json", "application/vnd.apache.arrow.stream", "text/")
+
+COMPRESSED_BYTES = REGISTRY.register(Counter(
+    "lancedb_compressed_response_bytes_total",
+    "Response bytes before and after compression, by encoding.",
+    ("encoding", "stage"),
+))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding the client accepts, zstd before gzip, None for an uncompressed response"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("zstd", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _vary_on_encoding(headers):
+    """The response headers with Accept-Encoding added to Vary, keeping what it already names"""
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            names = [part.strip().lower() for part in value.split(b",")]
+            if b"*" in names or b"accept-encoding" in names:
+                return headers
+            return headers[:index] + [(name, value + b", Accept-Encoding")] + headers[index + 1:]
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return pa.compress(body, codec="zstd", asbytes=True)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """
+    Plain ASGI middleware compressing complete JSON and Arrow bodies of at least COMPRESS_MIN_BYTES.
+
+    Every response of a compressible type varies on Accept-Encoding, compressed or not, so that a shared cache
+    doesn't serve one client's coding to another. A compressed body gets the coding appended to its ETag.
+    """
+
+    def __init__(self, app, min_bytes: int = None):
+        self.app = app
+        self.min_bytes = COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict((name.lower(), value) for name, value in scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        start = None  # held back until the body shows whether it is worth compressing
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            response_headers = dict((name.lower(), value) for name, value in start["headers"])
+            content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+            body = message.get("body", b"")
+            compressible = content_type.startswith(COMPRESSIBLE_TYPES) and b"content-encoding" not in response_headers
+            # a 304 has no body but carries the Vary of the response it revalidates
+            if compressible or start["status"] == 304:
+                start["headers"] = _vary_on_encoding(list(start["headers"]))
+            if encoding is None or not compressible or message.get("more_body", False) or len(body) < self.min_bytes:
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= COMPRESS_THREAD_MIN_BYTES:
+                compressed = await asyncio.get_running_loop().run_in_executor(None, compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            COMPRESSED_BYTES.inc(encoding, "in", amount=len(body))
+            COMPRESSED_BYTES.inc(encoding, "out", amount=len(compressed))
+            start["headers"] = [
+                (name, value) for name, value in start["headers"]
+                if name.lower() not in (b"content-length", b"etag")
+            ] + [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            if b"etag" in response_headers:
+                # another representation than the uncompressed body, which has the plain ETag
+                etag = encoded_etag(response_headers[b"etag"].decode("latin-1"), encoding)
+                start["headers"].append((b"etag", etag.encode("latin-1")))
+            passthrough = True
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from routes.setup import ConcurrencyConfig
+
+
+# Substrings lance uses in the errors it raises when two writers commit against the same version
+COMMIT_CONFLICT_MARKERS = ("commit conflict", "retryable commit conflict", "conflicting transaction")
+
+
+def is_commit_conflict(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in COMMIT_CONFLICT_MARKERS)
+
+
+class ReadWriteLock:
+    """A writer-preferring reader/writer lock.
+
+    Any number of readers may hold the lock at the same time, writers get it exclusively.
+    Once a writer is waiting no new readers are admitted, so a steady stream of reads can't starve writes.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class PoolStats:
+    """Queue depth and wait time bookkeeping for one worker pool or lock kind"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def enqueue(self):
+        with self._lock:
+            self.queued += 1
+
+    def start(self, waited: float):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def finish(self):
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "avg_wait_ms": (self.total_wait_seconds / self.completed * 1000) if self.completed else 0.0,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+            }
+
+
+class TableConcurrency:
+    """
+    Per-table concurrency control for LanceDBManager.
+
+    Reads on a table share its lock, writes are serialized, and writes that still lose a commit race
+    (e.g. against another process) are retried with backoff. Work is dispatched onto separately sized
+    executors for reads, writes and embedding calls so a burst of one kind can't starve the others.
+    """
+
+    def __init__(self, config: ConcurrencyConfig = None):
+        self.config = config or ConcurrencyConfig()
+        self._locks: Dict[str, ReadWriteLock] = {}
+        self._locks_guard = threading.Lock()
+        self.executors = {
+            "read": ThreadPoolExecutor(self.config.read_workers, thread_name_prefix="lancedb-read"),
+            "write": ThreadPoolExecutor(self.config.write_workers, thread_name_prefix="lancedb-write"),
+            "embed": ThreadPoolExecutor(self.config.embed_workers, thread_name_prefix="lancedb-embed"),
+        }
+        self.pool_stats = {kind: PoolStats() for kind in self.executors}
+        self.lock_stats = {"read": PoolStats(), "write": PoolStats()}
+        self.conflict_retries = 0
+
+    def _lock_for(self, table_name: str) -> ReadWriteLock:
+        with self._locks_guard:
+            lock = self._locks.get(table_name)
+            if lock is None:
+                lock = self._locks[table_name] = ReadWriteLock()
+            return lock
+
+    @contextmanager
+    def read(self, table_name: str):
+        """Hold the shared lock of a table for the duration of the block"""
+        lock = self._lock_for(table_name)
+        stats = self.lock_stats["read"]
+        stats.enqueue()
+        started = time.perf_counter()
+        lock.acquire_read()
+        stats.start(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            lock.release_read()
+            stats.finish()
+
+    @contextmanager
+    def write(self, table_name: str):
+        """Hold the exclusive lock of a table for the duration of the block"""
+        lock = self._lock_for(table_name)
+        stats = self.lock_stats["write"]
+        stats.enqueue()
+        started = time.perf_counter()
+        lock.acquire_write()
+        stats.start(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            lock.release_write()
+            stats.finish()
+
+    def retry_on_conflict(self, fn: Callable, /, *args, **kwargs):
+        """
+        Call fn, retrying it with exponential backoff and jitter when lance reports a commit conflict.
+
+        Args:
+            fn (Callable): The write operation to run.
+
+        Returns:
+            Any: Whatever fn returns.
+        """
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_commit_conflict(e) or attempt >= self.config.max_conflict_retries:
+                    raise
+                attempt += 1
+                self.conflict_retries += 1
+                delay = self.config.conflict_backoff_seconds * (2 ** (attempt - 1))
+                delay += random.uniform(0, delay)
+                logging.warning(f"Commit conflict, retrying in {delay:.3f}s (attempt {attempt}): {e}")
+                time.sleep(delay)
+
+    def _submit(self, pool: str, fn: Callable, /, *args, **kwargs):
+        stats = self.pool_stats[pool]
+        stats.enqueue()
+        queued_at = time.perf_counter()
+
+        def task():
+            stats.start(time.perf_counter() - queued_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.finish()
+
+        return self.executors[pool].submit(task)
+
+    async def run(self, pool: str, fn: Callable, /, *args, **kwargs):
+        """
+        Run a blocking call on the executor for the given kind of work without blocking the event loop.
+
+        Args:
+            pool (str): One of "read", "write" or "embed".
+            fn (Callable): The blocking function to run.
+
+        Returns:
+            Any: Whatever fn returns.
+        """
+        return await asyncio.wrap_future(self._submit(pool, fn, *args, **kwargs))
+
+    def embed(self, fn: Callable, /, *args, **kwargs):
+        """Run an embedding call on the embedding executor and wait for it, bounding concurrent calls to the provider"""
+        return self._submit("embed", fn, *args, **kwargs).result()
+
+    def embed_batches(self, fn: Callable, batches: List[Any]) -> List[Any]:
+        """Run an embedding call per batch concurrently on the embedding executor, results in batch order"""
+        futures = [self._submit("embed", fn, batch) for batch in batches]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pools": {kind: stats.snapshot() for kind, stats in self.pool_stats.items()},
+            "locks": {kind: stats.snapshot() for kind, stats in self.lock_stats.items()},
+            "tables": len(self._locks),
+            "conflict_retries": self.conflict_retries,
+        }
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
@@ -0,0 +1,75 @@
+"""
+The active database connection, shared by every worker process of the backend.
+
+/api/connect/ saves the storage configuration under a new generation number in a local SQLite database.
+Each worker compares the latest generation with the one its manager was built from on every request, and
+lazily connects anew when another worker changed the connection. The saved configuration also survives a
+restart. It can hold credentials, so the file is only readable by its owner.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS connections (
+    generation INTEGER PRIMARY KEY AUTOINCREMENT,
+    config TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class ConnectionStore:
+    """
+    Latest connection configuration, by generation.
+
+    Args:
+        path (str): SQLite file the configuration is kept in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # created owner-only before SQLite opens it, its journal files take the same permissions
+            os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def save(self, config: Dict[str, Any]) -> int:
+        """Make a configuration the active one, returning its generation"""
+        with self._lock:
+            connection = self._connect()
+            generation = connection.execute(
+                "INSERT INTO connections (config, created_at) VALUES (?, ?)", (json.dumps(config), time.time())
+            ).lastrowid
+            connection.execute("DELETE FROM connections WHERE generation < ?", (generation,))
+        return generation
+
+    def generation(self) -> int:
+        """Generation of the active configuration, 0 while none was saved"""
+        if self._connection is None and not os.path.exists(self.path):
+            return 0
+        with self._lock:
+            row = self._connect().execute("SELECT max(generation) FROM connections").fetchone()
+        return row[0] or 0
+
+    def load(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """The generation and the active configuration, None while none was saved"""
+        if self._connection is None and not os.path.exists(self.path):
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT generation, config FROM connections ORDER BY generation DESC LIMIT 1"
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
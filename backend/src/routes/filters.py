@@ -0,0 +1,253 @@
+"""
+Structured filters compiled to Lance SQL predicates.
+
+A filter is JSON instead of a SQL string, so values can never escape their literal and every column is
+checked against the table schema:
+
+    {"op": "eq", "column": "category", "value": "verse"}
+    {"op": "in", "column": "user_id", "values": ["a", "b"]}
+    {"op": "range", "column": "score", "gte": 0.5, "lt": 1}
+    {"op": "prefix", "column": "text", "value": "Hello"}
+    {"op": "is_null", "column": "email", "value": true}
+    {"op": "and" | "or", "filters": [...]}
+
+Compilation favours forms Lance can answer from a scalar index: equality tests on one column that are
+OR-ed together become a single `IN (...)`, and a prefix on an indexed string column becomes a range,
+which a BTREE index serves while LIKE / starts_with always scan.
+"""
+import math
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import pyarrow as pa
+
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+# values per IN list when a bulk operation is split into several predicates
+IN_LIST_CHUNK = 1000
+_PLAIN_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class FilterError(ValueError):
+    """A structured filter that is malformed or doesn't match the table schema"""
+
+
+def quote_identifier(name: str) -> str:
+    if _PLAIN_IDENTIFIER.match(name):
+        return name
+    return "`" + name.replace("`", "``") + "`"
+
+
+def quote_literal(value: Any, data_type: pa.DataType = None) -> str:
+    """
+    Render a Python value as a SQL literal of a column type.
+
+    Args:
+        value (Any): The value.
+        data_type (pa.DataType): Type of the column it is compared with, inferred from the value when None.
+
+    Returns:
+        str: The literal.
+    """
+    if data_type is None:
+        data_type = _infer_type(value)
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        if not isinstance(value, str):
+            raise FilterError(f"Expected a string, got {value!r}")
+        return "'" + value.replace("'", "''") + "'"
+    if pa.types.is_boolean(data_type):
+        if not isinstance(value, bool):
+            raise FilterError(f"Expected a boolean, got {value!r}")
+        return "true" if value else "false"
+    if pa.types.is_integer(data_type):
+        if isinstance(value, bool) or not isinstance(value, int):
+            if isinstance(value, float) and value.is_integer():
+                return str(int(value))
+            raise FilterError(f"Expected an integer, got {value!r}")
+        return str(value)
+    if pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise FilterError(f"Expected a finite number, got {value!r}")
+        return repr(float(value)) if isinstance(value, float) else str(value)
+    if pa.types.is_timestamp(data_type):
+        moment = _parse_time(value, datetime)
+        return f"timestamp '{moment.isoformat(sep=' ')}'"
+    if pa.types.is_date(data_type):
+        day = _parse_time(value, date)
+        return f"date '{day.isoformat()}'"
+    raise FilterError(f"Columns of type {data_type} can't be filtered on")
+
+
+def _infer_type(value: Any) -> pa.DataType:
+    if isinstance(value, bool):
+        return pa.bool_()
+    if isinstance(value, int):
+        return pa.int64()
+    if isinstance(value, float):
+        return pa.float64()
+    if isinstance(value, datetime):
+        return pa.timestamp("us")
+    if isinstance(value, date):
+        return pa.date32()
+    if isinstance(value, str):
+        return pa.string()
+    raise FilterError(f"Unsupported filter value {value!r}")
+
+
+def _parse_time(value: Any, kind):
+    if isinstance(value, kind):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise FilterError(f"Expected an ISO 8601 {kind.__name__}, got {value!r}")
+        if parsed.tzinfo is not None:
+            parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+        return parsed if kind is datetime else parsed.date()
+    raise FilterError(f"Expected an ISO 8601 {kind.__name__}, got {value!r}")
+
+
+def in_predicate(column: str, values: Iterable[Any], data_type: pa.DataType = None) -> str:
+    """`column IN (...)` with safely quoted values, `=` for a single value"""
+    literals = list(dict.fromkeys(quote_literal(value, data_type) for value in values))
+    if not literals:
+        return "false"
+    if len(literals) == 1:
+        return f"{quote_identifier(column)} = {literals[0]}"
+    return f"{quote_identifier(column)} IN ({', '.join(literals)})"
+
+
+def chunked(values: List[Any], size: int = IN_LIST_CHUNK) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with `prefix`"""
+    for position in range(len(prefix) - 1, -1, -1):
+        code = ord(prefix[position])
+        if code < 0x10FFFF and not 0xD7FF <= code < 0xE000:
+            return prefix[:position] + chr(code + 1)
+    return None
+
+
+class FilterCompiler:
+    """Validates structured filters against a table schema and compiles them to Lance predicates"""
+
+    def __init__(self, schema: pa.Schema, indexed_columns: Iterable[str] = ()):
+        self.schema = schema
+        self.indexed_columns: Set[str] = set(indexed_columns)
+
+    @classmethod
+    def for_table(cls, table) -> "FilterCompiler":
+        indexed = [column for index in table.list_indices() for column in index.columns]
+        return cls(table.schema, indexed)
+
+    def _column_type(self, node: Dict[str, Any]) -> pa.DataType:
+        column = node.get("column")
+        if not isinstance(column, str):
+            raise FilterError(f"Filter {node} needs a column")
+        index = self.schema.get_field_index(column)
+        if index < 0:
+            raise FilterError(f"Unknown column '{column}'")
+        return self.schema.field(index).type
+
+    def compile(self, node: Dict[str, Any]) -> str:
+        """
+        Compile a structured filter.
+
+        Args:
+            node (dict): The filter, see the module docstring.
+
+        Returns:
+            str: A Lance SQL predicate.
+
+        Raises:
+            FilterError: If the filter is malformed or doesn't fit the schema.
+        """
+        if not isinstance(node, dict):
+            raise FilterError(f"A filter must be an object, got {node!r}")
+        op = node.get("op")
+        if op in ("and", "or"):
+            filters = node.get("filters")
+            if not isinstance(filters, list) or not filters:
+                raise FilterError(f"'{op}' needs a non-empty list of filters")
+            if op == "or":
+                return self._compile_or(filters)
+            parts = [self.compile(child) for child in filters]
+            return parts[0] if len(parts) == 1 else " AND ".join(f"({part})" for part in parts)
+
+        data_type = self._column_type(node)
+        column = node["column"]
+        if op == "eq":
+            if "value" not in node:
+                raise FilterError("'eq' needs a value")
+            if node["value"] is None:
+                return f"{quote_identifier(column)} IS NULL"
+            return in_predicate(column, [node["value"]], data_type)
+        if op == "in":
+            values = node.get("values")
+            if not isinstance(values, list):
+                raise FilterError("'in' needs a list of values")
+            return in_predicate(column, values, data_type)
+        if op == "range":
+            bounds = [(name, node[name]) for name in RANGE_OPERATORS if name in node]
+            if not bounds:
+                raise FilterError("'range' needs at least one of gt, gte, lt, lte")
+            return " AND ".join(
+                f"{quote_identifier(column)} {RANGE_OPERATORS[name]} {quote_literal(value, data_type)}"
+                for name, value in bounds
+            )
+        if op == "prefix":
+            prefix = node.get("value")
+            if not (pa.types.is_string(data_type) or pa.types.is_large_string(data_type)):
+                raise FilterError(f"'prefix' needs a string column, '{column}' is {data_type}")
+            if not isinstance(prefix, str) or not prefix:
+                raise FilterError("'prefix' needs a non-empty string value")
+            upper = _prefix_upper_bound(prefix)
+            if column in self.indexed_columns and upper is not None:
+                # a BTREE index answers the range, LIKE and starts_with would scan the column
+                return f"{quote_identifier(column)} >= {quote_literal(prefix)} AND {quote_identifier(column)} < {quote_literal(upper)}"
+            return f"starts_with({quote_identifier(column)}, {quote_literal(prefix)})"
+        if op == "is_null":
+            is_null = node.get("value", True)
+            if not isinstance(is_null, bool):
+                raise FilterError("'is_null' takes a boolean value")
+            return f"{quote_identifier(column)} IS {'' if is_null else 'NOT '}NULL"
+        raise FilterError(f"Unknown filter op {op!r}")
+
+    def _compile_or(self, filters: List[Dict[str, Any]]) -> str:
+        # equality tests of the same column are merged into one IN list, which one index lookup answers
+        values_by_column: Dict[str, List[Any]] = {}
+        others = []
+        for child in self._flatten_or(filters):
+            op = child.get("op") if isinstance(child, dict) else None
+            if op == "eq" and child.get("value") is not None:
+                self._column_type(child)
+                values_by_column.setdefault(child["column"], []).append(child["value"])
+            elif op == "in" and isinstance(child.get("values"), list):
+                self._column_type(child)
+                values_by_column.setdefault(child["column"], []).extend(child["values"])
+            else:
+                others.append(self.compile(child))
+        parts = [
+            in_predicate(column, values, self._column_type({"column": column}))
+            for column, values in values_by_column.items()
+        ] + others
+        return parts[0] if len(parts) == 1 else " OR ".join(f"({part})" for part in parts)
+
+    def _flatten_or(self, filters):
+        for child in filters:
+            if isinstance(child, dict) and child.get("op") == "or" and isinstance(child.get("filters"), list):
+                yield from self._flatten_or(child["filters"])
+            else:
+                yield child
+
+
+def combine(*predicates: Optional[str]) -> Optional[str]:
+    """AND together the predicates that are set"""
+    parts = [predicate for predicate in predicates if predicate]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else " AND ".join(f"({part})" for part in parts)
@@ -0,0 +1,90 @@
+"""
+Conditional requests for table reads.
+
+A read's ETag is derived from the table version and the query parameters, so it changes exactly when the
+response could. The latest version of each table is kept for a short TTL: a revalidation (If-None-Match)
+within it is answered with 304 without reaching storage. Writes made through this backend invalidate the
+cached version right away, writes of other processes are seen once the TTL expires.
+
+A compressed body is another representation of the same read: its ETag gets the content coding appended
+(W/"…-zstd"), and a revalidation with either form matches.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from routes.metrics import record_cache
+
+# how long the latest version of a table is trusted without checking storage
+VERSION_TTL_SECONDS = float(os.getenv("LANCEDB_ETAG_VERSION_TTL_SECONDS", 1.0))
+# content codings appended to the ETag of a compressed body, see routes.compression
+ETAG_CODINGS = ("zstd", "gzip")
+
+
+class VersionCache:
+    """Latest version per table, refreshed at most once per TTL"""
+
+    def __init__(self, ttl_seconds: float = None):
+        self.ttl_seconds = VERSION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name: str, load: Callable[[], int]) -> int:
+        with self._lock:
+            cached = self._versions.get(table_name)
+        fresh = cached is not None and time.monotonic() - cached[1] < self.ttl_seconds
+        record_cache("table_version", fresh)
+        if fresh:
+            return cached[0]
+        version = load()
+        with self._lock:
+            self._versions[table_name] = (version, time.monotonic())
+        return version
+
+    def invalidate(self, table_name: str):
+        with self._lock:
+            self._versions.pop(table_name, None)
+
+
+def make_etag(table_name: str, version: int, params: Iterable[Tuple[str, str]]) -> str:
+    """
+    A weak ETag of a read, the compressed bodies of it get an ETag of their own, see encoded_etag.
+
+    Args:
+        table_name (str): Name of the table read.
+        version (int): Version of the table the response is computed from.
+        params (Iterable[Tuple[str, str]]): The query parameters, in any order.
+    """
+    digest = hashlib.sha1(repr((table_name, version, sorted(params))).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of a body compressed with a content coding, W/"abc" becomes W/"abc-zstd" for zstd"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def _opaque_tag(tag: str) -> str:
+    """The quoted part of an ETag without its weak prefix and content coding"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for coding in ETAG_CODINGS:
+        if tag.endswith(f'-{coding}"'):
+            return tag[:-len(coding) - 2] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches the ETag, compared weakly as RFC 9110 asks. The ETag of a
+    compressed body matches too, the 304 only confirms the read is unchanged, in whatever coding the client has it.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == opaque for tag in if_none_match.split(","))
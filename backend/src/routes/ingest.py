@@ -0,0 +1,197 @@
+"""
+Bulk add and upsert of rows into any table, validated against its schema.
+
+The body becomes an Arrow table in one pass: NDJSON through Arrow's JSON reader, a JSON array through
+pa.Table.from_pylist with the table's types. When that fails every column is converted on its own, so all
+the bad columns are reported at once instead of the first bad value. Columns are then cast to the table's
+types (numbers from strings, vectors from lists), and missing nullable columns are filled with nulls.
+
+Key columns can be derived from other columns as the SHA-256 of their concatenated values. The columns
+are cast and joined by Arrow kernels, only the hashing itself runs per value since Arrow has no SHA-256.
+"""
+import hashlib
+import io
+import re
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pj
+
+MODES = ("append", "insert", "upsert")
+_CONVERSION_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError)
+
+
+class IngestError(ValueError):
+    """Rows that don't fit the table, with the reason per column when it is about columns"""
+
+    def __init__(self, message: str, columns: Dict[str, str] = None):
+        self.columns = columns or {}
+        if self.columns:
+            message += ": " + "; ".join(f"{column}: {error}" for column, error in self.columns.items())
+        super().__init__(message)
+
+
+def _reader_type(data_type: pa.DataType) -> pa.DataType:
+    """The JSON reader can't produce fixed size lists, vectors are read as lists and cast"""
+    if pa.types.is_fixed_size_list(data_type):
+        return pa.list_(data_type.value_type)
+    return data_type
+
+
+def read_ndjson(body: bytes, schema: pa.Schema) -> pa.Table:
+    """Parse newline delimited JSON objects with the types of a table schema"""
+    parse_schema = pa.schema([pa.field(field.name, _reader_type(field.type)) for field in schema])
+    try:
+        return pj.read_json(
+            io.BytesIO(body),
+            parse_options=pj.ParseOptions(explicit_schema=parse_schema, unexpected_field_behavior="error"),
+        )
+    except _CONVERSION_ERRORS as e:
+        column = re.search(r"Column\(/([^)/]+)", str(e))
+        raise IngestError("Invalid NDJSON", {column.group(1): str(e)} if column else {"": str(e)})
+
+
+def from_records(records: List[Dict[str, Any]], schema: pa.Schema) -> pa.Table:
+    """Convert JSON objects to a table with the types of the matching table columns"""
+    if not all(isinstance(record, dict) for record in records):
+        raise IngestError("Rows must be JSON objects")
+    names = set().union(*records)
+    unknown = sorted(names - set(schema.names))
+    if unknown:
+        raise IngestError("Unknown columns", {name: "not a column of the table" for name in unknown})
+    fields = [field for field in schema if field.name in names]
+    try:
+        return pa.Table.from_pylist(records, schema=pa.schema(fields))
+    except _CONVERSION_ERRORS:
+        pass
+    columns, errors = {}, {}
+    for field in fields:
+        values = [record.get(field.name) for record in records]
+        try:
+            columns[field.name] = _convert_column(values, field.type)
+        except _CONVERSION_ERRORS as e:
+            errors[field.name] = str(e)
+    if errors:
+        raise IngestError("Rows don't fit the table schema", errors)
+    return pa.table(columns)
+
+
+def _convert_column(values: List[Any], data_type: pa.DataType) -> pa.Array:
+    """Convert the values of one column, parsing numbers and the like sent as strings"""
+    try:
+        return pa.array(values, data_type)
+    except _CONVERSION_ERRORS:
+        if pa.types.is_nested(data_type):
+            # e.g. vectors of the wrong size, which the cast reports
+            return pc.cast(pa.array(values), data_type)
+        # the values may also mix strings and numbers, the cast parses them all as strings
+        strings = pa.array([None if value is None else str(value) for value in values], pa.string())
+        return pc.cast(strings, data_type)
+
+
+def derive_key(rows: pa.Table, fields: List[str]) -> pa.Array:
+    """The hex SHA-256 of the concatenated values of `fields` per row"""
+    parts, errors = [], {}
+    for name in fields:
+        if name not in rows.column_names:
+            errors[name] = "needed to derive a key but missing"
+            continue
+        try:
+            part = pc.cast(rows[name], pa.string())
+        except _CONVERSION_ERRORS as e:
+            errors[name] = f"can't be used in a key: {e}"
+            continue
+        if part.null_count:
+            errors[name] = f"{part.null_count} null values can't be used in a key"
+        parts.append(part)
+    if errors:
+        raise IngestError("Can't derive the key", errors)
+    joined = pc.binary_join_element_wise(*parts, "").cast(pa.binary())
+    return pa.array([hashlib.sha256(value).hexdigest() for value in joined.to_pylist()], pa.string())
+
+
+def conform(rows: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Cast the columns to the table schema, in its order, with nulls for missing nullable columns"""
+    columns, errors = [], {}
+    for field in schema:
+        if field.name not in rows.column_names:
+            if not field.nullable:
+                errors[field.name] = "missing, and the column is not nullable"
+                continue
+            columns.append(pa.nulls(rows.num_rows, field.type))
+            continue
+        column = rows[field.name]
+        if column.type != field.type:
+            try:
+                column = pc.cast(column, field.type)
+            except _CONVERSION_ERRORS as e:
+                errors[field.name] = str(e)
+                continue
+        if not field.nullable and column.null_count:
+            errors[field.name] = f"{column.null_count} null values in a column that is not nullable"
+            continue
+        columns.append(column)
+    if errors:
+        raise IngestError("Rows don't fit the table schema", errors)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def deduplicate(rows: pa.Table, key: str, keep: str = "last") -> pa.Table:
+    """Keep one row per key, the last or the first of each, since a merge rejects duplicate keys"""
+    if pc.count_distinct(rows[key]).as_py() == rows.num_rows:
+        return rows
+    positions = rows.select([key]).append_column("_position", pa.array(np.arange(rows.num_rows)))
+    kept = positions.group_by(key, use_threads=False).aggregate([("_position", "max" if keep == "last" else "min")])
+    return rows.take(np.sort(kept.column(f"_position_{'max' if keep == 'last' else 'min'}").to_numpy()))
+
+
+def prepare_rows(
+    rows: Union[bytes, List[Dict[str, Any]]],
+    schema: pa.Schema,
+    mode: str = "append",
+    key: str = None,
+    derive: Dict[str, List[str]] = None,
+) -> pa.Table:
+    """
+    Turn a request body into a table matching `schema`.
+
+    Args:
+        rows (bytes | List[Dict]): NDJSON, or parsed JSON objects.
+        schema (pa.Schema): Schema of the target table.
+        mode (str): append, insert (rows with new keys only) or upsert.
+        key (str): Key column rows are matched on by insert and upsert, duplicates in the rows are dropped.
+        derive (Dict[str, List[str]]): Key columns to compute, each from the columns it hashes.
+
+    Returns:
+        pa.Table: The rows with the table schema.
+
+    Raises:
+        IngestError: When the rows don't fit the table, with the reason per column.
+    """
+    if mode not in MODES:
+        raise IngestError(f"Unknown mode '{mode}', one of {', '.join(MODES)}")
+    if mode != "append" and not key:
+        raise IngestError(f"Mode {mode} needs a key column")
+    derive = derive or {}
+    if not rows:
+        return schema.empty_table()
+    unknown = [column for column in [key, *derive] if column and column not in schema.names]
+    if unknown:
+        raise IngestError("Unknown columns", {column: "not a column of the table" for column in unknown})
+
+    table = read_ndjson(rows, schema) if isinstance(rows, bytes) else from_records(rows, schema)
+    for column, fields in derive.items():
+        derived = derive_key(table, fields)
+        if column in table.column_names:
+            table = table.set_column(table.column_names.index(column), column, derived)
+        else:
+            table = table.append_column(column, derived)
+    table = conform(table, schema)
+    if key:
+        if table[key].null_count:
+            raise IngestError("Rows without a key", {key: f"{table[key].null_count} null values"})
+        # an upsert takes the last row of a key, an insert the first as add_data does
+        table = deduplicate(table, key, "last" if mode == "upsert" else "first")
+    return table
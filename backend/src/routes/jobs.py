@@ -0,0 +1,360 @@
+"""
+Background jobs for operations that take minutes to hours: index builds, compaction, backfills, deduplication.
+
+Jobs are submitted by type with JSON parameters and run on their own threads, so they never hold a request
+worker. Every type has a limit of concurrently running jobs; the others wait in the queue. A job function
+reports its progress and polls for cancellation through its JobContext, raising JobCancelled when it stops
+early. A job that can't be interrupted just runs to the end.
+
+Job state is kept in a local SQLite database. Queued jobs are picked up again after a restart. Jobs that
+were running when the process stopped are queued again if their type is resumable (it checkpoints its own
+progress), and marked interrupted otherwise.
+
+Several worker processes can share the database: jobs are claimed in a transaction, the limits count the
+running jobs of all processes, a cancellation is recorded for the process running the job to see, and only
+the jobs of processes that are gone are recovered. A process holds a lease on its running jobs by updating
+their heartbeat, jobs whose heartbeat is older than LEASE_SECONDS are recovered by any process, whatever host
+the owner ran on (a recreated container gets a new hostname but keeps the state directory).
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, INTERRUPTED = "queued", "running", "succeeded", "failed", "cancelled", "interrupted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL
+)
+"""
+# added after the first release of the table
+_MIGRATIONS = {
+    "owner": "owner TEXT",
+    "cancel_requested": "cancel_requested INTEGER NOT NULL DEFAULT 0",
+    "heartbeat_at": "heartbeat_at REAL",
+}
+_COLUMNS = ("id", "type", "params", "status", "done", "total", "result", "error", "created_at", "started_at", "finished_at")
+# how often a running job looks for a cancellation made by another process
+CANCEL_POLL_SECONDS = 1.0
+# how often the heartbeat of running jobs is updated, and after how long without one their owner is taken for gone
+HEARTBEAT_SECONDS = float(os.getenv("LANCEDB_JOBS_HEARTBEAT_SECONDS", 10))
+LEASE_SECONDS = float(os.getenv("LANCEDB_JOBS_LEASE_SECONDS", 60))
+
+
+class JobError(ValueError):
+    """A job request that can't be accepted, e.g. of an unknown type"""
+
+
+class JobCancelled(Exception):
+    """Raised by a job that stopped early because it was cancelled"""
+
+
+@dataclass
+class JobType:
+    run: Callable[[Dict[str, Any], "JobContext"], Any]
+    limit: int = 1  # jobs of this type running at the same time
+    resumable: bool = False  # restarted after a crash instead of being marked interrupted
+    required: Tuple[str, ...] = ()  # parameters a job must be submitted with
+
+
+class JobContext:
+    """Handed to a running job to report progress and to see whether it was cancelled"""
+
+    def __init__(self, queue: "JobQueue", job_id: str, job_type: str):
+        self.job_id = job_id
+        self.job_type = job_type
+        self._queue = queue
+        self._cancelled = threading.Event()
+        self._checked = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancelled.is_set() and time.monotonic() - self._checked >= CANCEL_POLL_SECONDS:
+            self._checked = time.monotonic()
+            if self._queue._cancel_requested(self.job_id):
+                self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def progress(self, done: int, total: Optional[int] = None):
+        """Record the units of work (usually rows) done so far, and the total when it is known"""
+        if total is None:
+            self._queue._update(self.job_id, done=done)
+        else:
+            self._queue._update(self.job_id, done=done, total=total)
+
+
+class JobQueue:
+    """
+    Persistent job queue with per-type concurrency limits.
+
+    Args:
+        path (str): SQLite file the job state is kept in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.types: Dict[str, JobType] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._running: Dict[str, JobContext] = {}
+        self._stopping = False
+        self._heartbeat_stop = threading.Event()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(
+        self,
+        job_type: str,
+        run: Callable[[Dict[str, Any], JobContext], Any],
+        limit: int = 1,
+        resumable: bool = False,
+        required: Tuple[str, ...] = (),
+    ):
+        """
+        Register a job type.
+
+        Args:
+            job_type (str): Name used to submit jobs of this type.
+            run (Callable): Called with the job parameters and a JobContext, returns a JSON-serializable result.
+                It may raise JobCancelled once context.cancelled turns True.
+            limit (int): Jobs of this type running at the same time.
+            resumable (bool): Whether the job can be run again after a crash and continues where it stopped.
+            required (Tuple[str, ...]): Parameters a job must be submitted with.
+        """
+        self.types[job_type] = JobType(run, limit, resumable, tuple(required))
+
+    def start(self):
+        """Open the database, recover the jobs of the previous process and start the queued ones"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            self._stopping = False
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _MIGRATIONS.items():
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {definition}")
+            # a job claimed under this process's own name is left from a previous process with the same pid
+            self._recover(include_own=True)
+            self._dispatch()
+        self._heartbeat_stop.clear()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def _recover(self, include_own: bool = False):
+        """Requeue or mark interrupted the running jobs whose owner stopped updating their heartbeat"""
+        stale = time.time() - LEASE_SECONDS
+        with self._lock:
+            running = self._connection.execute(
+                "SELECT id, type, owner FROM jobs WHERE status = ? AND (owner IS ? OR COALESCE(heartbeat_at, started_at, 0) < ?)",
+                (RUNNING, self.owner if include_own else None, stale),
+            ).fetchall()
+            for job_id, job_type, owner in running:
+                if job_id in self._running:
+                    continue
+                spec = self.types.get(job_type)
+                if spec is not None and spec.resumable:
+                    fields = {"status": QUEUED, "started_at": None, "owner": None, "heartbeat_at": None}
+                else:
+                    fields = {"status": INTERRUPTED, "error": "The backend stopped while the job was running", "finished_at": time.time()}
+                # only if it still has the same owner and no newer heartbeat, another process may be recovering it too
+                recovered = self._connection.execute(
+                    f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ? AND status = ? "
+                    "AND owner IS ? AND (owner IS ? OR COALESCE(heartbeat_at, started_at, 0) < ?)",
+                    (*fields.values(), job_id, RUNNING, owner, self.owner if include_own else None, stale),
+                ).rowcount
+                if recovered and fields["status"] == QUEUED:
+                    logging.info(f"Requeueing job {job_id} ({job_type}) that was running when its backend ({owner}) stopped")
+                elif recovered:
+                    logging.info(f"Job {job_id} ({job_type}) was interrupted when its backend ({owner}) stopped")
+
+    def _heartbeat(self):
+        """Renew the lease on the jobs of this process, and recover the jobs of processes that are gone"""
+        while not self._heartbeat_stop.wait(HEARTBEAT_SECONDS):
+            try:
+                with self._lock:
+                    if self._running:
+                        job_ids = list(self._running)
+                        self._connection.execute(
+                            f"UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ? AND id IN ({', '.join('?' * len(job_ids))})",
+                            (time.time(), self.owner, RUNNING, *job_ids),
+                        )
+                    self._recover()
+                    self._dispatch()
+            except Exception as e:
+                logging.error(f"Updating the heartbeat of running jobs failed: {e}")
+
+    def shutdown(self):
+        """Ask running jobs to stop; resumable ones are queued again on the next start"""
+        self._heartbeat_stop.set()
+        with self._lock:
+            self._stopping = True
+            for context in self._running.values():
+                context._cancelled.set()
+
+    def submit(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a job.
+
+        Returns:
+            dict: The job, see get().
+
+        Raises:
+            JobError: If the job type is unknown or a required parameter is missing.
+        """
+        if job_type not in self.types:
+            raise JobError(f"Unknown job type '{job_type}', one of {', '.join(sorted(self.types))}")
+        missing = [name for name in self.types[job_type].required if params.get(name) is None]
+        if missing:
+            raise JobError(f"Missing parameters for a {job_type} job: {', '.join(missing)}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, type, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(params), QUEUED, time.time()),
+            )
+            self._dispatch()
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job right away, or ask a running one to stop. Returns None for an unknown job."""
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            cancelled = self._connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?", (CANCELLED, time.time(), job_id, QUEUED)
+            ).rowcount
+            if not cancelled and job["status"] == RUNNING:
+                # seen by the process running the job, this one or another
+                self._update(job_id, cancel_requested=1)
+                if job_id in self._running:
+                    self._running[job_id]._cancelled.set()
+            return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def list(self, job_type: str = None, status: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        conditions, args = [], []
+        if job_type:
+            conditions.append("type = ?")
+            args.append(job_type)
+        if status:
+            conditions.append("status = ?")
+            args.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*args, limit)
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._connection is None:  # not started yet
+                counts = []
+            else:
+                counts = self._connection.execute("SELECT type, status, count(*) FROM jobs GROUP BY type, status").fetchall()
+        by_type: Dict[str, Dict[str, int]] = {job_type: {} for job_type in self.types}
+        for job_type, status, count in counts:
+            by_type.setdefault(job_type, {})[status] = count
+        return {"types": {job_type: {"limit": spec.limit, "jobs": by_type.get(job_type, {})} for job_type, spec in self.types.items()}}
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._connection.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self, job_type: str, limit: int) -> List[tuple]:
+        """Mark the oldest queued jobs of a type running as far as its limit allows, in all processes"""
+        connection = self._connection
+        # an immediate transaction keeps other processes from claiming the same jobs
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            running = connection.execute("SELECT count(*) FROM jobs WHERE type = ? AND status = ?", (job_type, RUNNING)).fetchone()[0]
+            queued = connection.execute(
+                "SELECT id, params FROM jobs WHERE type = ? AND status = ? ORDER BY created_at LIMIT ?",
+                (job_type, QUEUED, max(limit - running, 0)),
+            ).fetchall()
+            for job_id, _ in queued:
+                now = time.time()
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, owner = ? WHERE id = ?",
+                    (RUNNING, now, now, self.owner, job_id),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return queued
+
+    def _dispatch(self):
+        """Start the oldest queued jobs of every type that has a free slot"""
+        with self._lock:
+            if self._stopping:
+                return
+            for job_type, spec in self.types.items():
+                for job_id, params in self._claim(job_type, spec.limit):
+                    context = JobContext(self, job_id, job_type)
+                    self._running[job_id] = context
+                    threading.Thread(target=self._run, args=(spec, json.loads(params), context), name=f"job-{job_type}", daemon=True).start()
+
+    def _run(self, spec: JobType, params: Dict[str, Any], context: JobContext):
+        job_id = context.job_id
+        try:
+            result = spec.run(params, context)
+            self._update(job_id, status=SUCCEEDED, result=json.dumps(result, default=str), finished_at=time.time())
+        except JobCancelled:
+            if self._stopping and spec.resumable:
+                # stopped by the shutdown, picked up again on the next start
+                self._update(job_id, status=QUEUED, started_at=None, owner=None, heartbeat_at=None)
+            else:
+                self._update(job_id, status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            logging.exception(f"Job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._dispatch()
+
+
+def _job(row) -> Dict[str, Any]:
+    job = dict(zip(_COLUMNS, row))
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    elapsed = (job["finished_at"] or time.time()) - job["started_at"] if job["started_at"] else None
+    job["elapsed_seconds"] = elapsed
+    job["progress"] = job["done"] / job["total"] if job["total"] else None
+    rate = job["done"] / elapsed if elapsed and job["done"] else None
+    job["eta_seconds"] = (job["total"] - job["done"]) / rate if rate and job["total"] and job["status"] == RUNNING else None
+    return job
+
@@ -0,0 +1,66 @@
+"""
+Point lookups of many rows at once, by row id or by key.
+
+Row ids go straight to Lance's take, which reads the rows from their fragments without scanning. Keys
+become IN predicates of at most IN_LIST_CHUNK values, which a scalar index on the key column answers
+without a scan as well. Either way the rows come back in the order they were asked for.
+"""
+from typing import Any, List, Optional
+
+import pyarrow as pa
+
+from routes.filters import chunked, in_predicate
+
+# ids or key values per lookup request
+MAX_LOOKUP_ROWS = 10_000
+
+
+def no_rows(table, columns: Optional[List[str]]) -> pa.Table:
+    """An empty result with the schema of a take, Lance rejects an empty take"""
+    query = table.search()
+    if columns is not None:
+        query = query.select(columns)
+    return query.with_row_id(True).limit(1).to_arrow().slice(0, 0)
+
+
+def take_row_ids(table, row_ids: List[int], columns: Optional[List[str]]) -> pa.Table:
+    """
+    Read rows by row id, in the order of `row_ids`.
+
+    Returns:
+        pa.Table: The rows with _rowid, ids of deleted or unknown rows are left out.
+    """
+    unique = list(dict.fromkeys(row_ids))
+    if not unique:
+        return no_rows(table, columns)
+    query = table.take_row_ids(unique)
+    if columns is not None:
+        query = query.select(columns)
+    rows = query.with_row_id().to_arrow()
+    # take returns the rows in storage order
+    positions = {row_id: position for position, row_id in enumerate(rows.column("_rowid").to_pylist())}
+    return rows.take(pa.array([positions[row_id] for row_id in row_ids if row_id in positions], pa.int64()))
+
+
+def take_keys(table, key: str, values: List[Any], columns: Optional[List[str]]) -> pa.Table:
+    """
+    Read the rows whose `key` is one of `values`, grouped in the order of `values`.
+
+    Returns:
+        pa.Table: The rows with _rowid and the key column, every row of a key that appears more than once.
+    """
+    key_type = table.schema.field(key).type
+    if columns is not None and key not in columns:
+        columns = columns + [key]
+    parts = []
+    for chunk in chunked(list(dict.fromkeys(values))):
+        query = table.search().where(in_predicate(key, chunk, key_type))
+        if columns is not None:
+            query = query.select(columns)
+        parts.append(query.with_row_id(True).limit(None).to_arrow())
+    if not parts:
+        return no_rows(table, columns)
+    rows = pa.concat_tables(parts)
+    order = {value: position for position, value in reversed(list(enumerate(values)))}
+    found = rows.column(key).to_pylist()
+    return rows.take(pa.array(sorted(range(len(found)), key=lambda row: order.get(found[row], len(order))), pa.int64()))
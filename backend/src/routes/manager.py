@@ -1,44 +1,47 @@
+import asyncio
+import json
 import logging
 import sys
 import os
+import threading
+import time
 
-from typing import List, Dict, Any, Union
-from lancedb.embeddings.utils import api_key_not_found_help
-from lancedb.embeddings.registry import register
-from lancedb.embeddings import TextEmbeddingFunction, get_registry
-import numpy as np
-from functools import cached_property
-from openai import AzureOpenAI
-from routes.setup import AzureOpenAiConfig
-from azure.identity import DefaultAzureCredential
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Any, Optional, Union
 import lancedb
+import numpy as np
 import pandas as pd 
-from routes.setup import AppConfig
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import datetime, timedelta
+from routes.setup import STATE_DIR, AppConfig
 from storage.provider import create_storage_provider
 from embeddings import get_embedder
+from routes.concurrency import TableConcurrency
+from routes.metrics import stage, record_cache, ROWS_RETURNED
+from routes.query_plan import parse_plan, summarize_plan
+from routes.version_diff import diff_versions
+from routes.filters import FilterCompiler, FilterError, chunked, combine, in_predicate
+from routes.aggregation import SCAN_BATCH_ROWS, Aggregation, ResultCache, aggregate_batches, order_and_limit
+from routes.sql import SqlLimits, SqlQuery
+from routes.sampling import new_seed, sample_rows
+from routes.backfill import BackfillCheckpoint, embedder_model, pending_filter, run_backfill
+from routes.sorting import SortCache, parse_order_by, scan_sort_columns, sort_columns_query, sort_path, sorted_row_ids, top_k
+from routes.lookup import no_rows, take_keys, take_row_ids
+from routes.rerank import CANDIDATE_MULTIPLIER, MAX_CANDIDATES, RERANKERS, RerankError, rerank
+from routes.http_cache import VersionCache
+from routes.write_buffer import TableWriteBuffer
+from routes.ingest import prepare_rows
+from routes.near_duplicates import BLOCK_ROWS, DEFAULT_NEIGHBORS, MAX_CLUSTERS_REPORTED, NearDuplicateError, find_clusters, prefer_index, vector_index_metric
 
 
 # add the root directory to the path so we can import the modules not in this directory
 sys.path.append(os.path.abspath(
     os.path.join(os.path.dirname(os.getcwd()), ".")))
 
-openai_config = AzureOpenAiConfig()
-try:
-    credentials = DefaultAzureCredential()
-    token_provdier = openai_config.get_token_provider(DefaultAzureCredential())
-except Exception as e:
-    logging.warning(
-        "Please sure to run 'az login' in the container.")
-
-
-def get_azure_storage_options(credentials: DefaultAzureCredential = DefaultAzureCredential()):
-    return {
-        "azure_storage_account_name": "account_name",
-        "azure_tenant_id": "tenant_id",
-        "azure_storage_token": credentials.get_token(
-            "https://storage.azure.com/.default"
-        ).token,
-    }
+# checked out versions never change, so their handles are kept until this many others were used since
+VERSION_HANDLE_CACHE_SIZE = 32
 
 
 class LanceDBManager:
@@ -47,13 +50,42 @@ class LanceDBManager:
         self.storage = create_storage_provider(self.config.database.storage)
         self.embedder = None
         self.db = None
+        self.concurrency = TableConcurrency(self.config.concurrency)
+        self._tables = {}
+        self._version_tables = OrderedDict()
+        self._version_tables_lock = threading.Lock()
+        self.sort_cache = SortCache()
+        self.aggregate_cache = ResultCache("aggregate")
+        self.version_cache = VersionCache()
+        self.write_buffers: Dict[str, TableWriteBuffer] = {}
+        self._write_buffers_lock = threading.Lock()
+        self._storage_options = None
+        # requests, streams and jobs using the manager, it is only closed once they are done (see close_when_idle)
+        self._users = 0
+        self._users_changed = threading.Condition()
         self.connect()
 
     def connect(self):
         """Connect or reconnect to the database"""
         import lancedb
-        self.db = lancedb.connect(self.storage.get_uri())
+        self._storage_options = self.storage.get_storage_options()
+        # a zero consistency interval makes cached table handles check for newer versions on every read,
+        # so reusing them is safe even when another process writes to the table
+        self.db = lancedb.connect(
+            self.storage.get_uri(),
+            read_consistency_interval=timedelta(0),
+            storage_options=self._storage_options or None,
+        )
+        self._tables = {}
+        with self._version_tables_lock:
+            self._version_tables.clear()
         return self.table_names
+
+    def _refresh_credentials(self):
+        """Reconnect when the storage credentials were refreshed, handles opened with the old ones would expire"""
+        if self.storage.get_storage_options() is not self._storage_options:
+            logging.info("Storage credentials were refreshed, reconnecting")
+            self.connect()
         
     @property
     def table_names(self) -> List[str]:
@@ -71,6 +103,79 @@ class LanceDBManager:
             data = [data]
         return data
     
+    def _open_table(self, table_name: str):
+        """Open a table, reusing the cached handle when there is one"""
+        self._refresh_credentials()
+        table = self._tables.get(table_name)
+        record_cache("table_handle", table is not None)
+        if table is None:
+            table = self._tables[table_name] = self.db.open_table(table_name)
+        return table
+
+    def _open_version(self, table_name: str, version: int):
+        """Open a table checked out at a version, reusing the cached handle when there is one"""
+        key = (table_name, version)
+        with self._version_tables_lock:
+            table = self._version_tables.get(key)
+            if table is not None:
+                self._version_tables.move_to_end(key)
+        record_cache("version_handle", table is not None)
+        if table is None:
+            table = self.db.open_table(table_name)
+            table.checkout(version)
+            with self._version_tables_lock:
+                self._version_tables[key] = table
+                while len(self._version_tables) > VERSION_HANDLE_CACHE_SIZE:
+                    self._version_tables.popitem(last=False)
+        return table
+
+    def resolve_version(self, table_name: str, version: int = None, as_of: Union[str, datetime] = None) -> Optional[int]:
+        """
+        Resolve the version a read should use.
+
+        Args:
+            table_name (str): Name of the table.
+            version (int): An explicit version number, returned as is.
+            as_of (str | datetime): A point in time (ISO 8601, server local time without an offset),
+                resolved to the last version committed at or before it.
+
+        Returns:
+            int: The version number, or None to read the latest version.
+        """
+        if version is not None and as_of is not None:
+            raise ValueError("Pass either version or as_of, not both")
+        if as_of is None:
+            return version
+        if isinstance(as_of, str):
+            as_of = datetime.fromisoformat(as_of.replace("Z", "+00:00"))
+        if as_of.tzinfo is not None:
+            # lance reports commit times as naive local times
+            as_of = as_of.astimezone().replace(tzinfo=None)
+        versions = [v["version"] for v in self._open_table(table_name).list_versions() if v["timestamp"] <= as_of]
+        if not versions:
+            raise ValueError(f"Table '{table_name}' has no version as of {as_of.isoformat()}")
+        return max(versions)
+
+    @contextmanager
+    def _reading(self, table_name: str, operation: str, version: int = None):
+        """Open a table for a read, from the disk cache of a remote provider when it holds a copy"""
+        cache = self.storage.cache
+        if cache is None or version is not None:
+            with stage(operation, "open_table"):
+                table = self._open_table(table_name) if version is None else self._open_version(table_name, version)
+            yield table
+            return
+        with cache.reading(table_name) as from_disk:
+            with stage(operation, "open_table"):
+                table = cache.open_table(table_name) if from_disk else self._open_table(table_name)
+            yield table
+
+    def _written(self, table_name: str):
+        """Make reads after a write see it, the disk cache only catches up on its next sync"""
+        self.version_cache.invalidate(table_name)
+        if self.storage.cache is not None:
+            self.storage.cache.invalidate(table_name)
+
     def _get_embedder(self):
         """Lazy load embedder when needed"""
         if self.embedder is None:
@@ -90,7 +195,7 @@ class LanceDBManager:
             Table: LanceDB table object.
         """
         try:
-            return  self.db.open_table(table_name)
+            return  self._open_table(table_name)
         except Exception as e:
             logging.error(f"Error getting table '{table_name}': {e}")
             raise
@@ -107,6 +212,7 @@ class LanceDBManager:
             table = self.db.create_table(
                 table_name, schema=schema, exist_ok=True
             )
+            self._tables.pop(table_name, None)
             return table
         except Exception as e:
             logging.error(f"Error creating schema for table '{table_name}': {e}")   
@@ -123,6 +229,8 @@ class LanceDBManager:
         try:
             mode = "overwrite" if overwrite else "create"
             self.db.create_table(table_name, schema=schema, mode=mode)
+            self._tables.pop(table_name, None)
+            self._written(table_name)
             logging.info(f"Table '{table_name}' created successfully.")
         except Exception as e:
             logging.error(f"Error creating table '{table_name}': {e}")
@@ -145,13 +253,24 @@ class LanceDBManager:
             raise ValueError("Unique field must be specified to check for duplicates.")
 
         try:
-            table = self.db.open_table(table_name)
-            existing_ids = self._get_unique_ids(table, unique_field)
-            data = self._format_input_data(data)
+            return len(self._add_new_rows(table_name, self._format_input_data(data), unique_field))
+        except Exception as e:
+            logging.error(f"Error adding data to table '{table_name}': {e}")
+            raise
+
+    def _add_new_rows(self, table_name: str, data: List[Dict[str, Any]], unique_field: str) -> set:
+        """Add the rows whose unique field isn't in the table yet in one commit, returning their keys"""
+        # the lock keeps adds of this process from racing each other, the merge_insert commit also skips the ids
+        # another process inserted since they were read, so no id is inserted twice across processes either
+        with self.concurrency.write(table_name):
+            with stage("add_data", "open_table"):
+                table = self._open_table(table_name)
+            with stage("add_data", "query"):
+                existing_ids = self._get_unique_ids(table, unique_field)
             new_ids = [item[unique_field] for item in data] 
             
             #Get the difference between the existing ids and the new ids using set
-            new_ids = list(set(new_ids) - set(existing_ids))
+            new_ids = set(new_ids) - set(existing_ids)
     
             logging.info(f"Found {len(new_ids)} new entries to add to table '{table_name}'.")
 
@@ -159,15 +278,64 @@ class LanceDBManager:
             new_data = [item for item in data if item[unique_field] in new_ids]
             if len(new_data) == 0:
                 logging.info(f"No new entries to add to table '{table_name}'.")
-                return
-            
             else:
-                table.add(new_data)
-                logging.info(f"Added {len(new_data)} entries to table '{table_name}'.")
-            
-        except Exception as e:
-            logging.error(f"Error adding data to table '{table_name}': {e}")
-            
+                def insert():
+                    return table.merge_insert(unique_field).when_not_matched_insert_all().execute(new_data)
+
+                with stage("add_data", "write"):
+                    result = self.concurrency.retry_on_conflict(insert)
+                if result.num_inserted_rows < len(new_data):
+                    new_ids = self._inserted_keys(table, result.version, unique_field, result.num_inserted_rows)
+                self._written(table_name)
+                logging.info(f"Added {result.num_inserted_rows} entries to table '{table_name}'.")
+            return new_ids
+
+    def _inserted_keys(self, table, version: int, unique_field: str, rows: int) -> set:
+        """The keys of the rows a commit inserted, read from the fragments it wrote"""
+        dataset = table.to_lance()
+        diff = diff_versions(dataset.checkout_version(version - 1), dataset.checkout_version(version), limit=rows, columns=[unique_field])
+        return {row[unique_field] for row in diff["added"]}
+
+    async def add_data_buffered(self, table_name: str, data: List[Dict[str, Any]], unique_field: str) -> Dict[str, Any]:
+        """
+        Add data through the write buffer of the table when it has one (see routes.write_buffer), else directly.
+
+        Args:
+            table_name (str): Name of the table.
+            data (List[Dict[str, Any]]): List of data entries to add.
+            unique_field (str): Field to use for uniqueness check.
+
+        Returns:
+            dict: "added", the number of rows added, or "buffered", the number of rows accepted when the
+                buffer acknowledges adds before they are committed.
+        """
+        if not self.config.write_buffer.buffers(table_name):
+            return {"added": await self.concurrency.run("write", self.add_data, table_name, data, unique_field)}
+        if not unique_field:
+            raise ValueError("Unique field must be specified to check for duplicates.")
+        with self._write_buffers_lock:
+            buffer = self.write_buffers.get(table_name)
+            if buffer is None:
+                buffer = self.write_buffers[table_name] = TableWriteBuffer(
+                    table_name, unique_field,
+                    lambda rows: self._add_new_rows(table_name, rows, unique_field),
+                    self.config.write_buffer,
+                )
+        if buffer.unique_field != unique_field:
+            raise ValueError(f"Adds to '{table_name}' are buffered by '{buffer.unique_field}', not '{unique_field}'")
+        data = self._format_input_data(data)
+        added = buffer.append(data)
+        if self.config.write_buffer.durability == "buffer":
+            return {"buffered": len(data)}
+        return {"added": await asyncio.wrap_future(added)}
+
+    def flush_write_buffers(self):
+        """Commit the rows waiting in the write buffers, e.g. before the process exits"""
+        with self._write_buffers_lock:
+            buffers, self.write_buffers = list(self.write_buffers.values()), {}
+        for buffer in buffers:
+            buffer.close()
+
 
     def update_data(self, table_name: str, data: List[Dict[str, Any]], unique_field: str):
         """
@@ -186,21 +354,32 @@ class LanceDBManager:
 
         try:
             
-            table =  self.db.open_table(table_name)
             data = self._format_input_data(data)
-            
-            update_count = 0
+
+            # rows of the same key are applied in order, the later values win as if each row was its own update
+            rows_by_key = {}
             for row in data:
-                # Extract the unique field value and other fields to update
-                unique_value = row[unique_field]
+                rows_by_key.setdefault(row[unique_field], {}).update(row)
+
+            # rows that set the same values are updated together, one IN (...) predicate is one scan instead of one per row
+            groups = {}
+            for row in rows_by_key.values():
                 updates = {k: v for k, v in row.items() if k != unique_field}
-                
-                # Create where clause for this row
-                where_clause = f"{unique_field} = \"{unique_value}\""
-                
-                # Update the matching row using the correct parameter name 'updates'
-                table.update(values=updates, where=where_clause)
-                update_count += 1
+                group = json.dumps(updates, sort_keys=True, default=lambda v: v.tolist() if hasattr(v, "tolist") else str(v))
+                groups.setdefault(group, (updates, []))[1].append(row[unique_field])
+
+            update_count = 0
+            with self.concurrency.write(table_name):
+                table =  self._open_table(table_name)
+                if unique_field not in table.schema.names:
+                    raise FilterError(f"Unknown column '{unique_field}'")
+                key_type = table.schema.field(unique_field).type
+                for updates, keys in groups.values():
+                    for chunk in chunked(keys):
+                        where_clause = in_predicate(unique_field, chunk, key_type)
+                        self.concurrency.retry_on_conflict(table.update, values=updates, where=where_clause)
+                    update_count += len(keys)
+                self._written(table_name)
 
             logging.info(f"Updated {update_count} entries in table '{table_name}'.")
             return update_count
@@ -209,6 +388,101 @@ class LanceDBManager:
             logging.error(f"Error updating data in table '{table_name}': {e}")
             raise
 
+    def bulk_write(
+        self,
+        table_name: str,
+        rows: Union[bytes, List[Dict[str, Any]]],
+        mode: str = "append",
+        key: str = None,
+        derive: Dict[str, List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Add or upsert rows in any table in one commit, after casting them to its schema (see routes.ingest).
+
+        Args:
+            table_name (str): Name of the table.
+            rows (bytes | List[Dict]): NDJSON, or parsed JSON objects.
+            mode (str): append adds every row, insert only the rows whose key isn't in the table yet,
+                upsert also updates the rows whose key is.
+            key (str): Column rows are matched on by insert and upsert.
+            derive (Dict[str, List[str]]): Columns to set to the SHA-256 of the concatenation of other columns,
+                e.g. {"user_id": ["usename", "email"]}.
+
+        Returns:
+            dict: The number of rows received, inserted and updated, and the new version.
+        """
+        try:
+            with stage("bulk_write", "convert"):
+                data = prepare_rows(rows, self._open_table(table_name).schema, mode, key, derive)
+            if data.num_rows == 0:
+                return {"table": table_name, "mode": mode, "rows": 0, "inserted": 0, "updated": 0, "version": self._open_table(table_name).version}
+            with self.concurrency.write(table_name):
+                table = self._open_table(table_name)
+                with stage("bulk_write", "write"):
+                    if mode == "append":
+                        version = self.concurrency.retry_on_conflict(table.add, data).version
+                        inserted, updated = data.num_rows, 0
+                    else:
+                        def merge():
+                            builder = table.merge_insert(key).when_not_matched_insert_all()
+                            if mode == "upsert":
+                                builder = builder.when_matched_update_all()
+                            return builder.execute(data)
+
+                        result = self.concurrency.retry_on_conflict(merge)
+                        version, inserted, updated = result.version, result.num_inserted_rows, result.num_updated_rows
+                self._written(table_name)
+            logging.info(f"Bulk {mode} of {data.num_rows} rows into '{table_name}': {inserted} inserted, {updated} updated.")
+            return {"table": table_name, "mode": mode, "rows": data.num_rows, "inserted": inserted, "updated": updated, "version": version}
+        except Exception as e:
+            logging.error(f"Error writing rows to table '{table_name}': {e}")
+            raise
+
+    def _build_fetch_query(self, table, page: int, per_page: int, filter: str, columns_to_exclude: List[str], where: Dict[str, Any] = None):
+        """Build the paginated scan used by fetch_data, shared with explain_query so both plan the same query"""
+        if where:
+            filter = combine(filter, FilterCompiler.for_table(table).compile(where))
+        query = table.search()
+
+        # dont include the vector column in the results .select(["title", "text", "_distance"]) is used to define the columns to be returned
+        # !DANGER The paranthesis around async_table.to_pandas() is used to make sure that the head function is called on the dataframe and not coroutine
+
+        columns_to_include = [
+            col for col in table.schema.names if col not in columns_to_exclude
+        ]
+
+        # if _rowid is not included in the columns to include then it will not be returned
+        query = query.select(columns_to_include) if ("_rowid" in columns_to_exclude) else query.select(columns_to_include).with_row_id(True) 
+
+        # the "await async_table.count_rows()" is done like that beacause there is a bug in lancedb v0.17.0 that does not respect the limit(-1) when used with where clause
+        # https://github.com/lancedb/lancedb/issues/1852
+        if filter:
+            query = (
+                query.where(filter).limit(
+                    per_page).offset((page - 1) * per_page)
+                if per_page != -1
+                else query.where(filter).limit(table.count_rows())
+            )
+        else:
+            query = (
+                query.limit(per_page).offset((page - 1) * per_page)
+                if per_page != -1
+                else query.limit(table.count_rows())
+            )
+        return query
+
+    def _build_search_query(self, table, embedding, limit: int, columns_to_exclude: List[str], vector_column: str = "vector"):
+        """Build the nearest-neighbour query used by vector_search, shared with explain_query"""
+        columns_to_include = [
+            col for col in table.schema.names if col not in columns_to_exclude
+        ]
+        return (
+            table.search(query=embedding, vector_column_name=vector_column)
+            .select(columns_to_include)
+            .with_row_id(with_row_id=True)  
+            .limit(limit)
+        )
+
     def fetch_data(
         self,
         table_name: str,
@@ -217,6 +491,12 @@ class LanceDBManager:
         per_page: int = 10,
         filter: str = None,
         columns_to_exclude: List[str] = [],
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+        where: Dict[str, Any] = None,
+        order_by: str = None,
+        sort_cache: bool = False,
+        as_arrow: bool = False,
     ):
         """
         Fetch data from a LanceDB table with pagination and optional filtering.
@@ -228,47 +508,397 @@ class LanceDBManager:
             per_page (int): Number of items per page. Use -1 to fetch all data.
             filter (str): SQL filter expression. these are the filters that can be used - https://lancedb.github.io/lancedb/sql/#sql-filters
             columns_to_exclude (List[str]): List of columns to exclude from the results.
+            version (int): Read this version of the table instead of the latest one.
+            as_of (str | datetime): Read the version that was current at this time, see resolve_version.
+            where (dict): Structured filter (see routes.filters), combined with `filter` when both are given.
+            order_by (str): Sort the rows, e.g. "score:desc,user_id" (ascending unless ":desc" is given).
+            sort_cache (bool): Build and cache the sorted row order of this table version, filter and sort
+                key, so that every later page of it is a slice instead of a scan.
+            as_arrow (bool): Return the Arrow table as read, without converting it.
 
         Returns:
             DataFrame or List[Dict]: Fetched data.
             List[Dict]: Fetched data as a list of dictionaries if as_pandas is set to False.
+            pa.Table: Fetched data if as_arrow is set.
         """
         # docs used to make this function: https://lancedb.github.io/lancedb/sql/#pre-and-post-filtering
         try:
-            table = self.db.open_table(table_name)
-            query = table.search()
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "fetch_data", version) as table:
+                if order_by:
+                    results = self._fetch_sorted(table_name, table, page, per_page, filter, columns_to_exclude, where, order_by, sort_cache)
+                else:
+                    query = self._build_fetch_query(table, page, per_page, filter, columns_to_exclude, where)
+                    with stage("fetch_data", "query"):
+                        results = query.to_arrow()
+                if as_arrow:
+                    ROWS_RETURNED.inc("fetch_data", amount=results.num_rows)
+                    return results
+                with stage("fetch_data", "to_pandas"):
+                    df = results.to_pandas()
+                ROWS_RETURNED.inc("fetch_data", amount=len(df))
+                return df if as_pandas else df.to_dict(orient="records")
+        except Exception as e:
+            logging.error(f"Error fetching data from table '{table_name}': {e}")
+            raise
+       
 
-            # dont include the vector column in the results .select(["title", "text", "_distance"]) is used to define the columns to be returned
-            # !DANGER The paranthesis around async_table.to_pandas() is used to make sure that the head function is called on the dataframe and not coroutine
+    def _fetch_sorted(self, table_name: str, table, page: int, per_page: int, filter: str, columns_to_exclude: List[str],
+                      where: Dict[str, Any], order_by: str, sort_cache: bool):
+        """
+        Read one sorted page: the row ids of the page come from a cached permutation or from a top-k scan of
+        the sort columns, then only those rows are read with all the requested columns.
+        """
+        if where:
+            filter = combine(filter, FilterCompiler.for_table(table).compile(where))
+        sort_keys = parse_order_by(order_by, table.schema)
+        offset = (page - 1) * per_page if per_page != -1 else 0
+        depth = offset + per_page if per_page != -1 else None
 
-            columns_to_include = [
-                col for col in table.schema.names if col not in columns_to_exclude
-            ]
+        cache_key = (table_name, table.version, filter, tuple(sort_keys))
+        row_ids = self.sort_cache.get(cache_key)
+        if sort_path(row_ids is not None, sort_cache, depth) == "permutation_build":
+            with stage("fetch_data", "sort"):
+                row_ids = sorted_row_ids(scan_sort_columns(table, sort_keys, filter), sort_keys)
+            self.sort_cache.put(cache_key, row_ids)
+        if row_ids is not None:
+            page_ids = row_ids.slice(offset, depth - offset if depth is not None else None).to_pylist()
+        else:
+            with stage("fetch_data", "sort"):
+                candidates = top_k(scan_sort_columns(table, sort_keys, filter), sort_keys, depth)
+            page_ids = [] if candidates is None else candidates.column("_rowid").slice(offset).to_pylist()
 
-            # if _rowid is not included in the columns to include then it will not be returned
-            query = query.select(columns_to_include) if ("_rowid" in columns_to_exclude) else query.select(columns_to_include).with_row_id(True) 
-
-            # the "await async_table.count_rows()" is done like that beacause there is a bug in lancedb v0.17.0 that does not respect the limit(-1) when used with where clause
-            # https://github.com/lancedb/lancedb/issues/1852
-            if filter:
-                query = (
-                    query.where(filter).limit(
-                        per_page).offset((page - 1) * per_page)
-                    if per_page != -1
-                    else query.where(filter).limit(table.count_rows())
-                )
+        columns = [col for col in table.schema.names if col not in columns_to_exclude]
+        with stage("fetch_data", "query"):
+            rows = take_row_ids(table, page_ids, columns)
+        return rows.drop_columns(["_rowid"]) if "_rowid" in columns_to_exclude else rows
+
+    def aggregate(
+        self,
+        table_name: str,
+        aggregates: List[Dict[str, Any]],
+        group_by: List[str] = [],
+        filter: str = None,
+        where: Dict[str, Any] = None,
+        order_by: str = None,
+        limit: int = 1000,
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Group rows and compute counts, sums, means, minimums and maximums, see routes.aggregation.
+
+        Args:
+            table_name (str): Name of the table.
+            aggregates (List[dict]): The aggregates, e.g. [{"op": "mean", "column": "score", "as": "avg"}].
+            group_by (List[str]): Group key columns, none for one global row.
+            filter (str): SQL filter applied before grouping.
+            where (dict): Structured filter, combined with `filter` when both are given.
+            order_by (str): Sort the groups by result columns, e.g. "count:desc". By the group keys by default.
+            limit (int): Maximum number of groups returned, None for all. The total is always reported.
+            version (int): Aggregate this version of the table instead of the latest one.
+            as_of (str | datetime): Aggregate the version that was current at this time.
+
+        Returns:
+            dict: The table version, the number of groups and the group rows.
+        """
+        try:
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "aggregate", version) as table:
+                if where:
+                    filter = combine(filter, FilterCompiler.for_table(table).compile(where))
+                aggregation = Aggregation(table.schema, group_by, aggregates)
+                # results of a version never change, the latest version is part of the key as well
+                cache_key = (table_name, table.version, filter, aggregation.key(), order_by, limit)
+                cached = self.aggregate_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+                with stage("aggregate", "query"):
+                    if not aggregation.columns:
+                        result = aggregation.counted(table.count_rows(filter))
+                    else:
+                        query = table.search().select(aggregation.columns).limit(None)
+                        if filter:
+                            query = query.where(filter)
+                        result = aggregate_batches(aggregation, query.to_batches(SCAN_BATCH_ROWS))
+                groups = result.num_rows
+                result = order_and_limit(result, group_by, order_by, limit)
+                ROWS_RETURNED.inc("aggregate", amount=result.num_rows)
+                response = {
+                    "table": table_name,
+                    "version": table.version,
+                    "groups": groups,
+                    "truncated": groups > result.num_rows,
+                    "rows": result.to_pylist(),
+                }
+                self.aggregate_cache.put(cache_key, response)
+                return response
+        except Exception as e:
+            logging.error(f"Error aggregating table '{table_name}': {e}")
+            raise
+
+    def sample(
+        self,
+        table_name: str,
+        n: int = 100,
+        seed: int = None,
+        filter: str = None,
+        where: Dict[str, Any] = None,
+        stratify_by: str = None,
+        allocation: str = "proportional",
+        columns_to_exclude: List[str] = [],
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Draw a random sample of rows, see routes.sampling.
+
+        Args:
+            table_name (str): Name of the table.
+            n (int): Number of rows.
+            seed (int): Seed that makes the sample reproducible on the same version, random when None.
+            filter (str): Only sample rows matching this SQL filter.
+            where (dict): Structured filter, combined with `filter` when both are given.
+            stratify_by (str): Sample every value of this column separately.
+            allocation (str): "proportional" or "equal" rows per value of stratify_by.
+            columns_to_exclude (List[str]): List of columns to exclude from the results.
+            version (int): Sample this version of the table instead of the latest one.
+            as_of (str | datetime): Sample the version that was current at this time.
+
+        Returns:
+            dict: The version and seed of the sample, the number of eligible rows and the rows as a DataFrame.
+        """
+        try:
+            version = self.resolve_version(table_name, version, as_of)
+            seed = new_seed() if seed is None else seed
+            with self.concurrency.read(table_name), self._reading(table_name, "sample", version) as table:
+                if where:
+                    filter = combine(filter, FilterCompiler.for_table(table).compile(where))
+                columns = [col for col in table.schema.names if col not in columns_to_exclude]
+                with stage("sample", "query"):
+                    result = sample_rows(table, n, seed, columns, filter, stratify_by, allocation)
+                rows = result.pop("rows")
+                if "_rowid" in columns_to_exclude:
+                    rows = rows.drop_columns(["_rowid"])
+                with stage("sample", "to_pandas"):
+                    df = rows.to_pandas()
+                ROWS_RETURNED.inc("sample", amount=len(df))
+                return {"table": table_name, "version": table.version, "seed": seed, **result, "data": df}
+        except Exception as e:
+            logging.error(f"Error sampling table '{table_name}': {e}")
+            raise
+
+    def lookup(
+        self,
+        table_name: str,
+        row_ids: List[int] = None,
+        key: str = None,
+        values: List[Any] = None,
+        columns_to_exclude: List[str] = [],
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fetch many rows at once by row id or by key value, see routes.lookup.
+
+        Args:
+            table_name (str): Name of the table.
+            row_ids (List[int]): Row ids as returned in _rowid by fetch_data and vector_search.
+            key (str): Key column to look up `values` in instead, e.g. user_id. An index on it avoids the scan.
+            values (List[Any]): Key values.
+            columns_to_exclude (List[str]): List of columns to exclude from the results.
+            version (int): Read this version of the table instead of the latest one.
+            as_of (str | datetime): Read the version that was current at this time.
+
+        Returns:
+            dict: The version, the rows as a DataFrame in the order asked for, and the ids or values not found.
+        """
+        try:
+            if (row_ids is None) == (key is None):
+                raise ValueError("Look rows up either by row_ids or by key and values")
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "lookup", version) as table:
+                columns = [col for col in table.schema.names if col not in columns_to_exclude]
+                with stage("lookup", "query"):
+                    if row_ids is not None:
+                        rows = take_row_ids(table, row_ids, columns)
+                        found = set(rows.column("_rowid").to_pylist())
+                        missing = [row_id for row_id in row_ids if row_id not in found]
+                    else:
+                        if key not in table.schema.names:
+                            raise FilterError(f"Unknown column '{key}'")
+                        rows = take_keys(table, key, values or [], columns)
+                        found = set(rows.column(key).to_pylist())
+                        missing = [value for value in values or [] if value not in found]
+                        rows = rows.select(columns + ["_rowid"])
+                if "_rowid" in columns_to_exclude:
+                    rows = rows.drop_columns(["_rowid"])
+                with stage("lookup", "to_pandas"):
+                    df = rows.to_pandas()
+                ROWS_RETURNED.inc("lookup", amount=len(df))
+                return {"table": table_name, "version": table.version, "missing": missing, "data": df}
+        except Exception as e:
+            logging.error(f"Error looking up rows in table '{table_name}': {e}")
+            raise
+
+    def cell(
+        self,
+        table_name: str,
+        row_id: int,
+        column: str,
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read the full value of one cell, for values the fetch_data preview cut.
+
+        Args:
+            table_name (str): Name of the table.
+            row_id (int): Row id as returned in _rowid.
+            column (str): Column of the value.
+            version (int): Read this version of the table instead of the latest one.
+            as_of (str | datetime): Read the version that was current at this time.
+
+        Returns:
+            dict: The version and the value, None if there is no row with that id.
+        """
+        try:
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "cell", version) as table:
+                if column not in table.schema.names:
+                    raise FilterError(f"Unknown column '{column}'")
+                with stage("cell", "query"):
+                    rows = take_row_ids(table, [row_id], [column])
+                if rows.num_rows == 0:
+                    return None
+                return {
+                    "table": table_name,
+                    "version": table.version,
+                    "row_id": row_id,
+                    "column": column,
+                    "type": str(table.schema.field(column).type),
+                    "value": rows.column(column)[0].as_py(),
+                }
+        except Exception as e:
+            logging.error(f"Error reading cell '{column}' of row {row_id} in table '{table_name}': {e}")
+            raise
+
+    def backfill_embeddings(
+        self,
+        table_name: str,
+        source_column: str,
+        key: str,
+        vector_column: str = "vector",
+        model_column: str = None,
+        should_stop=None,
+        on_progress=None,
+    ) -> Dict[str, Any]:
+        """
+        Fill the vector column of the rows that have none, or a stale one, see routes.backfill.
+
+        The vector and model columns are added when the table doesn't have them. A backfill that was
+        interrupted resumes from its checkpoint in STATE_DIR.
+
+        Args:
+            table_name (str): Name of the table.
+            source_column (str): Text column to embed.
+            key (str): Unique column identifying the rows, the vectors are merged back on it.
+            vector_column (str): Column the vectors are written to.
+            model_column (str): Column recording the model of each vector, rows of another model are re-embedded.
+            should_stop (Callable): Polled between chunks, stops the backfill when it returns True.
+            on_progress (Callable): Called with the checkpoint after every committed chunk.
+
+        Returns:
+            dict: The final progress of the backfill.
+        """
+        checkpoint, path = None, BackfillCheckpoint.path(STATE_DIR, table_name, vector_column)
+        try:
+            embedder = self._get_embedder()
+            model = embedder_model(embedder)
+            with self.concurrency.write(table_name):
+                table = self._open_table(table_name)
+                for column in (source_column, key):
+                    if column not in table.schema.names:
+                        raise FilterError(f"Unknown column '{column}'")
+                new_fields = []
+                if vector_column not in table.schema.names:
+                    new_fields.append(pa.field(vector_column, pa.list_(pa.float32(), embedder.ndims())))
+                else:
+                    vector_type = table.schema.field(vector_column).type
+                    if not pa.types.is_fixed_size_list(vector_type) or vector_type.list_size != embedder.ndims():
+                        raise ValueError(f"Column '{vector_column}' is {vector_type}, the embedder makes {embedder.ndims()} dimensional vectors")
+                if model_column and model_column not in table.schema.names:
+                    new_fields.append(pa.field(model_column, pa.string()))
+                if new_fields:
+                    table.add_columns(pa.schema(new_fields))
+                    self._written(table_name)
+                vector_type = table.schema.field(vector_column).type
+                version = table.version
+
+            # the pending rows are read from the version the backfill starts at, its own commits don't move them
+            snapshot = self._open_version(table_name, version)
+            remaining = snapshot.count_rows(pending_filter(source_column, vector_column, model_column, model))
+            checkpoint = BackfillCheckpoint.load(path)
+            if checkpoint is None or checkpoint.status == "done" or (checkpoint.source_column, checkpoint.model, checkpoint.model_column) != (source_column, model, model_column):
+                checkpoint = BackfillCheckpoint(table_name, source_column, vector_column, model, model_column)
             else:
-                query = (
-                    query.limit(per_page).offset((page - 1) * per_page)
-                    if per_page != -1
-                    else query.limit(table.count_rows())
-                )
-            df = query.to_pandas()
-            return df if as_pandas else df.to_dict(orient="records")
+                logging.info(f"Resuming the backfill of '{table_name}.{vector_column}' after {checkpoint.rows_done} rows")
+                checkpoint.status, checkpoint.error = "running", None
+            checkpoint.rows_total = checkpoint.rows_done + remaining
+            checkpoint.save(path)
+
+            def write(data: pa.Table) -> int:
+                with self.concurrency.write(table_name):
+                    table = self._open_table(table_name)
+                    with stage("backfill", "merge"):
+                        self.concurrency.retry_on_conflict(
+                            lambda: table.merge_insert(key).when_matched_update_all().execute(data)
+                        )
+                    self._written(table_name)
+                    return table.version
+
+            def embed_batches(batches):
+                with stage("backfill", "embed"):
+                    return self.concurrency.embed_batches(embedder.generate_embeddings, batches)
+
+            checkpoint = run_backfill(snapshot, key, checkpoint, path, embed_batches, write, vector_type, should_stop, on_progress)
+            logging.info(f"Backfill of '{table_name}.{vector_column}' {checkpoint.status} after {checkpoint.rows_done} rows")
+            return checkpoint.to_dict()
         except Exception as e:
-            logging.error(f"Error fetching data from table '{table_name}': {e}")
+            if checkpoint is not None:
+                checkpoint.status, checkpoint.error = "failed", str(e)
+                checkpoint.save(path)
+            logging.error(f"Error backfilling embeddings of table '{table_name}': {e}")
+            raise
+
+    def backfill_status(self, table_name: str, vector_column: str = "vector") -> Optional[Dict[str, Any]]:
+        """The saved progress of the last backfill of a vector column, None if there was none"""
+        checkpoint = BackfillCheckpoint.load(BackfillCheckpoint.path(STATE_DIR, table_name, vector_column))
+        return checkpoint.to_dict() if checkpoint is not None else None
+
+    def _lance_datasets(self, table_names: List[str]) -> Dict[str, Any]:
+        return {table_name: self._open_table(table_name).to_lance() for table_name in table_names}
+
+    def sql_query(self, sql: str, limits: SqlLimits = None) -> SqlQuery:
+        """
+        Start a read-only SQL query over the tables of the database, see routes.sql.
+
+        Args:
+            sql (str): A single SELECT statement, tables are referenced by name.
+            limits (SqlLimits): Row, time and memory limits, from the environment when None.
+
+        Returns:
+            SqlQuery: The running query, its batches are read with next_batch() and it must be closed.
+        """
+        query = SqlQuery(sql, self._lance_datasets, self.db.table_names(limit=None), limits)
+        try:
+            with stage("sql", "plan"):
+                query.start()
+            return query
+        except Exception as e:
+            logging.error(f"Error running SQL query: {e}")
             raise
-       
 
     def vector_search(
         self,
@@ -277,6 +907,13 @@ class LanceDBManager:
         limit: int = 5,
         as_pandas: bool = True,
         columns_to_exclude: List[str] = [],
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+        rerank_with: str = None,
+        rerank_params: Dict[str, Any] = None,
+        candidate_multiplier: int = CANDIDATE_MULTIPLIER,
+        vector_column: str = "vector",
+        timings: Dict[str, float] = None,
     ):
         """
         Perform a vector search on a LanceDB table.
@@ -287,42 +924,358 @@ class LanceDBManager:
             limit (int): Number of search results to return.
             as_pandas (bool): Whether to return data as a pandas DataFrame.
             columns_to_exclude (List[str]): List of columns to exclude from the results.
+            version (int): Search this version of the table instead of the latest one.
+            as_of (str | datetime): Search the version that was current at this time, see resolve_version.
+            rerank_with (str): Reranker picking the results among limit x candidate_multiplier candidates,
+                e.g. mmr for diverse results, see routes.rerank.
+            rerank_params (dict): Parameters of the reranker, e.g. {"diversity": 0.3}.
+            candidate_multiplier (int): Candidates fetched per result for the reranker.
+            vector_column (str): The vector column searched, and compared by the reranker.
+            timings (dict): Filled with the milliseconds spent in each stage.
 
         Returns:
             DataFrame: Search results.
             List[Dict]: Search results as a list of dictionaries. if as_pandas is set to False
         """
         try:
-            table = self.db.open_table(table_name)
-
-            # dont include the vector column in the results .select(["title", "text", "_distance"]) is used to define the columns to be returned
-            # !DANGER The paranthesis around async_table.to_pandas() is used to make sure that the head function is called on the dataframe and not coroutine
-
-            columns_to_include = [
-                col for col in table.schema.names if col not in columns_to_exclude
-            ]
-
-            # Get embedder only when needed
+            # Get embedder only when needed, the embedding call runs on its own pool and before taking the table lock
             embedder = self._get_embedder()
-            embedding = embedder.generate_embeddings([query])[0]
-
-            # Perform vector search
-            # results = await async_table.vector_search(embedding).limit(limit).to_pandas()
-            results = (
-                table.search(query=embedding)
-                .select(columns_to_include)
-                .with_row_id(with_row_id=True)  
-                .limit(limit)
-                .to_pandas()
-            )
+            with stage("vector_search", "embed", timings):
+                embedding = self.concurrency.embed(embedder.generate_embeddings, [query])[0]
+
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "vector_search", version) as table:
+                # Perform vector search
+                # results = await async_table.vector_search(embedding).limit(limit).to_pandas()
+                if rerank_with is None:
+                    with stage("vector_search", "query", timings):
+                        results = self._build_search_query(table, embedding, limit, columns_to_exclude, vector_column).to_arrow()
+                else:
+                    # the candidates keep their vectors for the reranker, they are dropped afterwards if excluded
+                    candidates = min(max(limit * candidate_multiplier, limit), MAX_CANDIDATES)
+                    kept = [column for column in columns_to_exclude if column != vector_column]
+                    with stage("vector_search", "query", timings):
+                        results = self._build_search_query(table, embedding, candidates, kept, vector_column).to_arrow()
+                    with stage("vector_search", "rerank", timings):
+                        results = rerank(rerank_with, embedding, results, vector_column, limit, rerank_params)
+                    if vector_column in columns_to_exclude:
+                        results = results.drop_columns([vector_column])
+                with stage("vector_search", "to_pandas", timings):
+                    results = results.to_pandas()
+                ROWS_RETURNED.inc("vector_search", amount=len(results))
 
-            return results if as_pandas else results.to_dict(orient="records")
+                return results if as_pandas else results.to_dict(orient="records")
         except Exception as e:
             logging.error(
                 f"Error performing vector search on table '{table_name}': {e}"
             )
             raise
 
+    def similar_rows(
+        self,
+        table_name: str,
+        row_ids: List[int] = None,
+        key: str = None,
+        values: List[Any] = None,
+        limit: int = 5,
+        vector_column: str = "vector",
+        columns_to_exclude: List[str] = [],
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Find the rows nearest to seed rows, searching with their stored vectors, so no embedding call is made.
+
+        Every seed is searched with in one batched query, a row near several seeds is ranked by the nearest
+        one. The seeds themselves are left out of the results.
+
+        Args:
+            table_name (str): Name of the table.
+            row_ids (List[int]): Row ids of the seed rows, as returned in _rowid.
+            key (str): Key column to find the seed rows by `values` in instead, e.g. user_id.
+            values (List[Any]): Key values of the seed rows.
+            limit (int): Number of search results to return.
+            vector_column (str): The vector column to search.
+            columns_to_exclude (List[str]): List of columns to exclude from the results.
+            version (int): Search this version of the table instead of the latest one.
+            as_of (str | datetime): Search the version that was current at this time.
+
+        Returns:
+            dict: The version, the results as a DataFrame, and the seed ids or values that weren't found or have no vector.
+        """
+        try:
+            if (row_ids is None) == (key is None):
+                raise ValueError("Give the seed rows either by row_ids or by key and values")
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "similar_rows", version) as table:
+                if vector_column not in table.schema.names or not pa.types.is_fixed_size_list(table.schema.field(vector_column).type):
+                    raise FilterError(f"'{vector_column}' is not a vector column")
+                with stage("similar_rows", "take"):
+                    if row_ids is not None:
+                        seeds = take_row_ids(table, row_ids, [vector_column])
+                        requested, found = row_ids, seeds.column("_rowid")
+                    else:
+                        if key not in table.schema.names:
+                            raise FilterError(f"Unknown column '{key}'")
+                        seeds = take_keys(table, key, values or [], [vector_column])
+                        requested, found = values or [], seeds.column(key)
+                    found = set(found.filter(seeds.column(vector_column).is_valid()).to_pylist())
+                    missing = [seed for seed in requested if seed not in found]
+                    seeds = seeds.filter(seeds.column(vector_column).is_valid())
+
+                columns = [col for col in table.schema.names if col not in columns_to_exclude]
+                with stage("similar_rows", "query"):
+                    if seeds.num_rows == 0:
+                        results = no_rows(table, columns)
+                    else:
+                        vectors = seeds.column(vector_column).combine_chunks()
+                        vectors = vectors.flatten().to_numpy(zero_copy_only=False).reshape(len(vectors), -1)
+                        # each seed may find itself and the other seeds
+                        results = (
+                            table.search(list(vectors), vector_column_name=vector_column)
+                            .select(columns)
+                            .with_row_id(True)
+                            .limit(limit + seeds.num_rows)
+                            .to_arrow()
+                        )
+                        results = _nearest_first(results, seeds.column("_rowid"), limit)
+                if "_rowid" in columns_to_exclude:
+                    results = results.drop_columns(["_rowid"])
+                with stage("similar_rows", "to_pandas"):
+                    df = results.to_pandas()
+                ROWS_RETURNED.inc("similar_rows", amount=len(df))
+                return {"table": table_name, "version": table.version, "missing": missing, "data": df}
+        except Exception as e:
+            logging.error(f"Error searching rows similar to seeds in table '{table_name}': {e}")
+            raise
+
+    def explain_query(
+        self,
+        table_name: str,
+        kind: str = "fetch",
+        analyze: bool = False,
+        query: str = None,
+        limit: int = 5,
+        page: int = 1,
+        per_page: int = 10,
+        filter: str = None,
+        columns_to_exclude: List[str] = [],
+        where: Dict[str, Any] = None,
+        vector_column: str = "vector",
+        version: int = None,
+        as_of: Union[str, datetime] = None,
+        order_by: str = None,
+        sort_cache: bool = False,
+        rerank_with: str = None,
+        candidate_multiplier: int = CANDIDATE_MULTIPLIER,
+    ) -> Dict[str, Any]:
+        """
+        Return the Lance query plan of a fetch_data or vector_search call without changing how it would run.
+
+        A sorted fetch plans the scan of the sort columns, and reports under "sort" whether the page would
+        come from a cached permutation, build one or run a top-k. A reranked search plans the candidate search.
+
+        Args:
+            table_name (str): Name of the table.
+            kind (str): "fetch" to plan fetch_data, "search" to plan vector_search.
+            analyze (bool): Also run the query and report the measured metrics of every plan node.
+            query (str): Query text, only used when kind is "search".
+            limit (int): Number of search results, only used when kind is "search".
+            page (int): Page number, only used when kind is "fetch".
+            per_page (int): Number of items per page, only used when kind is "fetch".
+            filter (str): SQL filter expression, only used when kind is "fetch".
+            columns_to_exclude (List[str]): List of columns to exclude from the results.
+            where (dict): Structured filter, only used when kind is "fetch".
+            vector_column (str): The vector column searched, only used when kind is "search".
+            version (int): Plan the query on this version of the table instead of the latest one.
+            as_of (str | datetime): Plan the query on the version that was current at this time, see resolve_version.
+            order_by (str): Sort the rows, e.g. "score:desc,user_id", only used when kind is "fetch".
+            sort_cache (bool): Whether the fetch would build the sorted permutation, only used with order_by.
+            rerank_with (str): Reranker of the search, only used when kind is "search".
+            candidate_multiplier (int): Candidates fetched per result for the reranker.
+
+        Returns:
+            Dict[str, Any]: The plan text, the parsed plan nodes, the table's indices and a summary of how the query reads data.
+        """
+        if kind not in ("fetch", "search"):
+            raise ValueError(f"Unsupported query kind '{kind}', expected 'fetch' or 'search'.")
+        if rerank_with is not None and rerank_with not in RERANKERS:
+            raise RerankError(f"Unknown reranker '{rerank_with}', one of {', '.join(sorted(RERANKERS))}")
+        try:
+            timings = {}
+            embedding = None
+            if kind == "search":
+                embedder = self._get_embedder()
+                started = time.perf_counter()
+                embedding = self.concurrency.embed(embedder.generate_embeddings, [query])[0]
+                timings["embed_ms"] = (time.perf_counter() - started) * 1000
+
+            extra = {}
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "explain", version) as table:
+                if kind == "search" and rerank_with is not None:
+                    # vector_search plans the same query for the candidates, keeping their vectors
+                    candidates = min(max(limit * candidate_multiplier, limit), MAX_CANDIDATES)
+                    kept = [column for column in columns_to_exclude if column != vector_column]
+                    builder = self._build_search_query(table, embedding, candidates, kept, vector_column)
+                    extra["rerank"] = {"with": rerank_with, "candidates": candidates}
+                elif kind == "search":
+                    builder = self._build_search_query(table, embedding, limit, columns_to_exclude, vector_column)
+                elif order_by:
+                    if where:
+                        filter = combine(filter, FilterCompiler.for_table(table).compile(where))
+                    sort_keys = parse_order_by(order_by, table.schema)
+                    depth = page * per_page if per_page != -1 else None
+                    cached = (table_name, table.version, filter, tuple(sort_keys)) in self.sort_cache
+                    builder = sort_columns_query(table, sort_keys, filter)
+                    extra["sort"] = {"path": sort_path(cached, sort_cache, depth), "depth": depth}
+                else:
+                    builder = self._build_fetch_query(table, page, per_page, filter, columns_to_exclude, where)
+
+                started = time.perf_counter()
+                plan = builder.analyze_plan() if analyze else builder.explain_plan(verbose=True)
+                timings["plan_ms" if not analyze else "execute_ms"] = (time.perf_counter() - started) * 1000
+                indices = [
+                    {"name": index.name, "index_type": str(index.index_type), "columns": list(index.columns)}
+                    for index in table.list_indices()
+                ]
+
+            nodes = parse_plan(plan)
+            return {
+                "table": table_name,
+                "kind": kind,
+                "version": table.version,
+                "analyze": analyze,
+                "plan": plan,
+                "nodes": nodes,
+                "summary": summarize_plan(nodes),
+                "indices": indices,
+                "timings": timings,
+                **extra,
+            }
+        except Exception as e:
+            logging.error(f"Error explaining query on table '{table_name}': {e}")
+            raise
+
+    def latest_version(self, table_name: str) -> int:
+        """Check the latest version of a table, a cheap manifest lookup that reads no data"""
+        with self.concurrency.read(table_name):
+            return self._open_table(table_name).version
+
+    def cached_version(self, table_name: str) -> int:
+        """The latest version of a table, trusted for a short TTL so that revalidations don't reach storage"""
+        return self.version_cache.get(table_name, lambda: self.latest_version(table_name))
+
+    def list_versions(self, table_name: str) -> List[Dict[str, Any]]:
+        """
+        List the versions of a table with the summary lance keeps for each of them.
+
+        Args:
+            table_name (str): Name of the table.
+
+        Returns:
+            List[Dict]: Version number, commit time and row, fragment and file totals of every version.
+        """
+        try:
+            with self.concurrency.read(table_name):
+                versions = self._open_table(table_name).list_versions()
+            return [
+                {
+                    "version": v["version"],
+                    "timestamp": v["timestamp"].isoformat(),
+                    **{name: _to_number(value) for name, value in (v.get("metadata") or {}).items()},
+                }
+                for v in versions
+            ]
+        except Exception as e:
+            logging.error(f"Error listing versions of table '{table_name}': {e}")
+            raise
+
+    def table_stats(self, table_name: str, version: int = None, as_of: Union[str, datetime] = None) -> Dict[str, Any]:
+        """
+        Summarize a table, or one of its versions, from its manifest without scanning it.
+
+        Args:
+            table_name (str): Name of the table.
+            version (int): Describe this version instead of the latest one.
+            as_of (str | datetime): Describe the version that was current at this time, see resolve_version.
+
+        Returns:
+            dict: Version, commit time, row and fragment counts, size, schema and indices.
+        """
+        try:
+            version = self.resolve_version(table_name, version, as_of)
+            with self.concurrency.read(table_name), self._reading(table_name, "table_stats", version) as table:
+                current = table.version
+                versions = table.list_versions()
+                summary = next((v for v in versions if v["version"] == current), {})
+                return {
+                    "table": table_name,
+                    "version": current,
+                    "latest_version": max(v["version"] for v in versions),
+                    "timestamp": summary["timestamp"].isoformat() if summary else None,
+                    "rows": table.count_rows(),
+                    **{name: _to_number(value) for name, value in (summary.get("metadata") or {}).items() if name != "total_rows"},
+                    "schema": [{"name": field.name, "type": str(field.type)} for field in table.schema],
+                    "indices": [
+                        {"name": index.name, "index_type": str(index.index_type), "columns": list(index.columns)}
+                        for index in table.list_indices()
+                    ],
+                }
+        except Exception as e:
+            logging.error(f"Error reading stats of table '{table_name}': {e}")
+            raise
+
+    def diff_versions(
+        self,
+        table_name: str,
+        from_version: int,
+        to_version: int = None,
+        key: str = None,
+        limit: int = 100,
+        columns_to_exclude: List[str] = [],
+    ) -> Dict[str, Any]:
+        """
+        Report the rows added, deleted and updated between two versions of a table.
+
+        Only the fragments that differ between the versions are read, see routes.version_diff.
+
+        Args:
+            table_name (str): Name of the table.
+            from_version (int): The older version.
+            to_version (int): The newer version, the latest one when None.
+            key (str): Column identifying a row across versions, needed to tell updates from delete + insert.
+            limit (int): Maximum number of rows returned per category.
+            columns_to_exclude (List[str]): Columns left out of the returned rows, e.g. vectors.
+
+        Returns:
+            dict: Schema changes, fragment and row counts and up to `limit` rows per category.
+        """
+        try:
+            started = time.perf_counter()
+            with self.concurrency.read(table_name):
+                dataset = self._open_table(table_name).to_lance()
+                to_version = to_version if to_version is not None else dataset.latest_version
+                before = dataset.checkout_version(from_version)
+                after = dataset.checkout_version(to_version)
+                names_before, names_after = before.schema.names, after.schema.names
+                columns = [name for name in names_after if name in names_before and name not in columns_to_exclude]
+                diff = diff_versions(before, after, key=key, limit=limit, columns=columns)
+            return {
+                "table": table_name,
+                "from_version": from_version,
+                "to_version": to_version,
+                "schema": {
+                    "added": [name for name in names_after if name not in names_before],
+                    "removed": [name for name in names_before if name not in names_after],
+                },
+                **diff,
+                "timings": {"diff_ms": (time.perf_counter() - started) * 1000},
+            }
+        except Exception as e:
+            logging.error(f"Error diffing versions of table '{table_name}': {e}")
+            raise
+
     def delete_table(self, table_name: str):
         """
         Delete a table from LanceDB.
@@ -331,27 +1284,47 @@ class LanceDBManager:
             table_name (str): Name of the table to delete.
         """
         try:
-            self.db.drop_table(table_name)
+            with self.concurrency.write(table_name):
+                self.db.drop_table(table_name)
+                self._tables.pop(table_name, None)
+                self.sort_cache.invalidate(table_name)
+                self.aggregate_cache.invalidate(table_name)
+                self.version_cache.invalidate(table_name)
+                if self.storage.cache is not None:
+                    self.storage.cache.remove(table_name)
             logging.info(f"Table '{table_name}' deleted successfully.")
             return True
         except Exception as e:
             logging.error(f"Error deleting table '{table_name}': {e}")
             raise
 
-    def delete_rows(self, table_name: str, condition: str):
+    def delete_rows(self, table_name: str, condition: str = None, where: Dict[str, Any] = None) -> int:
         """
         Delete rows from a table based on a condition.
 
         Args:
             table_name (str): Name of the table.
             condition (str): Condition to match rows for deletion.
+            where (dict): Structured filter (see routes.filters), combined with `condition` when both are given.
+
+        Returns:
+            int: Number of rows deleted.
         """
         try:
-            table = self.db.open_table(table_name)
-            table.delete(where=condition)
+            with self.concurrency.write(table_name):
+                table = self._open_table(table_name)
+                if where:
+                    condition = combine(condition, FilterCompiler.for_table(table).compile(where))
+                if not condition:
+                    raise FilterError("A condition is needed to delete rows")
+                rows_before = table.count_rows()
+                self.concurrency.retry_on_conflict(table.delete, where=condition)
+                deleted = rows_before - table.count_rows()
+                self._written(table_name)
             logging.info(
-                f"Rows matching condition '{condition}' deleted from table '{table_name}'."
+                f"{deleted} rows matching condition '{condition}' deleted from table '{table_name}'."
             )
+            return deleted
         except Exception as e:
             logging.error(f"Error deleting rows from table '{table_name}': {e}")
             raise
@@ -368,20 +1341,24 @@ class LanceDBManager:
             int: Number of duplicate rows removed.
         """
         try:
-            table = self.db.open_table(table_name)
+            return await self.concurrency.run("write", self._delete_duplicates, table_name, subset)
+        except Exception as e:
+            logging.error(f"Error deleting duplicates from table '{table_name}': {e}")
+            raise
 
-            # Fetch the table's data
-            df = table.to_pandas()
+    def _delete_duplicates(self, table_name: str, subset: List[str]) -> int:
+        with self.concurrency.write(table_name):
+            table = self._open_table(table_name)
 
-            # Drop duplicates based on the specified subset
-            df_unique = df.drop_duplicates(subset=subset)
-            duplicates_removed = len(df) - len(df_unique)
+            # Fetch the table's data, only the subset columns go through pandas
+            data = table.to_arrow()
+            duplicated = data.select(subset).to_pandas().duplicated(subset=subset).to_numpy()
+            duplicates_removed = int(duplicated.sum())
 
             if duplicates_removed > 0:
-                # Overwrite the table with the unique data
-                table.add(
-                    df_unique.to_dict(orient="records"), mode="overwrite"
-                )
+                # Overwrite the table with the unique rows, kept as Arrow so vector columns keep their type
+                table.add(data.filter(pa.array(~duplicated)), mode="overwrite")
+                self._written(table_name)
                 logging.info(
                     f"Removed {duplicates_removed} duplicate rows from table '{table_name}'."
                 )
@@ -389,8 +1366,145 @@ class LanceDBManager:
                 logging.info(f"No duplicates found in table '{table_name}'.")
 
             return duplicates_removed
+
+    def near_duplicates(
+        self,
+        table_name: str,
+        column: str = "vector",
+        threshold: float = 0.95,
+        delete: bool = False,
+        use_index: bool = None,
+        neighbors: int = DEFAULT_NEIGHBORS,
+        block_rows: int = BLOCK_ROWS,
+        should_stop: Callable[[], bool] = None,
+        on_progress: Callable[[int, int], None] = None,
+    ) -> Dict[str, Any]:
+        """
+        Find clusters of rows whose vectors have a cosine similarity of at least `threshold` (see
+        routes.near_duplicates), and optionally delete all but the first row of each.
+
+        Args:
+            table_name (str): Name of the table.
+            column (str): The vector column.
+            threshold (float): Cosine similarity from which two rows are near duplicates.
+            delete (bool): Delete every row of a cluster but the one with the smallest row id.
+            use_index (bool): Search the cosine vector index of the column for the `neighbors` nearest rows
+                of each row instead of comparing every pair. By default the index is used when there is one and the
+                table is large enough for it to be faster, see routes.near_duplicates.INDEX_MIN_WORK.
+            neighbors (int): Neighbors per row searched with the index.
+            block_rows (int): Vectors compared or searched at a time.
+            should_stop (Callable): Polled between blocks, the search stops when it returns True.
+            on_progress (Callable): Called with the work done and its total.
+
+        Returns:
+            dict: The version searched, the method, the number of clusters and of duplicate rows, the first
+                MAX_CLUSTERS_REPORTED clusters, the rows deleted, and the status, "stopped" when it stopped early.
+        """
+        try:
+            table = self._open_table(table_name)
+            version = table.version
+            indexed = column in table.schema.names and vector_index_metric(table, column) == "cosine"
+            if use_index and not indexed:
+                raise NearDuplicateError(f"'{column}' has no vector index with the cosine distance")
+            if use_index is None:
+                use_index = indexed and prefer_index(table.count_rows(), table.schema.field(column).type.list_size)
+            with stage("near_duplicates", "search"):
+                clusters = find_clusters(
+                    table, column, threshold, neighbors if use_index else None, block_rows, should_stop, on_progress
+                )
+            result = {"table": table_name, "column": column, "version": version, "method": "index" if use_index else "exhaustive"}
+            if clusters is None:
+                return {**result, "status": "stopped"}
+
+            deleted = 0
+            duplicates = [row_id for members in clusters for row_id in members[1:]]
+            if delete and duplicates:
+                with self.concurrency.write(table_name):
+                    table = self._open_table(table_name)
+                    # row ids are positions in fragments, a compaction since the search moved the rows
+                    searched = {fragment.fragment_id for fragment in self._open_version(table_name, version).to_lance().get_fragments()}
+                    if not searched <= {fragment.fragment_id for fragment in table.to_lance().get_fragments()}:
+                        raise NearDuplicateError(f"'{table_name}' was compacted during the search, run it again")
+                    rows_before = table.count_rows()
+                    with stage("near_duplicates", "delete"):
+                        for chunk in chunked(duplicates):
+                            self.concurrency.retry_on_conflict(table.delete, f"_rowid IN ({', '.join(map(str, chunk))})")
+                    deleted = rows_before - table.count_rows()
+                    self._written(table_name)
+                logging.info(f"Deleted {deleted} near duplicate rows from table '{table_name}'.")
+            return {
+                **result,
+                "status": "done",
+                "threshold": threshold,
+                "clusters": len(clusters),
+                "duplicate_rows": len(duplicates),
+                "deleted": deleted,
+                "clusters_reported": [{"keep": members[0], "row_ids": members} for members in clusters[:MAX_CLUSTERS_REPORTED]],
+            }
         except Exception as e:
-            logging.error(f"Error deleting duplicates from table '{table_name}': {e}")
+            logging.error(f"Error finding near duplicates in table '{table_name}': {e}")
+            raise
+
+    def optimize_table(self, table_name: str, cleanup_older_than_days: float = None) -> Dict[str, Any]:
+        """
+        Compact the small fragments left by many appends and deletes, and bring the indices up to date.
+
+        Runs alongside other writes, a commit conflict with one of them is retried.
+
+        Args:
+            table_name (str): Name of the table.
+            cleanup_older_than_days (float): Also remove the files of versions older than this many days.
+
+        Returns:
+            dict: The number of fragments before and after, and the new version.
+        """
+        try:
+            table = self._open_table(table_name)
+            fragments = len(table.to_lance().get_fragments())
+            cleanup = timedelta(days=cleanup_older_than_days) if cleanup_older_than_days is not None else None
+            with stage("optimize", "compact"):
+                self.concurrency.retry_on_conflict(table.optimize, cleanup_older_than=cleanup)
+            self._written(table_name)
+            return {
+                "table": table_name,
+                "fragments_before": fragments,
+                "fragments_after": len(table.to_lance().get_fragments()),
+                "version": table.version,
+            }
+        except Exception as e:
+            logging.error(f"Error optimizing table '{table_name}': {e}")
+            raise
+
+    def create_index(self, table_name: str, column: str, index_type: str = None, replace: bool = True) -> Dict[str, Any]:
+        """
+        Build an index on a column: a vector index (IVF_PQ by default) on a fixed size list column,
+        a scalar index (BTREE by default, or BITMAP, LABEL_LIST) on any other column.
+
+        Args:
+            table_name (str): Name of the table.
+            column (str): Column to index.
+            index_type (str): Type of the index, defaults by the type of the column.
+            replace (bool): Replace an existing index on the column.
+
+        Returns:
+            dict: The index type and the new version.
+        """
+        try:
+            table = self._open_table(table_name)
+            if column not in table.schema.names:
+                raise FilterError(f"Unknown column '{column}'")
+            if pa.types.is_fixed_size_list(table.schema.field(column).type):
+                index_type = (index_type or "IVF_PQ").upper()
+                build = lambda: table.create_index(vector_column_name=column, index_type=index_type, replace=replace)
+            else:
+                index_type = (index_type or "BTREE").upper()
+                build = lambda: table.create_scalar_index(column, index_type=index_type, replace=replace)
+            with stage("index", "build"):
+                self.concurrency.retry_on_conflict(build)
+            self._written(table_name)
+            return {"table": table_name, "column": column, "index_type": index_type, "version": table.version}
+        except Exception as e:
+            logging.error(f"Error creating an index on '{table_name}.{column}': {e}")
             raise
 
     def list_tables(self) -> List[str]:
@@ -404,4 +1518,58 @@ class LanceDBManager:
             return self.db.table_names()
         except Exception as e:
             logging.error(f"Error listing tables: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def acquire(self) -> "LanceDBManager":
+        """Count a user of the manager, close_when_idle waits until every user released it"""
+        with self._users_changed:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._users_changed:
+            self._users -= 1
+            self._users_changed.notify_all()
+
+    @contextmanager
+    def in_use(self):
+        """Keep the manager open while the block runs"""
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def close(self):
+        """Release the worker pools of this manager, e.g. when it is replaced by a new connection"""
+        self.flush_write_buffers()
+        self.concurrency.shutdown()
+        if self.storage.cache is not None:
+            self.storage.cache.close()
+
+    def close_when_idle(self):
+        """Close the manager in the background once its last user released it"""
+        def close():
+            with self._users_changed:
+                self._users_changed.wait_for(lambda: self._users == 0)
+            self.close()
+
+        threading.Thread(target=close, name="close-replaced-manager", daemon=True).start()
+
+
+def _nearest_first(results: pa.Table, excluded_row_ids: pa.ChunkedArray, limit: int) -> pa.Table:
+    """The `limit` nearest rows of a batched search, once each and without the excluded ones"""
+    if "query_index" in results.column_names:
+        results = results.drop_columns(["query_index"])
+    results = results.filter(pc.invert(pc.is_in(results.column("_rowid"), excluded_row_ids.combine_chunks())))
+    results = results.take(pc.sort_indices(results, [("_distance", "ascending")]))
+    _, first = np.unique(results.column("_rowid").to_numpy(), return_index=True)
+    return results.take(np.sort(first)[:limit])
+
+
+def _to_number(value):
+    """Version summaries hold their counts as strings"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
@@ -0,0 +1,180 @@
+"""
+Near-duplicate detection: clusters of rows whose vectors have a cosine similarity above a threshold.
+
+Without a vector index every vector is compared with every other one in blocked matrix products. A block of
+unit vectors is held in memory and multiplied with itself and with each block after it as the table is
+scanned again from there. Memory stays at two blocks and their similarity matrix however large the table
+is, while the run time grows with the square of the rows.
+
+With a cosine vector index on the column, the nearest `neighbors` of a whole block are found with one
+batched ANN search instead, which grows roughly linearly with the rows. Its distances are refined on the
+full vectors, so the threshold applies to exact similarities. An ANN search costs a few milliseconds per
+row however small the table is, so the index is only used by default once rows x dimensions reach
+INDEX_MIN_WORK, below that comparing every pair is faster.
+
+Pairs above the threshold are merged into clusters with a union-find over row ids as they are found, so
+a pair list that could grow with the square of the rows is never kept.
+"""
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from routes.filters import quote_identifier
+
+# vectors per block, a block product is BLOCK_ROWS x BLOCK_ROWS similarities
+BLOCK_ROWS = int(os.getenv("LANCEDB_NEAR_DUPLICATES_BLOCK_ROWS", 4096))
+DEFAULT_NEIGHBORS = 10
+# rows x dimensions from which the vector index is used by default, e.g. 150k rows of 64 or 13k of 768 dimensions
+INDEX_MIN_WORK = int(os.getenv("LANCEDB_NEAR_DUPLICATES_INDEX_MIN_WORK", 10_000_000))
+# clusters listed in a result, the counts cover all of them
+MAX_CLUSTERS_REPORTED = 1000
+
+
+class NearDuplicateError(ValueError):
+    """A near-duplicate search that can't run, e.g. on a column that isn't a vector"""
+
+
+class UnionFind:
+    """Disjoint sets of row ids, only the ids that were merged with another one are kept"""
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: int, b: int):
+        self.parent.setdefault(a, a)
+        self.parent.setdefault(b, b)
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            # the smallest row id is the root, and the member a cluster keeps
+            self.parent[max(a, b)] = min(a, b)
+
+    def clusters(self) -> List[List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for x in self.parent:
+            groups.setdefault(self.find(x), []).append(x)
+        return sorted(sorted(members) for members in groups.values())
+
+
+def vector_index_metric(table, column: str) -> Optional[str]:
+    """The distance type of the vector index on a column, None when it has none"""
+    for index in table.list_indices():
+        if list(index.columns) == [column]:
+            stats = table.index_stats(index.name)
+            if stats is not None and getattr(stats, "distance_type", None):
+                return stats.distance_type
+    return None
+
+
+def prefer_index(rows: int, dimensions: int) -> bool:
+    """Whether an ANN search per row is expected to beat comparing every pair"""
+    return rows * dimensions >= INDEX_MIN_WORK
+
+
+def unit_vectors(column: pa.Array) -> np.ndarray:
+    """The vectors of a fixed size list column as rows of a float32 matrix, scaled to length 1"""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    values = column.flatten().to_numpy(zero_copy_only=False).astype(np.float32, copy=False)
+    vectors = values.reshape(len(column), column.type.list_size)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _blocks(dataset, column: str, offset: int, block_rows: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Row ids and unit vectors of the rows with a vector, from the offset-th one on"""
+    batches = dataset.to_batches(
+        columns=[column], filter=f"{quote_identifier(column)} IS NOT NULL", with_row_id=True,
+        offset=offset, batch_size=block_rows,
+    )
+    for batch in batches:
+        if batch.num_rows:
+            yield batch.column("_rowid").to_numpy(), unit_vectors(batch.column(column))
+
+
+def _exhaustive_pairs(dataset, column: str, threshold: float, block_rows: int) -> Iterator[Tuple[np.ndarray, np.ndarray, int]]:
+    """Pairs of row ids above the threshold and the comparisons made, one block product at a time"""
+    start = 0
+    for ids, vectors in _blocks(dataset, column, 0, block_rows):
+        start += len(ids)
+        left, right = np.nonzero(np.triu(vectors @ vectors.T >= threshold, k=1))
+        yield ids[left], ids[right], len(ids) * (len(ids) - 1) // 2
+        for other_ids, other_vectors in _blocks(dataset, column, start, block_rows):
+            left, right = np.nonzero(vectors @ other_vectors.T >= threshold)
+            yield ids[left], other_ids[right], len(ids) * len(other_ids)
+
+
+def _indexed_pairs(table, dataset, column: str, threshold: float, neighbors: int, block_rows: int) -> Iterator[Tuple[np.ndarray, np.ndarray, int]]:
+    """Pairs of row ids above the threshold among the ANN neighbors of each row, and the rows searched"""
+    for ids, vectors in _blocks(dataset, column, 0, block_rows):
+        found = (
+            table.search(list(vectors), vector_column_name=column)
+            .distance_type("cosine")
+            .limit(neighbors + 1)  # the row itself is its nearest neighbor
+            .refine_factor(2)
+            .with_row_id(True)
+            .select(["_rowid", "_distance"])
+            .to_arrow()
+        )
+        sources = ids[found["query_index"].to_numpy()]
+        targets = found["_rowid"].to_numpy()
+        similar = (1 - found["_distance"].to_numpy() >= threshold) & (sources != targets)
+        yield sources[similar], targets[similar], len(ids)
+
+
+def find_clusters(
+    table,
+    column: str,
+    threshold: float,
+    neighbors: Optional[int] = None,
+    block_rows: int = BLOCK_ROWS,
+    should_stop: Callable[[], bool] = None,
+    on_progress: Callable[[int, int], None] = None,
+) -> Optional[List[List[int]]]:
+    """
+    Group the rows of a table whose vectors have a cosine similarity of at least `threshold`.
+
+    Args:
+        table: The table, opened at the version to search.
+        column (str): The vector column.
+        threshold (float): Cosine similarity, between -1 and 1, from which two rows are near duplicates.
+        neighbors (int): Search the ANN index for this many neighbors per row, None compares every pair.
+        block_rows (int): Vectors per block.
+        should_stop (Callable): Polled between blocks, the search stops when it returns True.
+        on_progress (Callable): Called with the comparisons (or searched rows) done and their total.
+
+    Returns:
+        List[List[int]]: The row ids of each cluster, smallest first, or None when stopped.
+    """
+    if column not in table.schema.names or not pa.types.is_fixed_size_list(table.schema.field(column).type):
+        raise NearDuplicateError(f"'{column}' is not a vector column")
+    if not -1 <= threshold <= 1:
+        raise NearDuplicateError("threshold is a cosine similarity, between -1 and 1")
+    dataset = table.to_lance()
+    rows = dataset.count_rows(filter=f"{quote_identifier(column)} IS NOT NULL")
+    if neighbors is None:
+        total, pairs = rows * (rows - 1) // 2, _exhaustive_pairs(dataset, column, threshold, block_rows)
+    else:
+        total, pairs = rows, _indexed_pairs(table, dataset, column, threshold, neighbors, block_rows)
+
+    sets, done = UnionFind(), 0
+    for sources, targets, work in pairs:
+        for a, b in zip(sources.tolist(), targets.tolist()):
+            sets.union(a, b)
+        done += work
+        if on_progress:
+            on_progress(done, total)
+        if should_stop and should_stop():
+            return None
+    return sets.clusters()
@@ -0,0 +1,91 @@
+"""
+Preview of fetched rows for the grid, which only shows the start of each cell.
+
+Strings and binary values longer than PREVIEW_BYTES are cut to that many bytes, and vectors are replaced by
+their dimensions, norm and first PREVIEW_VECTOR_VALUES values. A cut value becomes an object marked with
+"_truncated" so the viewer can fetch the full value by _rowid and column from the cell endpoint. Binary
+values are base64 encoded, whole or cut.
+"""
+import base64
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+PREVIEW_BYTES = int(os.getenv("LANCEDB_PREVIEW_BYTES", 256))
+PREVIEW_VECTOR_VALUES = int(os.getenv("LANCEDB_PREVIEW_VECTOR_VALUES", 8))
+
+
+def encode_binary(value: bytes) -> str:
+    return base64.b64encode(value).decode("ascii")
+
+
+def _preview_strings(array: pa.Array, max_bytes: int) -> List[Any]:
+    values = array.to_pylist()
+    lengths = pc.binary_length(array)
+    for position in np.flatnonzero(pc.fill_null(pc.greater(lengths, max_bytes), False).to_numpy(zero_copy_only=False)):
+        value = values[position]
+        values[position] = {
+            "_truncated": True,
+            "bytes": lengths[position].as_py(),
+            # cut on a character boundary, the preview may be up to 3 bytes shorter
+            "preview": value.encode("utf-8")[:max_bytes].decode("utf-8", "ignore"),
+        }
+    return values
+
+
+def _preview_binary(array: pa.Array, max_bytes: int) -> List[Any]:
+    values = []
+    for value in array.to_pylist():
+        if value is None or len(value) <= max_bytes:
+            values.append(None if value is None else encode_binary(value))
+        else:
+            values.append({"_truncated": True, "bytes": len(value), "preview": encode_binary(value[:max_bytes])})
+    return values
+
+
+def _preview_vectors(array: pa.FixedSizeListArray, head: int) -> List[Any]:
+    dims = array.type.list_size
+    if dims <= head:
+        return array.to_pylist()
+    flat = array.values.slice(array.offset * dims, len(array) * dims)
+    matrix = flat.to_numpy(zero_copy_only=False).astype(np.float64).reshape(len(array), dims)
+    norms = np.linalg.norm(matrix, axis=1)
+    valid = array.is_valid().to_numpy(zero_copy_only=False)
+    return [
+        {"_truncated": True, "dims": dims, "norm": float(norm), "head": row[:head].tolist()} if is_valid else None
+        for row, norm, is_valid in zip(matrix, norms, valid)
+    ]
+
+
+def preview_column(array: pa.Array, max_bytes: int = PREVIEW_BYTES, vector_values: int = PREVIEW_VECTOR_VALUES) -> List[Any]:
+    """The values of a column as JSON-ready Python objects, long values cut"""
+    array_type = array.type
+    if pa.types.is_string(array_type) or pa.types.is_large_string(array_type):
+        return _preview_strings(array, max_bytes)
+    if pa.types.is_binary(array_type) or pa.types.is_large_binary(array_type) or pa.types.is_fixed_size_binary(array_type):
+        return _preview_binary(array, max_bytes)
+    if pa.types.is_fixed_size_list(array_type) and (pa.types.is_floating(array_type.value_type) or pa.types.is_integer(array_type.value_type)):
+        return _preview_vectors(array, vector_values)
+    return array.to_pylist()
+
+
+def preview_rows(table: pa.Table, max_bytes: int = PREVIEW_BYTES, vector_values: int = PREVIEW_VECTOR_VALUES) -> List[Dict[str, Any]]:
+    """
+    Rows of a table as records with long values cut.
+
+    Args:
+        table (pa.Table): The fetched rows.
+        max_bytes (int): Longest string or binary value sent in full.
+        vector_values (int): Leading values of a vector kept in its summary.
+
+    Returns:
+        List[Dict[str, Any]]: One record per row.
+    """
+    columns = {
+        name: preview_column(column.combine_chunks(), max_bytes, vector_values)
+        for name, column in zip(table.column_names, table.columns)
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
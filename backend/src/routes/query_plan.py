@@ -0,0 +1,148 @@
+import re
+from typing import Any, Dict, List
+
+_METRICS_PATTERN = re.compile(r"metrics=\[([^\]]*)\]")
+_DURATION_PATTERN = re.compile(r"^([0-9.]+)(ns|µs|us|ms|s)$")
+_DURATION_TO_MS = {"ns": 1e-6, "µs": 1e-3, "us": 1e-3, "ms": 1.0, "s": 1000.0}
+
+# Plan operators that tell how a query reaches its rows
+SCALAR_INDEX_OPERATORS = ("ScalarIndexQuery", "MaterializeIndex")
+ANN_OPERATORS = ("ANNSubIndex", "ANNIvfPartition")
+FLAT_KNN_OPERATORS = ("KNNVectorDistance", "KNNFlat")
+SCAN_OPERATORS = ("LanceRead", "LanceScan")
+
+
+def _parse_value(value: str):
+    duration = _DURATION_PATTERN.match(value)
+    if duration:
+        return float(duration.group(1)) * _DURATION_TO_MS[duration.group(2)]
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _parse_metrics(line: str) -> Dict[str, Any]:
+    match = _METRICS_PATTERN.search(line)
+    if not match or not match.group(1):
+        return {}
+    metrics = {}
+    for pair in match.group(1).split(", "):
+        key, _, value = pair.partition("=")
+        # durations are normalised to milliseconds so the frontend doesn't have to parse units
+        metrics[key + "_ms" if _DURATION_PATTERN.match(value) else key] = _parse_value(value)
+    return metrics
+
+
+def parse_plan(plan: str) -> List[Dict[str, Any]]:
+    """
+    Parse the text of an explain_plan or analyze_plan into a flat list of nodes in plan order.
+
+    Args:
+        plan (str): Plan text as returned by lancedb's explain_plan/analyze_plan.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per operator with its depth in the tree, its details and its metrics (analyze only).
+    """
+    nodes = []
+    for line in plan.splitlines():
+        if not line.strip():
+            continue
+        depth = (len(line) - len(line.lstrip(" "))) // 2
+        text = line.strip()
+        operator = re.match(r"[A-Za-z_]+", text)
+        details = _METRICS_PATTERN.sub("", text)
+        details = re.sub(r",?\s*cumulative_cpu=\S+", "", details).rstrip(", ")
+        metrics = _parse_metrics(text)
+        cumulative = re.search(r"cumulative_cpu=(\S+)", text)
+        if cumulative:
+            metrics["cumulative_cpu_ms"] = _parse_value(cumulative.group(1))
+        nodes.append({
+            "operator": operator.group(0) if operator else text,
+            "depth": depth,
+            "details": details,
+            "metrics": metrics,
+        })
+    return nodes
+
+
+def _subtree(nodes: List[Dict[str, Any]], index: int) -> List[Dict[str, Any]]:
+    depth = nodes[index]["depth"]
+    children = []
+    for node in nodes[index + 1:]:
+        if node["depth"] <= depth:
+            break
+        children.append(node)
+    return children
+
+
+def _is_filter(node: Dict[str, Any]) -> bool:
+    if node["operator"] in SCALAR_INDEX_OPERATORS:
+        return True
+    if node["operator"] == "FilterExec":
+        # vector searches always drop rows without a distance, that isn't a user filter
+        return not re.fullmatch(r"FilterExec: _distance@\d+ IS NOT NULL", node["details"])
+    return node["operator"] in SCAN_OPERATORS and "full_filter=--" not in node["details"] and "full_filter=" in node["details"]
+
+
+def summarize_plan(nodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarize how a parsed plan reaches its rows: which indexes it uses, whether a vector search is
+    prefiltered and, for analyzed plans, how much data it actually read.
+
+    Args:
+        nodes (List[Dict[str, Any]]): Nodes as returned by parse_plan.
+
+    Returns:
+        Dict[str, Any]: The access path and the totals of the scan metrics.
+    """
+    operators = [node["operator"] for node in nodes]
+    scalar_indices = sorted({
+        match.group(1)
+        for node in nodes if node["operator"] in SCALAR_INDEX_OPERATORS
+        for match in [re.search(r"@(\w+)", node["details"])] if match
+    })
+    uses_ann = any(op in ANN_OPERATORS for op in operators)
+    uses_flat_knn = any(op in FLAT_KNN_OPERATORS for op in operators)
+
+    if uses_ann:
+        access_path = "ann_index"
+    elif uses_flat_knn:
+        access_path = "flat_knn"
+    elif scalar_indices:
+        access_path = "scalar_index"
+    else:
+        access_path = "full_scan"
+
+    prefilter = None
+    if uses_ann or uses_flat_knn:
+        vector_index = next(i for i, node in enumerate(nodes) if node["operator"] in ANN_OPERATORS + FLAT_KNN_OPERATORS)
+        below = _subtree(nodes, vector_index)
+        above = nodes[:vector_index]
+        has_prefilter = any(_is_filter(node) for node in below)
+        has_postfilter = any(_is_filter(node) for node in above)
+        prefilter = has_prefilter if (has_prefilter or has_postfilter) else None
+
+    totals = {"rows_scanned": 0, "fragments_scanned": 0, "bytes_read": 0, "iops": 0, "index_comparisons": 0}
+    for node in nodes:
+        for key in totals:
+            value = node["metrics"].get(key)
+            if isinstance(value, (int, float)):
+                totals[key] += value
+
+    stages = [
+        {"operator": node["operator"], "elapsed_ms": node["metrics"]["elapsed_compute_ms"], "output_rows": node["metrics"].get("output_rows")}
+        for node in nodes if "elapsed_compute_ms" in node["metrics"]
+    ]
+    return {
+        "access_path": access_path,
+        "scalar_indices_used": scalar_indices,
+        "prefilter": prefilter,
+        "analyzed": bool(stages),
+        # scan totals only exist once the plan has actually been executed
+        **(totals if stages else {}),
+        "stages": stages,
+    }
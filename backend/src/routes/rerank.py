@@ -0,0 +1,103 @@
+"""
+Rerankers applied to the candidates of a vector search before the top results are returned.
+
+A search asking for a reranker over-fetches `limit x candidate_multiplier` candidates with their vectors,
+the reranker picks and orders `limit` of them in NumPy, and the vector column is dropped afterwards when
+the caller excluded it. More candidates give a reranker more to choose from at the cost of a larger search.
+
+`mmr` (maximal marginal relevance) trades relevance for diversity: each pick maximizes
+`(1 - diversity) * similarity to the query - diversity * highest similarity to a row already picked`, so
+k near-identical passages no longer fill the results. `cosine` orders by exact cosine similarity, e.g. to
+correct the approximate distances of a PQ index. Other rerankers, say a cross-encoder, are added with
+register_reranker.
+"""
+import inspect
+import os
+from typing import Any, Callable, Dict
+
+import numpy as np
+import pyarrow as pa
+
+CANDIDATE_MULTIPLIER = int(os.getenv("LANCEDB_RERANK_CANDIDATE_MULTIPLIER", 4))
+MAX_CANDIDATES = int(os.getenv("LANCEDB_RERANK_MAX_CANDIDATES", 1000))
+
+# (query vector, candidate vectors, candidate rows, limit, **params) -> positions of the results, best first
+Reranker = Callable[..., np.ndarray]
+RERANKERS: Dict[str, Reranker] = {}
+
+
+class RerankError(ValueError):
+    """A rerank request that can't run, e.g. of an unknown reranker"""
+
+
+def register_reranker(name: str, reranker: Reranker):
+    RERANKERS[name] = reranker
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def mmr(query: np.ndarray, vectors: np.ndarray, candidates: pa.Table, limit: int, diversity: float = 0.5) -> np.ndarray:
+    """Maximal marginal relevance, `diversity` 0 orders by similarity to the query only"""
+    if not 0 <= diversity <= 1:
+        raise RerankError("diversity is between 0 and 1")
+    vectors = _unit(vectors)
+    relevance = vectors @ _unit(query)
+    limit = min(limit, len(vectors))
+    if limit == 0:
+        return np.empty(0, np.int64)
+    picked = [int(np.argmax(relevance))]
+    available = np.ones(len(vectors), bool)
+    available[picked[0]] = False
+    # the highest similarity of each candidate to a picked one, updated with one product per pick
+    redundancy = vectors @ vectors[picked[0]]
+    while len(picked) < limit:
+        scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return np.array(picked, np.int64)
+
+
+def cosine(query: np.ndarray, vectors: np.ndarray, candidates: pa.Table, limit: int) -> np.ndarray:
+    """Exact cosine similarity to the query"""
+    return np.argsort(-(_unit(vectors) @ _unit(query)), kind="stable")[:limit]
+
+
+register_reranker("mmr", mmr)
+register_reranker("cosine", cosine)
+
+
+def rerank(name: str, query: Any, candidates: pa.Table, vector_column: str, limit: int, params: Dict[str, Any] = None) -> pa.Table:
+    """
+    Pick and order `limit` rows of the candidates of a search with a registered reranker.
+
+    Args:
+        name (str): The reranker, e.g. mmr.
+        query: The query vector.
+        candidates (pa.Table): The candidates, with their vectors.
+        vector_column (str): The vector column of the candidates.
+        limit (int): Number of rows to return.
+        params (dict): Parameters of the reranker, e.g. {"diversity": 0.3} for mmr.
+
+    Returns:
+        pa.Table: The reranked rows.
+    """
+    reranker = RERANKERS.get(name)
+    if reranker is None:
+        raise RerankError(f"Unknown reranker '{name}', one of {', '.join(sorted(RERANKERS))}")
+    if vector_column not in candidates.column_names:
+        raise RerankError(f"'{vector_column}' is not a vector column")
+    column = candidates.column(vector_column).combine_chunks()
+    vectors = column.flatten().to_numpy(zero_copy_only=False).reshape(len(column), -1).astype(np.float32, copy=False)
+    args = (np.asarray(query, np.float32), vectors, candidates, limit)
+    try:
+        inspect.signature(reranker).bind(*args, **(params or {}))
+    except TypeError as e:
+        raise RerankError(f"Invalid parameters for reranker '{name}': {e}")
+    order = reranker(*args, **(params or {}))
+    return candidates.take(pa.array(order, pa.int64()))
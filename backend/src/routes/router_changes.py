@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from routes import router_database
+from routes.change_feed import ChangeFeed, without_columns
+from routes.metrics import REGISTRY, Gauge
+
+router = APIRouter()
+
+# follows the manager of the active connection, which is replaced when the app connects to another database, the
+# watchers take it outside of the request that started them
+change_feed = ChangeFeed(router_database.use_db_manager)
+
+# an SSE comment is sent when nothing happened for this long, so proxies keep the stream open
+HEARTBEAT_SECONDS = 15
+
+REGISTRY.register(Gauge(
+    "lancedb_change_feed_subscribers",
+    "Open change feed subscriptions by table.",
+    ("table",),
+    lambda: {
+        (watcher["table"],): watcher["subscribers"]
+        for watcher in change_feed.stats()["watchers"]
+    },
+))
+
+
+def _opened_event(table: str, version: int) -> dict:
+    return {"type": "subscribed", "table": table, "version": version}
+
+
+@router.get("/api/changes/{table}/", tags=["Changes"])
+async def table_changes(request: Request, table: str, key: str = None, columns_to_exclude: str = ""):
+    """
+    Streams the changes of a table as Server-Sent Events.
+
+    The first event reports the version the stream starts from. Every time the table gets a new version a
+    `change` event carries the appended, updated and deleted rows (derived from the new fragments) and the
+    row count delta. A `resync` event means the client fell behind and should refetch. The stream ends with
+    an `error` event when the table can't be watched, and with a `closed` event when the app connects to
+    another database.
+
+    Args:
+        table (str): The name of the table to watch.
+        key (str): Column identifying a row across versions, e.g. user_id, to report updates as such.
+        columns_to_exclude (str): Comma-separated list of columns to leave out of the rows, e.g. vector.
+
+    Returns:
+        StreamingResponse: A text/event-stream of JSON events.
+    """
+    excluded = [column for column in columns_to_exclude.split(",") if column]
+
+    # subscribing in the stream ties the subscription to the response body, a response that is never sent
+    # never subscribes, and one that is closed or cancelled leaves the `async with`
+    async def stream():
+        try:
+            async with change_feed.subscribe(table, key) as (queue, version):
+                yield _sse(_opened_event(table, version))
+                while not await request.is_disconnected():
+                    try:
+                        event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": heartbeat\n\n"
+                        continue
+                    yield _sse(without_columns(event, excluded))
+                    if event["type"] == "closed":
+                        break
+        except Exception as e:
+            logging.exception("Exception occurred in table_changes: %s", str(e))
+            yield _sse({"type": "error", "table": table, "detail": str(e)})
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(jsonable_encoder(event))}\n\n"
+
+
+@router.websocket("/api/changes/{table}/ws")
+async def table_changes_ws(websocket: WebSocket, table: str, key: str = None, columns_to_exclude: str = ""):
+    """
+    Sends the changes of a table over a WebSocket, the same JSON events as the Server-Sent Events endpoint.
+    """
+    excluded = [column for column in columns_to_exclude.split(",") if column]
+    await websocket.accept()
+    try:
+        async with change_feed.subscribe(table, key) as (queue, version):
+            await websocket.send_json(_opened_event(table, version))
+            # the client never sends anything, receiving only tells us when it goes away
+            closed = asyncio.ensure_future(websocket.receive())
+            try:
+                while True:
+                    next_event = asyncio.ensure_future(queue.get())
+                    done, _ = await asyncio.wait({closed, next_event}, return_when=asyncio.FIRST_COMPLETED)
+                    if closed in done:
+                        next_event.cancel()
+                        break
+                    await websocket.send_json(jsonable_encoder(without_columns(next_event.result(), excluded)))
+                    if next_event.result()["type"] == "closed":
+                        await websocket.close()
+                        break
+            finally:
+                closed.cancel()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logging.exception("Exception occurred in table_changes_ws: %s", str(e))
+        await websocket.close(code=1011, reason=str(e)[:120])
+
+
+@router.get("/api/change-feed-stats/", tags=["Changes"])
+async def change_feed_stats():
+    """
+    Reports the watched tables, their subscriber counts and how often they were polled and changed.
+
+    Returns:
+        dict: The change feed statistics.
+    """
+    return change_feed.stats()
@@ -1,17 +1,120 @@
+import json
 import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from routes.manager import LanceDBManager  # Import LanceDBManager
-from routes.setup import AppConfig, DatabaseConfig
+from routes.setup import STATE_DIR, AppConfig, DatabaseConfig
+from routes.connections import ConnectionStore
 from storage.provider import StorageConfig
+from routes.metrics import stage
+from routes.filters import FilterError
+from routes.lookup import MAX_LOOKUP_ROWS
+from routes.http_cache import etag_matches, make_etag
+from routes.preview import PREVIEW_BYTES, PREVIEW_VECTOR_VALUES, encode_binary, preview_rows
+from routes.ingest import IngestError
+from routes.rerank import CANDIDATE_MULTIPLIER
+import pyarrow as pa
 import hashlib
 import numpy as np
 
 router = APIRouter()
 
+# rows per sample request
+MAX_SAMPLE_ROWS = 10_000
+
 # Initialize with local storage by default
 db_manager = LanceDBManager(AppConfig())
 
+# the connection set by /api/connect/, shared by all worker processes
+connections = ConnectionStore(os.path.join(STATE_DIR, "connections.sqlite"))
+# generation of the saved connection db_manager was built from, 0 for the default one
+_generation = 0
+_switch_lock = threading.Lock()
+# the managers used by the current request, released once its response was sent (see ManagerLeaseMiddleware)
+_request_managers = ContextVar("request_managers", default=None)
+
+
+def get_db_manager() -> LanceDBManager:
+    """
+    The manager of the active connection.
+
+    Connects anew when another worker process (or a previous run) saved a newer connection than the one
+    this process uses. Within a request the manager is taken once and kept open until the response was
+    sent, so a request never mixes two connections, and streamed responses finish on the one they started.
+    """
+    held = _request_managers.get()
+    if held is None:
+        return _active_db_manager()
+    if not held:
+        held.append(_acquire_db_manager())
+    return held[0]
+
+
+def _active_db_manager() -> LanceDBManager:
+    global db_manager, _generation
+    if connections.generation() == _generation:
+        return db_manager
+    with _switch_lock:
+        active = connections.load()
+        if active is not None and active[0] != _generation:
+            generation, config = active
+            logging.info(f"Connecting to the database saved as generation {generation}")
+            _switch(LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(**config)))), generation)
+    return db_manager
+
+
+def _acquire_db_manager() -> LanceDBManager:
+    """The manager of the active connection, counted as a user until it's released"""
+    while True:
+        manager = _active_db_manager().acquire()
+        if manager is db_manager:
+            return manager
+        # replaced in the meantime, it may be closing already
+        manager.release()
+
+
+@contextmanager
+def use_db_manager():
+    """The manager of the active connection, kept open until the block ends, for work outside of requests like jobs"""
+    manager = _acquire_db_manager()
+    try:
+        yield manager
+    finally:
+        manager.release()
+
+
+class ManagerLeaseMiddleware:
+    """Plain ASGI middleware releasing the manager a request used once its response (or stream) was sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        held = []
+        token = _request_managers.set(held)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_managers.reset(token)
+            for manager in held:
+                manager.release()
+
+
+def _switch(manager: LanceDBManager, generation: int):
+    global db_manager, _generation
+    previous_manager = db_manager
+    db_manager, _generation = manager, generation
+    # requests, streams and jobs still using the previous manager finish on it
+    previous_manager.close_when_idle()
+
 
 @router.post("/api/add-data/", tags=["Database"])
 async def add_data(request: Request):
@@ -32,12 +135,15 @@ async def add_data(request: Request):
                 ]
             }
 
+    Adds to tables listed in LANCEDB_WRITE_BUFFER_TABLES are coalesced with other adds into fewer commits.
+
     Returns:
         dict: Success message. and the result of the operation.
 
     Raises:
         HTTPException: If an error occurs while adding data.
     """
+    db_manager = get_db_manager()
     try:
         data = await request.json()
         table = data["table"]
@@ -47,10 +153,19 @@ async def add_data(request: Request):
             for record in records:
                 record["user_id"] = hashlib.sha256(
                     (record["usename"] + record["email"]).encode('utf-8')).hexdigest()
-            no_of_items_added = db_manager.add_data("user", records, unique_field="user_id")
+            result = await db_manager.add_data_buffered("user", records, unique_field="user_id")
         else:
             raise HTTPException(status_code=400, detail="Invalid table name")
 
+        if "buffered" in result:
+            # acknowledged before the commit, see LANCEDB_WRITE_BUFFER_DURABILITY
+            return {
+                "success": True,
+                "message": f"{result['buffered']} records buffered for the {table} table",
+                "no_of_items_buffered": result["buffered"]
+            }
+        no_of_items_added = result["added"]
+
         if no_of_items_added == 0:
             return {"message": f"All items already exist in the {table} table", "no_of_items_added": 0, "success": False}
         else:
@@ -90,6 +205,7 @@ async def update_data(request: Request):
     Raises:
         HTTPException: If an error occurs while adding data.
     """
+    db_manager = get_db_manager()
     try:
         data = await request.json()
         table = data["table"]
@@ -99,7 +215,7 @@ async def update_data(request: Request):
             for record in records:
                 record["user_id"] = hashlib.sha256(
                     (record["usename"] + record["email"]).encode('utf-8')).hexdigest()
-            no_of_items_added = db_manager.update_data("user", records, unique_field="user_id")
+            no_of_items_added = await db_manager.concurrency.run("write", db_manager.update_data, "user", records, unique_field="user_id")
         else:
             raise HTTPException(status_code=400, detail="Invalid table name")
 
@@ -117,17 +233,80 @@ async def update_data(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/bulk-write/{table}/", tags=["Database"])
+async def bulk_write(request: Request, table: str, mode: str = "append", key: str = None, derive: str = None):
+    """
+    Adds or upserts rows in any table in one commit. The rows are converted to Arrow in one pass and cast
+    to the table schema, every column that doesn't fit is reported at once.
+
+    Args:
+        request (Request): Body: a JSON array of row objects, or newline delimited JSON objects with
+            Content-Type application/x-ndjson.
+        table (str): The name of the table.
+        mode (str): append, insert (only rows whose key isn't in the table yet) or upsert.
+        key (str): Column rows are matched on by insert and upsert, e.g. user_id.
+        derive (str): JSON object of columns to set to the SHA-256 of other columns concatenated,
+            e.g. {"user_id": ["usename", "email"]}.
+
+    Returns:
+        dict: The number of rows received, inserted and updated, and the new version.
+
+    Raises:
+        HTTPException: 400 with the errors per column if the rows don't fit the table, 500 if an error occurs while writing.
+    """
+    db_manager = get_db_manager()
+    try:
+        body = await request.body()
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            rows = body
+        else:
+            try:
+                rows = json.loads(body)
+            except json.JSONDecodeError as e:
+                raise IngestError(f"Body is not valid JSON: {e}")
+            if not isinstance(rows, list):
+                raise IngestError("Body must be a JSON array of rows")
+        if derive is not None:
+            try:
+                derive = json.loads(derive)
+            except json.JSONDecodeError as e:
+                raise IngestError(f"derive is not valid JSON: {e}")
+            if not isinstance(derive, dict) or not all(isinstance(fields, list) for fields in derive.values()):
+                raise IngestError("derive must map each column to a list of columns")
+        result = await db_manager.concurrency.run("write", db_manager.bulk_write, table, rows, mode=mode, key=key, derive=derive)
+        return {"success": True, **result}
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "columns": e.columns})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in bulk_write: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/api/fetch-data/{table}/", tags=["Database"])
-def fetch_data(table: str, columns_to_exclude: str = "", page: int = 1, per_page: int = 10, filter: str = None) -> JSONResponse:
+async def fetch_data(request: Request, table: str, columns_to_exclude: str = "", page: int = 1, per_page: int = 10, filter: str = None, version: int = None, as_of: str = None, where: str = None, order_by: str = None, sort_cache: bool = False, format: str = "json", preview: bool = False, preview_bytes: int = PREVIEW_BYTES, preview_values: int = PREVIEW_VECTOR_VALUES) -> Response:
     """
     Fetches data from the specified table with pagination and optional filtering.
 
+    The response carries an ETag of the table version and the query parameters. A request whose
+    If-None-Match still matches gets a 304 without the table being read.
+
     Args:
         table (str): The name of the table to fetch data from.
         page (int): Page number for pagination.
         per_page (int): Number of items per page.
         filter (str): SQL filter expression. Example: these are the filters that can be used - https://lancedb.github.io/lancedb/sql/#sql-filters
         columns_to_exclude (str): Comma-separated list of columns to exclude from the fetched data.
+        version (int): Read this version of the table instead of the latest one.
+        as_of (str): Read the version that was current at this ISO 8601 time.
+        where (str): JSON structured filter, e.g. {"op": "in", "column": "user_id", "values": ["a", "b"]}.
+            Values are validated against the table schema and safely quoted, see routes/filters.py.
+        order_by (str): Comma-separated sort columns, each optionally suffixed with :asc or :desc, e.g. "score:desc,user_id".
+        sort_cache (bool): Cache the sorted row order of this table version so that deep pages are fast.
+        format (str): "json", or "arrow" for the rows as an Arrow IPC stream.
+        preview (bool): Cut strings and binary values to preview_bytes and replace vectors by a summary with
+            their first preview_values values, see routes/preview.py. /api/cell/ returns a full value.
 
     Returns:
         dict: The fetched data.
@@ -135,55 +314,486 @@ def fetch_data(table: str, columns_to_exclude: str = "", page: int = 1, per_page
     Raises:
         HTTPException: If an error occurs while fetching data.
     """
+    db_manager = get_db_manager()
     try:
+        if format not in ("json", "arrow"):
+            raise ValueError(f"Unknown format '{format}', use json or arrow")
+        if preview and format != "json":
+            raise ValueError("preview is only available in the json format")
+        if preview and (preview_bytes < 1 or preview_values < 0):
+            raise ValueError("preview_bytes must be positive and preview_values not negative")
+        # an explicit version never changes, otherwise the response follows the latest version
+        etag_version = version if version is not None else await db_manager.concurrency.run("read", db_manager.cached_version, table)
+        etag = make_etag(table, etag_version, request.query_params.multi_items())
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
         # as_pandas=True returns a DataFrame
-        data = db_manager.fetch_data(table, as_pandas=True, page=page, per_page=per_page, filter=filter, columns_to_exclude=columns_to_exclude.split(","))
-        data_json = data.map(lambda x: x.tolist() if isinstance(
-            x, np.ndarray) else x).to_dict(orient="records")
-        return JSONResponse(content={
-            "page": page,
-            "per_page": per_page,
-            "total": len(data_json),
-            "data": data_json
-        })
+        data = await db_manager.concurrency.run("read", db_manager.fetch_data, table, as_pandas=True, page=page, per_page=per_page, filter=filter, columns_to_exclude=columns_to_exclude.split(","), version=version, as_of=as_of, where=_parse_where(where), order_by=order_by, sort_cache=sort_cache, as_arrow=format == "arrow" or preview)
+        with stage("fetch_data", "serialize"):
+            if format == "arrow":
+                sink = pa.BufferOutputStream()
+                with pa.ipc.new_stream(sink, data.schema) as writer:
+                    writer.write_table(data)
+                return Response(content=sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream", headers=headers)
+            if preview:
+                data_json = jsonable_encoder(preview_rows(data, preview_bytes, preview_values))
+            else:
+                data_json = data.map(lambda x: x.tolist() if isinstance(
+                    x, np.ndarray) else x).to_dict(orient="records")
+            return JSONResponse(content={
+                "page": page,
+                "per_page": per_page,
+                "total": len(data_json),
+                "data": data_json
+            }, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.exception("Exception occurred in fetch_data: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/api/cell/{table}/", tags=["Database"])
+async def cell(table: str, row_id: int, column: str, version: int = None, as_of: str = None) -> JSONResponse:
+    """
+    Returns the full value of one cell, for the values a fetch-data preview cut.
+
+    Args:
+        table (str): The name of the table.
+        row_id (int): The _rowid of the row.
+        column (str): The column of the value.
+        version (int): Read this version of the table, pass the one the preview was read at.
+        as_of (str): Read the version that was current at this ISO 8601 time.
+
+    Returns:
+        dict: The version, column type and value. Binary values are base64 encoded.
+
+    Raises:
+        HTTPException: 400 for an unknown column, 404 if there is no such row, 500 if an error occurs while reading.
+    """
+    db_manager = get_db_manager()
+    try:
+        result = await db_manager.concurrency.run("read", db_manager.cell, table, row_id, column, version=version, as_of=as_of)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No row with _rowid {row_id} in '{table}'")
+        if isinstance(result["value"], bytes):
+            result["value"], result["encoding"] = encode_binary(result["value"]), "base64"
+        return JSONResponse(content=jsonable_encoder(result))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in cell: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/sample/{table}/", tags=["Database"])
+async def sample(table: str, n: int = 100, seed: int = None, filter: str = None, where: str = None, stratify_by: str = None, allocation: str = "proportional", columns_to_exclude: str = "", version: int = None, as_of: str = None) -> JSONResponse:
+    """
+    Returns n random rows of a table, an unbiased preview where page 1 shows the oldest fragments.
+
+    Without a filter or strata the rows are taken by position without scanning the table.
+
+    Args:
+        table (str): The name of the table to sample.
+        n (int): Number of rows, at most MAX_SAMPLE_ROWS.
+        seed (int): Seed for a reproducible sample, the seed used is returned either way.
+        filter (str): SQL filter expression, only matching rows are sampled.
+        where (str): JSON structured filter, see fetch-data.
+        stratify_by (str): Column whose values are sampled separately, e.g. category.
+        allocation (str): "proportional" to the size of each value, or "equal" rows per value.
+        columns_to_exclude (str): Comma-separated list of columns to exclude from the rows.
+        version (int): Sample this version of the table instead of the latest one.
+        as_of (str): Sample the version that was current at this ISO 8601 time.
+
+    Returns:
+        dict: The version, seed, number of eligible rows, strata counts when stratified, and the rows.
+
+    Raises:
+        HTTPException: 400 if the request doesn't fit the table, 500 if an error occurs while sampling.
+    """
+    db_manager = get_db_manager()
+    try:
+        if not 1 <= n <= MAX_SAMPLE_ROWS:
+            raise ValueError(f"n must be between 1 and {MAX_SAMPLE_ROWS}")
+        result = await db_manager.concurrency.run(
+            "read", db_manager.sample, table, n=n, seed=seed, filter=filter, where=_parse_where(where),
+            stratify_by=stratify_by, allocation=allocation, columns_to_exclude=columns_to_exclude.split(","),
+            version=version, as_of=as_of,
+        )
+        with stage("sample", "serialize"):
+            data = result.pop("data")
+            result["data"] = data.map(lambda x: x.tolist() if isinstance(
+                x, np.ndarray) else x).to_dict(orient="records")
+            return JSONResponse(content=jsonable_encoder(result))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in sample: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _parse_where(where):
+    """Structured filters arrive as JSON in query strings and as objects in bodies"""
+    if where is None or isinstance(where, dict):
+        return where
+    try:
+        return json.loads(where)
+    except json.JSONDecodeError as e:
+        raise FilterError(f"where is not valid JSON: {e}")
+
+
+@router.post("/api/delete-rows/", tags=["Database"])
+async def delete_rows(request: Request):
+    """
+    Deletes the rows of a table that match a structured filter, in a single scan however many keys it lists.
+
+    Args:
+        request (Request): Body:
+            {
+                "table": "table_name",
+                "where": {"op": "in", "column": "user_id", "values": ["a", "b", "c"]}
+            }
+
+    Returns:
+        dict: The number of rows deleted.
+
+    Raises:
+        HTTPException: 400 if the filter is invalid, 500 if an error occurs while deleting.
+    """
+    db_manager = get_db_manager()
+    try:
+        data = await request.json()
+        table = data["table"]
+        where = _parse_where(data.get("where"))
+        if not where:
+            raise FilterError("A where filter is needed to delete rows")
+        deleted = await db_manager.concurrency.run("write", db_manager.delete_rows, table, where=where)
+        return {"success": True, "deleted": deleted}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in delete_rows: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/aggregate/", tags=["Database"])
+async def aggregate(request: Request):
+    """
+    Groups the rows of a table and computes aggregates over them without returning the rows.
+
+    Args:
+        request (Request): Body:
+            {
+                "table": "table_name",
+                "group_by": ["book_name"],
+                "aggregates": [{"op": "count"}, {"op": "mean", "column": "score", "as": "avg_score"}],
+                "filter": "score > 0.5",            (optional)
+                "where": {"op": "eq", ...},         (optional, structured filter)
+                "order_by": "count:desc",           (optional, by the group keys by default)
+                "limit": 1000,                      (optional, maximum number of groups)
+                "version": 3 | "as_of": "2025-01-31T12:00:00Z" (optional)
+            }
+            ops are count (of rows without a column), sum, mean, min and max.
+
+    Returns:
+        dict: The table version, the number of groups and the group rows.
+
+    Raises:
+        HTTPException: 400 if the request doesn't fit the table, 500 if an error occurs while aggregating.
+    """
+    db_manager = get_db_manager()
+    try:
+        data = await request.json()
+        result = await db_manager.concurrency.run(
+            "read", db_manager.aggregate, data["table"], data.get("aggregates"),
+            group_by=data.get("group_by", []), filter=data.get("filter"), where=_parse_where(data.get("where")),
+            order_by=data.get("order_by"), limit=data.get("limit", 1000), version=data.get("version"), as_of=data.get("as_of"),
+        )
+        return JSONResponse(content=jsonable_encoder(result))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in aggregate: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/lookup/", tags=["Database"])
+async def lookup(request: Request):
+    """
+    Returns the rows with the given row ids or key values, in the order they were asked for.
+
+    For row detail panes, search hits and refreshing selected rows. Row ids are read with a take and keys
+    with IN lists a scalar index can answer, so thousands of rows come back without scanning the table.
+
+    Args:
+        request (Request): Body:
+            {
+                "table": "table_name",
+                "row_ids": [0, 4294967297],                         (either)
+                "key": "user_id", "values": ["a", "b"],             (or)
+                "columns_to_exclude": "vector",
+                "version": 3 | "as_of": "2025-01-31T12:00:00Z"      (optional)
+            }
+            At most MAX_LOOKUP_ROWS ids or values.
+
+    Returns:
+        dict: The version, the rows, and the row ids or values that were not found.
+
+    Raises:
+        HTTPException: 400 if the request doesn't fit the table, 500 if an error occurs while reading.
+    """
+    db_manager = get_db_manager()
+    try:
+        data = await request.json()
+        requested = data.get("row_ids") if data.get("row_ids") is not None else data.get("values")
+        if not isinstance(requested, list):
+            raise ValueError("row_ids or values must be a list")
+        if len(requested) > MAX_LOOKUP_ROWS:
+            raise ValueError(f"At most {MAX_LOOKUP_ROWS} rows can be looked up at once")
+        row_ids = data.get("row_ids")
+        if row_ids is not None and not all(isinstance(row_id, int) and not isinstance(row_id, bool) and row_id >= 0 for row_id in row_ids):
+            raise ValueError("row_ids must be non-negative integers")
+        result = await db_manager.concurrency.run(
+            "read", db_manager.lookup, data["table"], row_ids=row_ids, key=data.get("key"), values=data.get("values"),
+            columns_to_exclude=data.get("columns_to_exclude", "").split(","), version=data.get("version"), as_of=data.get("as_of"),
+        )
+        with stage("lookup", "serialize"):
+            rows = result.pop("data")
+            result["data"] = rows.map(lambda x: x.tolist() if isinstance(
+                x, np.ndarray) else x).to_dict(orient="records")
+            return JSONResponse(content=jsonable_encoder(result))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in lookup: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/api/vector-search/", tags=["Database"])
 async def vector_search(request: Request):
     """
     Performs a vector search on the specified table.
 
     Args:
-        request (Request): Body: {"table": "table_name", "query": "search_query", "limit": 50, "columns_to_exclude": "vector,_rowid"}
+        request (Request): Body: {"table": "table_name", "query": "search_query", "limit": 50, "columns_to_exclude": "vector,_rowid",
+                                  "version": 3 | "as_of": "2025-01-31T12:00:00Z" (optional, search an older version)}
+            Instead of "query", "like" searches with the stored vectors of seed rows, without an embedding call,
+            and leaves the seeds out of the results:
+                "like": {"row_ids": [12, 40]} | {"key": "user_id", "values": ["a", "b"]}
+            "vector_column" (default "vector") is the column searched.
+            A query search can rerank limit x candidate_multiplier candidates, e.g. for diverse results:
+                "rerank": "mmr" | "cosine", "rerank_params": {"diversity": 0.5}, "candidate_multiplier": 4
 
     Returns:
-        dict: The search results.
+        dict: The search results and the milliseconds spent in each stage, with "like" also the seeds that
+            weren't found or have no vector.
 
     Raises:
         HTTPException: If an error occurs while performing the vector search.
     """
+    db_manager = get_db_manager()
     try:
         data = await request.json()
         table = data["table"]
-        query = data["query"]
         limit = data.get("limit", 50)
         columns_to_exclude = data.get("columns_to_exclude", "")
 
-        results = db_manager.vector_search(table, query, limit, columns_to_exclude=columns_to_exclude.split(","))
-        data_json = results.map(lambda x: x.tolist() if isinstance(
-            x, np.ndarray) else x).to_dict(orient="records")
-        return {
+        like = data.get("like")
+        if like is not None:
+            if data.get("rerank"):
+                raise ValueError("rerank needs a query, it ranks candidates by their similarity to it")
+            result = await db_manager.concurrency.run(
+                "read", db_manager.similar_rows, table, row_ids=like.get("row_ids"), key=like.get("key"),
+                values=like.get("values"), limit=limit, vector_column=data.get("vector_column", "vector"),
+                columns_to_exclude=columns_to_exclude.split(","), version=data.get("version"), as_of=data.get("as_of"),
+            )
+            with stage("similar_rows", "serialize"):
+                data_json = result["data"].map(lambda x: x.tolist() if isinstance(
+                    x, np.ndarray) else x).to_dict(orient="records")
+                return JSONResponse(content=jsonable_encoder({
+                    "total": len(data_json),
+                    "missing": result["missing"],
+                    "data": data_json
+                }))
+
+        query = data["query"]
+        timings = {}
+        results = await db_manager.concurrency.run(
+            "read", db_manager.vector_search, table, query, limit,
+            columns_to_exclude=columns_to_exclude.split(","), version=data.get("version"), as_of=data.get("as_of"),
+            rerank_with=data.get("rerank"), rerank_params=data.get("rerank_params"),
+            candidate_multiplier=data.get("candidate_multiplier", CANDIDATE_MULTIPLIER),
+            vector_column=data.get("vector_column", "vector"), timings=timings,
+        )
+        with stage("vector_search", "serialize", timings):
+            data_json = results.map(lambda x: x.tolist() if isinstance(
+                x, np.ndarray) else x).to_dict(orient="records")
+        return JSONResponse(content={
             "total": len(data_json),
-            "data": data_json
-        }
+            "data": data_json,
+            "timings": timings
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.exception("Exception occurred in vector_search: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/explain/", tags=["Database"])
+async def explain_query(request: Request):
+    """
+    Returns the Lance query plan of a fetch-data or vector-search request, and with analyze=true the measured
+    rows scanned, fragments touched, bytes read and elapsed time of every plan stage.
+
+    Args:
+        request (Request): Body: 
+            {
+                "table": "table_name",
+                "kind": "fetch" | "search",
+                "analyze": false,
+                "query": "search_query",        (search only)
+                "limit": 50,                    (search only)
+                "page": 1,                      (fetch only)
+                "per_page": 10,                 (fetch only)
+                "filter": "category = 'a'",     (fetch only)
+                "where": {"op": "eq", ...},     (fetch only, structured filter)
+                "vector_column": "vector",      (search only)
+                "rerank": "mmr",                (search only, plans the candidate search)
+                "candidate_multiplier": 4,      (search only, with rerank)
+                "order_by": "score:desc",       (fetch only, plans the scan of the sort columns)
+                "sort_cache": false,            (fetch only, with order_by)
+                "version": 3 | "as_of": "2025-01-31T12:00:00Z" (optional, plan on an older version)
+                "columns_to_exclude": "vector,_rowid"
+            }
+
+    Returns:
+        dict: The plan text, the parsed plan nodes, the table's indices and a summary of the access path,
+            with order_by also whether the page comes from a cached permutation, builds one or runs a top-k.
+
+    Raises:
+        HTTPException: If an error occurs while planning the query.
+    """
+    db_manager = get_db_manager()
+    try:
+        data = await request.json()
+        table = data["table"]
+        kind = data.get("kind", "fetch")
+        if kind not in ("fetch", "search"):
+            raise HTTPException(status_code=400, detail="kind must be 'fetch' or 'search'")
+        if kind == "search" and not data.get("query"):
+            raise HTTPException(status_code=400, detail="query is required when kind is 'search'")
+
+        return await db_manager.concurrency.run(
+            "read",
+            db_manager.explain_query,
+            table,
+            kind=kind,
+            analyze=bool(data.get("analyze", False)),
+            query=data.get("query"),
+            limit=data.get("limit", 50),
+            page=data.get("page", 1),
+            per_page=data.get("per_page", 10),
+            filter=data.get("filter"),
+            where=_parse_where(data.get("where")),
+            columns_to_exclude=data.get("columns_to_exclude", "").split(","),
+            vector_column=data.get("vector_column", "vector"),
+            version=data.get("version"),
+            as_of=data.get("as_of"),
+            order_by=data.get("order_by"),
+            sort_cache=bool(data.get("sort_cache", False)),
+            rerank_with=data.get("rerank"),
+            candidate_multiplier=data.get("candidate_multiplier", CANDIDATE_MULTIPLIER),
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in explain_query: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/versions/{table}/", tags=["Database"])
+async def list_versions(table: str):
+    """
+    Lists the versions of a table with their commit time and row, fragment and file totals.
+
+    Args:
+        table (str): The name of the table.
+
+    Returns:
+        dict: The versions, oldest first.
+    """
+    db_manager = get_db_manager()
+    try:
+        versions = await db_manager.concurrency.run("read", db_manager.list_versions, table)
+        return {"table": table, "versions": versions}
+    except Exception as e:
+        logging.exception("Exception occurred in list_versions: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/table-stats/{table}/", tags=["Database"])
+async def table_stats(table: str, version: int = None, as_of: str = None):
+    """
+    Summarizes a table, or an older version of it, from its manifest: rows, fragments, size, schema and indices.
+
+    Args:
+        table (str): The name of the table.
+        version (int): Describe this version instead of the latest one.
+        as_of (str): Describe the version that was current at this ISO 8601 time.
+
+    Returns:
+        dict: The table statistics.
+    """
+    db_manager = get_db_manager()
+    try:
+        return await db_manager.concurrency.run("read", db_manager.table_stats, table, version=version, as_of=as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in table_stats: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/diff/{table}/", tags=["Database"])
+async def diff_versions(table: str, from_version: int, to_version: int = None, key: str = None, limit: int = 100, columns_to_exclude: str = ""):
+    """
+    Reports the rows added, deleted and updated between two versions of a table. Only the fragments that
+    changed between the versions are read, so the cost follows the size of the change.
+
+    Args:
+        table (str): The name of the table.
+        from_version (int): The older version.
+        to_version (int): The newer version, defaults to the latest one.
+        key (str): Column identifying a row across versions, e.g. user_id. Without it an updated row is
+            reported as one deleted and one added row.
+        limit (int): Maximum number of rows returned per category, the counts are always exact.
+        columns_to_exclude (str): Comma-separated list of columns to leave out of the returned rows.
+
+    Returns:
+        dict: Schema changes, fragment and row counts and the changed rows.
+    """
+    db_manager = get_db_manager()
+    try:
+        diff = await db_manager.concurrency.run(
+            "read", db_manager.diff_versions, table, from_version,
+            to_version=to_version, key=key, limit=limit, columns_to_exclude=columns_to_exclude.split(","),
+        )
+        with stage("diff_versions", "serialize"):
+            return JSONResponse(content=jsonable_encoder(diff))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in diff_versions: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/api/connect/", tags=["Database"])
 async def connect_database(request: Request):
     """
@@ -218,13 +828,20 @@ async def connect_database(request: Request):
         storage_config = StorageConfig(**config)
         
         # Create new database manager instance with provided config
-        global db_manager
-        db_manager = LanceDBManager(AppConfig(
+        manager = LanceDBManager(AppConfig(
             database=DatabaseConfig(storage=storage_config)
         ))
         
         # Test connection by listing tables
-        tables = db_manager.list_tables()
+        try:
+            tables = manager.list_tables()
+        except Exception:
+            manager.close()
+            raise
+
+        # Saved for the other workers, which connect on their next request
+        with _switch_lock:
+            _switch(manager, connections.save(config))
         
         return {
             "success": True,
@@ -237,3 +854,30 @@ async def connect_database(request: Request):
             status_code=500,
             detail=f"Failed to connect to database: {str(e)}"
         )
+
+
+@router.get("/api/concurrency-stats/", tags=["Database"])
+async def concurrency_stats():
+    """
+    Reports queue depth and wait times of the read, write and embedding worker pools and of the per-table locks.
+
+    Returns:
+        dict: The current concurrency statistics.
+    """
+    db_manager = get_db_manager()
+    return db_manager.concurrency.stats()
+
+
+@router.get("/api/cache-stats/", tags=["Database"])
+async def cache_stats():
+    """
+    Reports the disk cache of a remote database: hit ratio, bytes downloaded and saved, and the mirrored tables.
+
+    Returns:
+        dict: The cache statistics, `enabled` is false when the database is local or the cache is not configured.
+    """
+    db_manager = get_db_manager()
+    cache = db_manager.storage.cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
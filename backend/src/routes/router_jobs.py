@@ -0,0 +1,153 @@
+import os
+from fastapi import APIRouter, HTTPException, Request
+from routes import router_database
+from routes.jobs import JobCancelled, JobContext, JobError, JobQueue
+from routes.near_duplicates import DEFAULT_NEIGHBORS
+from routes.metrics import REGISTRY, Gauge
+from routes.setup import STATE_DIR
+
+router = APIRouter()
+
+jobs = JobQueue(os.path.join(STATE_DIR, "jobs.sqlite"))
+
+
+def _limit(job_type: str, default: int) -> int:
+    """Jobs of a type running at the same time, e.g. LANCEDB_JOBS_CREATE_INDEX_LIMIT=2"""
+    return int(os.getenv(f"LANCEDB_JOBS_{job_type.upper()}_LIMIT", default))
+
+
+# the job functions take the manager of the connection that is active when they run and keep it open until they
+# finish, it is replaced when the app connects to another database
+
+def _backfill_embeddings(params: dict, context: JobContext):
+    with router_database.use_db_manager() as db_manager:
+        status = db_manager.backfill_embeddings(
+            params["table"], params["source_column"], params["key"],
+            vector_column=params.get("vector_column", "vector"),
+            model_column=params.get("model_column"),
+            should_stop=lambda: context.cancelled,
+            on_progress=lambda checkpoint: context.progress(checkpoint.rows_done, checkpoint.rows_total),
+        )
+    context.progress(status["rows_done"], status["rows_total"])
+    if status["status"] == "stopped":
+        raise JobCancelled()
+    return status
+
+
+def _deduplicate(params: dict, context: JobContext):
+    with router_database.use_db_manager() as db_manager:
+        rows = db_manager.get_table(params["table"]).count_rows()
+        context.progress(0, rows)
+        removed = db_manager._delete_duplicates(params["table"], params["subset"])
+    context.progress(rows, rows)
+    return {"table": params["table"], "rows_removed": removed}
+
+
+def _near_duplicates(params: dict, context: JobContext):
+    with router_database.use_db_manager() as db_manager:
+        result = db_manager.near_duplicates(
+            params["table"], params.get("column", "vector"), params.get("threshold", 0.95),
+            delete=params.get("delete", False), use_index=params.get("use_index"),
+            neighbors=params.get("neighbors", DEFAULT_NEIGHBORS),
+            should_stop=lambda: context.cancelled, on_progress=context.progress,
+        )
+    if result["status"] == "stopped":
+        raise JobCancelled()
+    return result
+
+
+def _optimize(params: dict, context: JobContext):
+    with router_database.use_db_manager() as db_manager:
+        return db_manager.optimize_table(params["table"], params.get("cleanup_older_than_days"))
+
+
+def _create_index(params: dict, context: JobContext):
+    with router_database.use_db_manager() as db_manager:
+        return db_manager.create_index(
+            params["table"], params["column"], params.get("index_type"), params.get("replace", True)
+        )
+
+
+# a backfill checkpoints every chunk and continues where it stopped, the others start over
+jobs.register(
+    "backfill_embeddings", _backfill_embeddings, limit=_limit("backfill_embeddings", 1), resumable=True,
+    required=("table", "source_column", "key"),
+)
+jobs.register("deduplicate", _deduplicate, limit=_limit("deduplicate", 1), required=("table", "subset"))
+jobs.register("near_duplicates", _near_duplicates, limit=_limit("near_duplicates", 1), required=("table",))
+jobs.register("optimize", _optimize, limit=_limit("optimize", 1), required=("table",))
+jobs.register("create_index", _create_index, limit=_limit("create_index", 1), required=("table", "column"))
+
+REGISTRY.register(Gauge(
+    "lancedb_jobs",
+    "Background jobs by type and status.",
+    ("type", "status"),
+    lambda: {
+        (job_type, status): count
+        for job_type, stats in jobs.stats()["types"].items()
+        for status, count in stats["jobs"].items()
+    },
+))
+
+
+@router.post("/api/jobs/", tags=["Jobs"])
+async def submit_job(request: Request):
+    """
+    Queues a long running operation as a background job.
+
+    Args:
+        request (Request): Body:
+            {
+                "type": "create_index",
+                "params": {"table": "table_name", "column": "vector"}
+            }
+            Job types and their parameters:
+                backfill_embeddings: table, source_column, key, vector_column, model_column
+                deduplicate: table, subset (columns)
+                near_duplicates: table, column, threshold, delete, use_index, neighbors
+                optimize: table, cleanup_older_than_days
+                create_index: table, column, index_type, replace
+
+    Returns:
+        dict: The queued job, poll /api/jobs/{job_id} for its progress.
+
+    Raises:
+        HTTPException: 400 for an unknown job type or missing parameters.
+    """
+    data = await request.json()
+    try:
+        return jobs.submit(data.get("type"), data.get("params") or {})
+    except JobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/api/jobs/", tags=["Jobs"])
+async def list_jobs(type: str = None, status: str = None, limit: int = 100):
+    """
+    Lists the jobs, newest first, optionally of one type or status.
+    """
+    return {"jobs": jobs.list(type, status, limit), **jobs.stats()}
+
+
+@router.get("/api/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """
+    Reports a job: its status, rows done out of total, ETA, and its result or error once finished.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+@router.post("/api/jobs/{job_id}/cancel", tags=["Jobs"])
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued job, or asks a running one to stop. A backfill stops after its current chunk and
+    resumes from its checkpoint when submitted again, a near duplicate search stops after its current block,
+    the other jobs can't be interrupted once running.
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
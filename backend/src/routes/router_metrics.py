@@ -0,0 +1,57 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from routes import router_database
+from routes.metrics import REGISTRY, Gauge
+
+router = APIRouter()
+
+
+def _pool_samples(field: str):
+    def collect():
+        stats = router_database.get_db_manager().concurrency.stats()
+        samples = {("pool", kind): values[field] for kind, values in stats["pools"].items()}
+        samples.update({("lock", kind): values[field] for kind, values in stats["locks"].items()})
+        return samples
+    return collect
+
+
+REGISTRY.register(Gauge(
+    "lancedb_queue_depth",
+    "Work items waiting for a worker pool or a table lock.",
+    ("type", "kind"),
+    _pool_samples("queued"),
+))
+REGISTRY.register(Gauge(
+    "lancedb_queue_active",
+    "Work items currently running on a worker pool or holding a table lock.",
+    ("type", "kind"),
+    _pool_samples("active"),
+))
+REGISTRY.register(Gauge(
+    "lancedb_queue_max_wait_seconds",
+    "Longest time a work item has waited for a worker pool or a table lock.",
+    ("type", "kind"),
+    lambda: {key: value / 1000 for key, value in _pool_samples("max_wait_ms")().items()},
+))
+
+
+def _disk_cache_bytes():
+    cache = router_database.get_db_manager().storage.cache
+    return {(): cache.cached_bytes} if cache is not None else {}
+
+
+REGISTRY.register(Gauge(
+    "lancedb_disk_cache_size_bytes",
+    "Bytes of remote table files held in the disk cache.",
+    (),
+    _disk_cache_bytes,
+))
+
+
+@router.get("/metrics", tags=["Metrics"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Exposes request latency histograms, internal stage timings, rows returned, cache hits and
+    worker pool queue depth in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
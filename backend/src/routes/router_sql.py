@@ -0,0 +1,81 @@
+import json
+import logging
+from dataclasses import replace
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from routes import router_database
+from routes.metrics import ROWS_RETURNED
+from routes.sql import SQL_AVAILABLE, SqlError, SqlLimits
+
+router = APIRouter()
+
+
+def _line(event: dict) -> str:
+    return json.dumps(jsonable_encoder(event)) + "\n"
+
+
+@router.post("/api/sql/", tags=["SQL"])
+async def sql_query(request: Request):
+    """
+    Runs a read-only SQL query over the tables of the database and streams the result as NDJSON.
+
+    Tables are referenced by name and scanned in place, with the selected columns and the filters pushed
+    down into Lance. Joins and aggregations across tables run in an embedded DuckDB (the `sql` extra).
+
+    Args:
+        request (Request): Body:
+            {
+                "sql": "SELECT u.name, count(*) FROM user u JOIN events e ON e.user_id = u.user_id GROUP BY 1",
+                "max_rows": 1000,           (optional, at most LANCEDB_SQL_MAX_ROWS)
+                "timeout_seconds": 10       (optional, at most LANCEDB_SQL_TIMEOUT_SECONDS)
+            }
+
+    Returns:
+        StreamingResponse: One JSON object per line: a `schema` line, `rows` lines with a batch of rows
+        each, and an `end` line with the row count and whether the result was cut off at max_rows. A
+        failure while streaming, e.g. the time limit, ends the stream with an `error` line.
+
+    Raises:
+        HTTPException: 400 if the query is not a single valid SELECT, 501 without duckdb installed.
+    """
+    if not SQL_AVAILABLE:
+        raise HTTPException(status_code=501, detail="SQL queries need the duckdb package, install the backend with the 'sql' extra")
+    db_manager = router_database.get_db_manager()
+    try:
+        data = await request.json()
+        sql = data.get("sql")
+        if not isinstance(sql, str) or not sql.strip():
+            raise SqlError("The body needs a sql query")
+        limits = SqlLimits.from_environment()
+        # callers can only tighten the configured limits
+        limits = replace(
+            limits,
+            max_rows=min(int(data.get("max_rows", limits.max_rows)), limits.max_rows),
+            timeout_seconds=min(float(data.get("timeout_seconds", limits.timeout_seconds)), limits.timeout_seconds),
+        )
+        query = await db_manager.concurrency.run("read", db_manager.sql_query, sql, limits)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Exception occurred in sql_query: %s", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream():
+        try:
+            yield _line({"type": "schema", "columns": [{"name": field.name, "type": str(field.type)} for field in query.schema]})
+            while True:
+                batch = await db_manager.concurrency.run("read", query.next_batch)
+                if batch is None:
+                    break
+                if batch.num_rows:
+                    yield _line({"type": "rows", "rows": batch.to_pylist()})
+            ROWS_RETURNED.inc("sql", amount=query.rows)
+            yield _line({"type": "end", "rows": query.rows, "truncated": query.truncated, "elapsed_ms": query.elapsed_ms()})
+        except Exception as e:
+            logging.error(f"Error streaming SQL query results: {e}")
+            yield _line({"type": "error", "detail": str(e), "rows": query.rows})
+        finally:
+            query.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,142 @@
+"""
+Random and stratified row samples.
+
+A uniform sample of a whole table needs no scan at all: the live row count comes from the fragment
+metadata, positions are drawn from it and the rows are fetched with a positional take.
+
+With a filter or strata the matching rows have to be found first. Only the row ids (and the strata
+column) are scanned, and every row gets a seeded random key. Keeping the rows with the smallest keys is a
+uniform sample, and it can be kept per stratum while the scan streams, so memory is bounded by
+`n * strata` instead of the number of rows. The sampled rows are then fetched by row id.
+
+The same seed on the same table version gives the same sample.
+"""
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from routes.lookup import no_rows, take_row_ids
+
+ALLOCATIONS = ("proportional", "equal")
+# distinct values of a strata column, beyond that it is more of a key than a category
+MAX_STRATA = 1000
+SCAN_BATCH_ROWS = 65536
+
+
+class SamplingError(ValueError):
+    """A sample request that doesn't fit the table"""
+
+
+def new_seed() -> int:
+    return random.SystemRandom().randrange(2 ** 32)
+
+
+def _take_offsets(table, offsets: List[int], columns: Optional[List[str]]) -> pa.Table:
+    if not offsets:
+        return no_rows(table, columns)
+    query = table.take_offsets(offsets)
+    if columns is not None:
+        query = query.select(columns)
+    return query.with_row_id().to_arrow()
+
+
+def _allocate(counts: Dict[Any, int], n: int, allocation: str) -> Dict[Any, int]:
+    """Rows to draw per stratum, never more than it has"""
+    total = sum(counts.values())
+    n = min(n, total)
+    if allocation == "equal":
+        # smallest strata first, the rows a small stratum doesn't have are shared by the larger ones
+        quotas, left = {}, n
+        for position, value in enumerate(sorted(counts, key=counts.get)):
+            quotas[value] = min(counts[value], -(-left // (len(counts) - position)))
+            left -= quotas[value]
+    else:
+        # largest remainder, so the quotas add up to n
+        exact = {value: n * count / total for value, count in counts.items()}
+        quotas = {value: int(share) for value, share in exact.items()}
+        for value in sorted(exact, key=lambda value: exact[value] - quotas[value], reverse=True)[:n - sum(quotas.values())]:
+            quotas[value] += 1
+    return {value: min(quota, counts[value]) for value, quota in quotas.items()}
+
+
+def sample_rows(
+    table,
+    n: int,
+    seed: int,
+    columns: List[str] = None,
+    filter: str = None,
+    stratify_by: str = None,
+    allocation: str = "proportional",
+) -> Dict[str, Any]:
+    """
+    Draw up to n rows without replacement.
+
+    Args:
+        table (lancedb.table.Table): The table, or a handle checked out at a version.
+        n (int): Number of rows.
+        seed (int): Seed of the random draw.
+        columns (List[str]): Columns of the returned rows, all when None. _rowid is always included.
+        filter (str): Only sample rows matching this SQL filter.
+        stratify_by (str): Sample every value of this column separately.
+        allocation (str): "proportional" to the size of each stratum, or "equal" rows per stratum.
+
+    Returns:
+        dict: "rows" (pa.Table), "matched" (rows eligible for the sample) and with stratify_by, "strata"
+        with the rows and the sampled rows of every value.
+    """
+    if allocation not in ALLOCATIONS:
+        raise SamplingError(f"allocation must be one of {', '.join(ALLOCATIONS)}")
+    if stratify_by is not None and stratify_by not in table.schema.names:
+        raise SamplingError(f"Unknown column '{stratify_by}'")
+    rng = np.random.default_rng(seed)
+
+    if filter is None and stratify_by is None:
+        total = table.count_rows()
+        offsets = np.sort(rng.choice(total, size=min(n, total), replace=False)) if total else []
+        return {"rows": _take_offsets(table, [int(offset) for offset in offsets], columns), "matched": total}
+
+    scan_columns = [stratify_by] if stratify_by else []
+    query = table.search().select(scan_columns).with_row_id(True).limit(None)
+    if filter:
+        query = query.where(filter)
+    candidates = None
+    counts: Counter = Counter()
+    for batch in query.to_batches(SCAN_BATCH_ROWS):
+        if batch.num_rows == 0:
+            continue
+        frame = pd.DataFrame({
+            # python values keep nulls as None, which pandas would turn into NaN != NaN
+            "stratum": pd.Series(batch.column(stratify_by).to_pylist(), dtype=object) if stratify_by else 0,
+            "_rowid": batch.column("_rowid").to_numpy(),
+            "key": rng.random(batch.num_rows),
+        })
+        counts.update(Counter(frame["stratum"]))
+        if len(counts) > MAX_STRATA:
+            raise SamplingError(f"'{stratify_by}' has more than {MAX_STRATA} distinct values to stratify by")
+        merged = frame if candidates is None else pd.concat([candidates, frame], ignore_index=True)
+        # the n smallest keys of every stratum, no stratum can need more
+        candidates = merged.sort_values("key", kind="stable").groupby("stratum", dropna=False, sort=False).head(n)
+
+    if candidates is None:
+        return {"rows": no_rows(table, columns), "matched": 0, **({"strata": []} if stratify_by else {})}
+
+    quotas = _allocate(counts, n, allocation)
+    candidates = candidates.sort_values("key", kind="stable")
+    taken: Counter = Counter()
+    row_ids = []
+    for value, row_id in zip(candidates["stratum"], candidates["_rowid"]):
+        if taken[value] < quotas[value]:
+            taken[value] += 1
+            row_ids.append(int(row_id))
+    row_ids.sort()
+    result = {"rows": take_row_ids(table, row_ids, columns), "matched": sum(counts.values())}
+    if stratify_by:
+        result["strata"] = [
+            {"value": value, "rows": counts[value], "sampled": quotas[value]}
+            for value in sorted(counts, key=counts.get, reverse=True)
+        ]
+    return result
@@ -1,28 +1,32 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
 from functools import cached_property
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
 from pydantic import BaseModel
 
-# Optional Azure imports
-try:
-    from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-    from azure.keyvault.secrets import SecretClient
-    AZURE_AVAILABLE = True
-except ImportError:
-    AZURE_AVAILABLE = False
+# Optional Azure and OpenAI dependencies. Only check that they are installed here, they are imported
+# where a provider actually uses them so a local database with the simple embedder never loads them.
+def _module_available(name: str) -> bool:
+    try:
+        return find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
 
-# Optional OpenAI imports
-try:
-    from openai import AzureOpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+AZURE_AVAILABLE = _module_available("azure.identity") and _module_available("azure.keyvault.secrets")
+OPENAI_AVAILABLE = _module_available("openai")
+
+if TYPE_CHECKING:
+    from azure.identity import DefaultAzureCredential
 
 
 KEYVAULT_URL = "https://***.vault.azure.net/"
 AZURE_OPENAI_ENDPOINT = "https://****.openai.azure.com/"
 AZURE_COGNITIVE_SERVICE_SCOPE = "https://cognitiveservices.azure.com/.default"
 API_VERSION = "2024-08-01-preview"
+TEXT_EMBEDDING_DEPLOYMENT = "text-embedding-3-large"
+# local state of the backend (checkpoints, jobs), kept apart from the table data
+STATE_DIR = os.getenv("LANCEDB_STATE_DIR", ".lancedb_viewer")
 
 
 @dataclass
@@ -46,7 +50,7 @@ class AzureOpenAiConfig:
         self.credential_scope: str = AZURE_COGNITIVE_SERVICE_SCOPE
         self.api_version: str = API_VERSION
         self.llm: str = "gpt-4o-2"
-        self.embedding_model: str = "text-embedding-3-large"
+        self.embedding_model: str = TEXT_EMBEDDING_DEPLOYMENT
         self.gpt4_o = OpenAiModelConfig(
             deployment_name="gpt-4o", api_version="2024-05-13", ndims=128_000)
         self.gpt4_turbo = OpenAiModelConfig(
@@ -57,7 +61,7 @@ class AzureOpenAiConfig:
         self.ada_002_embedding = OpenAiModelConfig(
             deployment_name="aez-dev-ada-002", api_version="2", ndims=1536)
         self.text_embedder_lagre = OpenAiModelConfig(
-            deployment_name="text-embedding-3-large",
+            deployment_name=TEXT_EMBEDDING_DEPLOYMENT,
             api_version="2024-04-09",
             # Number of dimensions of the embeddings (depends on the model)
             ndims=3072
@@ -66,11 +70,13 @@ class AzureOpenAiConfig:
     def get_token_provider(self, credential):
         if not AZURE_AVAILABLE:
             raise ImportError("Azure dependencies not installed")
+        from azure.identity import get_bearer_token_provider
         return get_bearer_token_provider(credential, self.credential_scope)
 
     def get_openai_api_key(self, credential):
         if not AZURE_AVAILABLE:
             raise ImportError("Azure dependencies not installed")
+        from azure.keyvault.secrets import SecretClient
         secret_client = SecretClient(
             vault_url=self.keyvault_url, credential=credential)
         secret = secret_client.get_secret("azure-openai-api-key")
@@ -85,6 +91,10 @@ class StorageConfig:
     container_name: str = None
     local_path: str = "lancedb_data"
     credentials: dict = None
+    tuning: dict = None  # object store client settings, see storage.provider.ObjectStoreTuning
+    cache_dir: str = None  # local read-through cache of remote tables, disabled when not set
+    cache_max_bytes: int = 10 * 1024 ** 3
+    cache_refresh_seconds: float = 5.0
 
 @dataclass
 class DatabaseConfig:
@@ -92,6 +102,49 @@ class DatabaseConfig:
     storage: StorageConfig
     table_name: str = "default"
     embedder_provider: str = "simple"  # Default to simple embedder
+
+@dataclass
+class ConcurrencyConfig:
+    """Sizing of the worker pools and commit-conflict retry policy of LanceDBManager"""
+    read_workers: int = 8
+    write_workers: int = 2
+    embed_workers: int = 4
+    max_conflict_retries: int = 5
+    conflict_backoff_seconds: float = 0.05
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            read_workers=int(os.getenv("LANCEDB_READ_WORKERS", cls.read_workers)),
+            write_workers=int(os.getenv("LANCEDB_WRITE_WORKERS", cls.write_workers)),
+            embed_workers=int(os.getenv("LANCEDB_EMBED_WORKERS", cls.embed_workers)),
+            max_conflict_retries=int(os.getenv("LANCEDB_MAX_CONFLICT_RETRIES", cls.max_conflict_retries)),
+            conflict_backoff_seconds=float(os.getenv("LANCEDB_CONFLICT_BACKOFF_SECONDS", cls.conflict_backoff_seconds)),
+        )
+
+@dataclass
+class WriteBufferConfig:
+    """Coalescing of small adds into fewer, larger commits, see routes.write_buffer"""
+    tables: tuple = ()  # tables whose adds are buffered, "*" for all of them
+    max_rows: int = 5000
+    max_delay_seconds: float = 1.0
+    durability: str = "flush"  # "flush" acknowledges adds once committed, "buffer" once buffered
+
+    def __post_init__(self):
+        if self.durability not in ("flush", "buffer"):
+            raise ValueError(f"Write buffer durability must be flush or buffer, not '{self.durability}'")
+
+    def buffers(self, table_name: str) -> bool:
+        return "*" in self.tables or table_name in self.tables
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            tables=tuple(name.strip() for name in os.getenv("LANCEDB_WRITE_BUFFER_TABLES", "").split(",") if name.strip()),
+            max_rows=int(os.getenv("LANCEDB_WRITE_BUFFER_MAX_ROWS", cls.max_rows)),
+            max_delay_seconds=float(os.getenv("LANCEDB_WRITE_BUFFER_MAX_DELAY_SECONDS", cls.max_delay_seconds)),
+            durability=os.getenv("LANCEDB_WRITE_BUFFER_DURABILITY", cls.durability),
+        )
     
 @dataclass
 class AppConfig:
@@ -99,6 +152,8 @@ class AppConfig:
     database: DatabaseConfig = DatabaseConfig(
         storage=StorageConfig()
     )
+    concurrency: ConcurrencyConfig = field(default_factory=ConcurrencyConfig.from_environment)
+    write_buffer: WriteBufferConfig = field(default_factory=WriteBufferConfig.from_environment)
 
     @classmethod
     def from_environment(cls):
@@ -110,21 +165,37 @@ class AppConfig:
             provider=storage_provider,
             local_path=os.getenv("LOCAL_DB_PATH", "lancedb_data")
         )
+        tuning = {
+            key: os.environ[env]
+            for key, env in (
+                ("timeout", "LANCEDB_STORAGE_TIMEOUT"),
+                ("connect_timeout", "LANCEDB_STORAGE_CONNECT_TIMEOUT"),
+                ("max_retries", "LANCEDB_STORAGE_MAX_RETRIES"),
+                ("retry_timeout", "LANCEDB_STORAGE_RETRY_TIMEOUT"),
+                ("pool_max_idle_per_host", "LANCEDB_STORAGE_POOL_MAX_IDLE_PER_HOST"),
+            )
+            if env in os.environ
+        }
+        storage_config.tuning = tuning or None
+        storage_config.cache_dir = os.getenv("LANCEDB_CACHE_DIR")
+        storage_config.cache_max_bytes = int(os.getenv("LANCEDB_CACHE_MAX_BYTES", StorageConfig.cache_max_bytes))
+        storage_config.cache_refresh_seconds = float(os.getenv("LANCEDB_CACHE_REFRESH_SECONDS", StorageConfig.cache_refresh_seconds))
         
         if storage_provider == "azure":
-            # Only import and configure Azure if explicitly requested
-            try:
-                from azure.identity import DefaultAzureCredential
-                storage_config.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-                storage_config.container_name = os.getenv("AZURE_STORAGE_CONTAINER")
-            except ImportError:
+            # Only configure Azure if explicitly requested, the SDK itself is imported by the storage provider
+            if not AZURE_AVAILABLE:
                 raise ImportError("Azure dependencies required for Azure storage")
+            storage_config.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+            storage_config.container_name = os.getenv("AZURE_STORAGE_CONTAINER")
                 
         elif storage_provider == "s3":
             storage_config.credentials = {
                 "bucket": os.getenv("AWS_S3_BUCKET"),
                 "access_key": os.getenv("AWS_ACCESS_KEY_ID"),
-                "secret_key": os.getenv("AWS_SECRET_ACCESS_KEY")
+                "secret_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+                "session_token": os.getenv("AWS_SESSION_TOKEN"),
+                "region": os.getenv("AWS_REGION"),
+                "endpoint": os.getenv("AWS_ENDPOINT_URL"),
             }
             
         return cls(
@@ -132,7 +203,9 @@ class AppConfig:
                 storage=storage_config,
                 table_name=os.getenv("DB_TABLE_NAME", "default"),
                 embedder_provider=embedder_provider
-            )
+            ),
+            concurrency=ConcurrencyConfig.from_environment(),
+            write_buffer=WriteBufferConfig.from_environment(),
         )
 
 
@@ -141,8 +214,8 @@ class LLM:
 
     def __init__(
         self,
-        credential: DefaultAzureCredential,
-        config: AzureOpenAiConfig = AzureOpenAiConfig(),
+        credential: "DefaultAzureCredential",
+        config: AzureOpenAiConfig = None,
     ):
         """_summary_
 
@@ -150,7 +223,10 @@ class LLM:
             credential (DefaultAzureCredential): _description_
             config (AzureOpenAiConfig, optional): _description_. Defaults to AzureOpenAiConfig().
         """
+        from azure.identity import get_bearer_token_provider
+        from openai import AzureOpenAI
 
+        config = config or AzureOpenAiConfig()
         assert isinstance(config, AzureOpenAiConfig)
         self.config = config
         self.openai = AzureOpenAI(
@@ -203,6 +279,9 @@ class LLM:
 
     @cached_property
     def _azure_openai_client(self):
+        from azure.identity import DefaultAzureCredential
+        from openai import AzureOpenAI
+
         if not os.environ.get("OPENAI_API_KEY") and not self.config.get_openai_api_key(DefaultAzureCredential()):
             raise ValueError("OPENAI_API_KEY environment variable is not set")
         return AzureOpenAI(
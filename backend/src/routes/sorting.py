@@ -0,0 +1,160 @@
+"""
+Server-side sorting for fetch_data.
+
+The first pages of a sorted table are computed with a streaming top-k: only the sort columns and row ids
+are scanned, batch by batch, and never more than `offset + limit` candidates are kept, so memory stays
+bounded by the page depth instead of the table size. The rows of the requested page are then taken by
+row id with the columns the caller asked for.
+
+Deep pages would keep almost the whole table as candidates, so a sorted permutation of the row ids can be
+built once per (table, version, filter, sort key) and cached; any page is then a slice of it plus a take.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from routes.filters import FilterError
+from routes.metrics import record_cache
+
+SortKeys = List[Tuple[str, str]]
+
+# batches scanned for the top-k, small enough to keep the candidate merges cheap
+SCAN_BATCH_ROWS = 8192
+# pages deeper than this use (and build) a sorted permutation instead of a top-k scan
+PERMUTATION_MIN_ROWS = int(os.getenv("LANCEDB_SORT_PERMUTATION_MIN_ROWS", 10_000))
+# total size of the cached permutations, 8 bytes per row
+SORT_CACHE_MAX_BYTES = int(os.getenv("LANCEDB_SORT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+
+def parse_order_by(order_by: str, schema: pa.Schema) -> SortKeys:
+    """
+    Parse "score:desc,user_id" into pyarrow sort keys, checked against the table schema.
+
+    Returns:
+        SortKeys: (column, "ascending" | "descending") pairs, ending with _rowid so ties have a stable order.
+    """
+    sort_keys = []
+    for part in order_by.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        column, _, direction = part.rpartition(":") if part.endswith((":asc", ":desc")) else (part, "", "asc")
+        index = schema.get_field_index(column)
+        if index < 0:
+            raise FilterError(f"Unknown column '{column}' in order_by")
+        data_type = schema.field(index).type
+        if pa.types.is_nested(data_type) or pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+            raise FilterError(f"Column '{column}' of type {data_type} can't be sorted")
+        sort_keys.append((column, "descending" if direction == "desc" else "ascending"))
+    if not sort_keys:
+        raise FilterError("order_by names no column")
+    return sort_keys + [("_rowid", "ascending")]
+
+
+def _sort_columns(sort_keys: SortKeys) -> List[str]:
+    return [column for column, _ in sort_keys if column != "_rowid"]
+
+
+def sort_columns_query(table, sort_keys: SortKeys, filter: Optional[str]):
+    """The query reading the sort columns and row ids of the rows passing the filter"""
+    query = table.search().select(_sort_columns(sort_keys)).with_row_id(True).limit(None)
+    if filter:
+        query = query.where(filter)
+    return query
+
+
+def scan_sort_columns(table, sort_keys: SortKeys, filter: Optional[str]) -> pa.RecordBatchReader:
+    return sort_columns_query(table, sort_keys, filter).to_batches(SCAN_BATCH_ROWS)
+
+
+def sort_path(cached: bool, sort_cache: bool, depth: Optional[int]) -> str:
+    """
+    How a sorted page is computed.
+
+    Returns:
+        str: "permutation_cache_hit" when the permutation is cached, "permutation_build" when it is built
+            (asked for, or the page is deeper than PERMUTATION_MIN_ROWS), "top_k" otherwise.
+    """
+    if cached:
+        return "permutation_cache_hit"
+    # a top-k this deep keeps about as many candidates as a full sort, which can then be reused
+    if sort_cache or depth is None or depth > PERMUTATION_MIN_ROWS:
+        return "permutation_build"
+    return "top_k"
+
+
+def top_k(batches: Iterable[pa.RecordBatch], sort_keys: SortKeys, k: int) -> pa.Table:
+    """
+    Keep the first k rows in sort order of a stream of batches, merging each batch into the candidates.
+
+    Returns:
+        pa.Table: At most k rows with the sort columns and _rowid, sorted.
+    """
+    candidates = None
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        merged = pa.Table.from_batches([batch]) if candidates is None else pa.concat_tables([candidates, pa.Table.from_batches([batch])])
+        if merged.num_rows > k:
+            # not select_k_unstable, it drops the rows whose first sort key is null, sort_indices puts them last
+            # like the permutation does
+            merged = merged.take(pc.sort_indices(merged, sort_keys=sort_keys)[:k])
+        candidates = merged
+    if candidates is None:
+        return None
+    return candidates.take(pc.sort_indices(candidates, sort_keys=sort_keys))
+
+
+def sorted_row_ids(batches: Iterable[pa.RecordBatch], sort_keys: SortKeys) -> pa.Array:
+    """All row ids in sort order"""
+    table = pa.Table.from_batches(list(batches))
+    if table.num_rows == 0:
+        return pa.array([], pa.uint64())
+    return table.column("_rowid").take(pc.sort_indices(table, sort_keys=sort_keys)).combine_chunks()
+
+
+class SortCache:
+    """LRU cache of sorted row id permutations, bounded by their total size"""
+
+    def __init__(self, max_bytes: int = SORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, pa.Array]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[pa.Array]:
+        with self._lock:
+            row_ids = self._entries.get(key)
+            if row_ids is not None:
+                self._entries.move_to_end(key)
+        record_cache("sort_permutation", row_ids is not None)
+        return row_ids
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a permutation is cached, without counting a hit or miss or refreshing it"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Hashable, row_ids: pa.Array):
+        size = row_ids.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = row_ids
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, table_name: str):
+        """Drop the permutations of a table, e.g. when it is dropped (new versions get new keys anyway)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == table_name]:
+                self._bytes -= self._entries.pop(key).nbytes
+
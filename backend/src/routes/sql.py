@@ -0,0 +1,187 @@
+"""
+Read-only SQL over Lance tables with an embedded DuckDB.
+
+Every query gets its own in-memory DuckDB connection in which the tables it references are registered as
+Lance datasets. Lance datasets are Arrow datasets, so DuckDB scans them natively and pushes the projected
+columns and the filters down into the Lance scanner instead of reading whole tables.
+
+The connection can't touch the file system or the network (read_csv, COPY, ATTACH, extensions) and its
+configuration is locked once the limits are set. Only a single SELECT statement is accepted.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import pyarrow as pa
+
+SQL_AVAILABLE = find_spec("duckdb") is not None
+
+
+@dataclass
+class SqlLimits:
+    """Limits of one SQL query"""
+    max_rows: int = 100_000  # rows returned, the result is cut off after that
+    timeout_seconds: float = 30.0  # wall time from the start of the query to the last batch
+    memory_limit: str = "1GB"  # DuckDB memory_limit, operators spill or fail beyond it
+    threads: int = 2
+    batch_rows: int = 1000  # rows per streamed batch
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            max_rows=int(os.getenv("LANCEDB_SQL_MAX_ROWS", cls.max_rows)),
+            timeout_seconds=float(os.getenv("LANCEDB_SQL_TIMEOUT_SECONDS", cls.timeout_seconds)),
+            memory_limit=os.getenv("LANCEDB_SQL_MEMORY_LIMIT", cls.memory_limit),
+            threads=int(os.getenv("LANCEDB_SQL_THREADS", cls.threads)),
+        )
+
+
+class SqlError(ValueError):
+    """A SQL query that is not allowed, doesn't parse, or exceeded its limits"""
+
+
+def _referenced_tables(connection, sql: str) -> Set[str]:
+    """Names of the tables a query reads, from its syntax tree (CTE names included), before anything is bound"""
+    tree = json.loads(connection.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    if tree.get("error"):
+        raise SqlError(tree.get("error_message", "The query could not be parsed"))
+    names = set()
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, dict):
+            if node.get("type") == "BASE_TABLE" and node.get("schema_name") in ("", "main"):
+                names.add(node["table_name"])
+            nodes.extend(node.values())
+        elif isinstance(node, list):
+            nodes.extend(node)
+    return names
+
+
+class SqlQuery:
+    """
+    One SQL query, executed on start() and read batch by batch with next_batch().
+
+    Args:
+        sql (str): A single SELECT statement.
+        open_datasets (Callable): Returns the Lance datasets of the given existing table names by name.
+        table_names (List[str]): Tables of the database, other names in the query are left to DuckDB.
+        limits (SqlLimits): Row, time and memory limits.
+    """
+
+    def __init__(self, sql: str, open_datasets: Callable[[List[str]], Dict[str, Any]], table_names: List[str], limits: SqlLimits = None):
+        if not SQL_AVAILABLE:
+            raise RuntimeError("SQL queries need the duckdb package, install the backend with the 'sql' extra")
+        self.sql = sql
+        self.open_datasets = open_datasets
+        self.table_names = table_names
+        self.limits = limits or SqlLimits.from_environment()
+        self.rows = 0
+        self.truncated = False
+        self.timed_out = False
+        self._connection = None
+        self._reader: Optional[pa.RecordBatchReader] = None
+        self._timer: Optional[threading.Timer] = None
+        self._started = None
+        self.schema: Optional[pa.Schema] = None
+
+    def start(self) -> pa.Schema:
+        """
+        Check and execute the query.
+
+        Returns:
+            pa.Schema: Schema of the result.
+
+        Raises:
+            SqlError: If the query is not a single SELECT or fails to plan.
+        """
+        import duckdb
+
+        try:
+            statements = duckdb.extract_statements(self.sql)
+        except duckdb.Error as e:
+            raise SqlError(str(e))
+        if len(statements) != 1:
+            raise SqlError("Exactly one SQL statement is allowed")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise SqlError(f"Only SELECT statements are allowed, got {statements[0].type.name}")
+
+        self._connection = duckdb.connect(":memory:", config={
+            "enable_external_access": False,
+            "autoinstall_known_extensions": False,
+            "autoload_known_extensions": False,
+            "memory_limit": self.limits.memory_limit,
+            "threads": self.limits.threads,
+        })
+        try:
+            referenced = _referenced_tables(self._connection, self.sql)
+            for name, dataset in self.open_datasets(sorted(referenced & set(self.table_names))).items():
+                self._connection.register(name, dataset)
+            self._connection.execute("SET lock_configuration = true")
+
+            self._started = time.perf_counter()
+            self._timer = threading.Timer(self.limits.timeout_seconds, self._interrupt)
+            self._timer.daemon = True
+            self._timer.start()
+            self._reader = self._connection.execute(self.sql).fetch_record_batch(self.limits.batch_rows)
+            self.schema = self._reader.schema
+            return self.schema
+        except duckdb.Error as e:
+            self.close()
+            raise self._error(e)
+        except Exception:
+            self.close()
+            raise
+
+    def _interrupt(self):
+        connection = self._connection
+        if connection is not None:
+            self.timed_out = True
+            connection.interrupt()
+
+    def _error(self, error: Exception) -> Exception:
+        if self.timed_out:
+            return SqlError(f"The query exceeded its time limit of {self.limits.timeout_seconds}s")
+        return SqlError(str(error))
+
+    def next_batch(self) -> Optional[pa.RecordBatch]:
+        """The next batch of the result, None when it is complete or the row limit is reached"""
+        import duckdb
+
+        if self._reader is None:
+            return None
+        try:
+            batch = self._reader.read_next_batch()
+        except StopIteration:
+            return None
+        except duckdb.Error as e:
+            raise self._error(e)
+        remaining = self.limits.max_rows - self.rows
+        if batch.num_rows >= remaining:
+            # whatever the reader still holds is left out, and not computed
+            self.truncated = batch.num_rows > remaining or self._has_more()
+            batch = batch.slice(0, remaining)
+            self._reader = None
+        self.rows += batch.num_rows
+        return batch
+
+    def _has_more(self) -> bool:
+        try:
+            return self._reader.read_next_batch().num_rows > 0
+        except StopIteration:
+            return False
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000 if self._started is not None else 0.0
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._connection is not None:
+            self._connection.close()
+        self._reader = None
+        self._connection = None
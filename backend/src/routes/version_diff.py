@@ -0,0 +1,143 @@
+"""
+Row-level diff of two versions of a Lance table computed from fragment metadata.
+
+A Lance version is a list of fragments, each a set of immutable data files plus an optional deletion file.
+Fragments whose metadata is identical in both versions hold exactly the same rows and are never read. Only
+fragments that were added, removed or changed (new deletion file, rewritten columns) are scanned, and of
+those only the row ids and the key column, so the cost follows the size of the change, not of the table.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# rows per `_rowid IN (...)` filter when fetching the rows of the diff
+TAKE_CHUNK_ROWS = 1000
+
+
+def _fragment_metadata(dataset) -> Dict[int, Any]:
+    return {fragment.fragment_id: fragment.metadata for fragment in dataset.get_fragments()}
+
+
+def _data_files(metadata) -> List[str]:
+    return sorted(data_file.path for data_file in metadata.data_files())
+
+
+def _scan_ids(dataset, fragment_ids, key: Optional[str]) -> Tuple[List[int], List[Any]]:
+    """Row ids and keys of the live rows in some fragments"""
+    if not fragment_ids:
+        return [], []
+    fragments = [dataset.get_fragment(fragment_id) for fragment_id in sorted(fragment_ids)]
+    table = dataset.scanner(fragments=fragments, columns=[key] if key else [], with_row_id=True).to_table()
+    return table.column("_rowid").to_pylist(), table.column(key).to_pylist() if key else []
+
+
+def _take(dataset, row_ids: List[int], columns: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Fetch rows by row id, in the order of `row_ids`"""
+    rows = {}
+    for start in range(0, len(row_ids), TAKE_CHUNK_ROWS):
+        chunk = row_ids[start:start + TAKE_CHUNK_ROWS]
+        table = dataset.scanner(columns=columns, with_row_id=True, filter=f"_rowid IN ({', '.join(map(str, chunk))})").to_table()
+        rows.update((row["_rowid"], row) for row in table.to_pylist())
+    return [rows[row_id] for row_id in row_ids if row_id in rows]
+
+
+def _strip(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in row.items() if name != "_rowid"}
+
+
+def diff_versions(
+    before,
+    after,
+    key: str = None,
+    limit: int = 100,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Diff two checked out versions of a Lance dataset.
+
+    Lance has no in-place updates: an update deletes the old row and appends the new one, and compaction
+    moves rows to new fragments. With a `key` column a deleted and an added row with the same key are
+    reported as one update when their values differ and left out when they are equal (moved rows).
+
+    Args:
+        before (lance.LanceDataset): The older version.
+        after (lance.LanceDataset): The newer version.
+        key (str): Column identifying a row across versions, e.g. "user_id".
+        limit (int): Maximum number of rows returned per category, the counts are always exact.
+        columns (List[str]): Columns of the returned rows, all when None.
+
+    Returns:
+        dict: Fragment and row counts and up to `limit` added, deleted and updated rows.
+    """
+    fragments_before, fragments_after = _fragment_metadata(before), _fragment_metadata(after)
+    removed = set(fragments_before) - set(fragments_after)
+    added = set(fragments_after) - set(fragments_before)
+    changed, rewritten = set(), set()
+    for fragment_id in set(fragments_before) & set(fragments_after):
+        old, new = fragments_before[fragment_id], fragments_after[fragment_id]
+        if old.to_json() == new.to_json():
+            continue
+        changed.add(fragment_id)
+        if _data_files(old) != _data_files(new):
+            rewritten.add(fragment_id)
+
+    # row ids (and keys) of the rows that are gone and of the rows that are new
+    old_ids, old_key_values = _scan_ids(before, removed | changed, key)
+    new_ids, new_key_values = _scan_ids(after, added | changed, key)
+    surviving: Set[int] = set(old_ids) & set(new_ids)
+    deleted_ids = [row_id for row_id in old_ids if row_id not in surviving]
+    added_ids = [row_id for row_id in new_ids if row_id not in surviving]
+
+    updated_pairs = []  # (row id before, row id after)
+    # rows of rewritten fragments keep their row id but may have new values
+    rewritten_ids = sorted(row_id for row_id in surviving if row_id >> 32 in rewritten)
+    for start in range(0, len(rewritten_ids), TAKE_CHUNK_ROWS):
+        chunk = rewritten_ids[start:start + TAKE_CHUNK_ROWS]
+        for old, new in zip(_take(before, chunk, columns), _take(after, chunk, columns)):
+            if _strip(old) != _strip(new):
+                updated_pairs.append((old["_rowid"], new["_rowid"]))
+
+    if key:
+        old_keys = dict(zip(old_ids, old_key_values))
+        new_keys = dict(zip(new_ids, new_key_values))
+        deleted_by_key = {old_keys[row_id]: row_id for row_id in deleted_ids}
+        added_by_key = {new_keys[row_id]: row_id for row_id in added_ids}
+        matched = [value for value in added_by_key if value in deleted_by_key]
+        moved = set()
+        for start in range(0, len(matched), TAKE_CHUNK_ROWS):
+            chunk = matched[start:start + TAKE_CHUNK_ROWS]
+            old_chunk = _take(before, [deleted_by_key[value] for value in chunk], columns)
+            new_chunk = _take(after, [added_by_key[value] for value in chunk], columns)
+            for old, new in zip(old_chunk, new_chunk):
+                if _strip(old) == _strip(new):
+                    moved.add(old["_rowid"])
+                    moved.add(new["_rowid"])
+                else:
+                    updated_pairs.append((old["_rowid"], new["_rowid"]))
+        paired = moved | {row_id for pair in updated_pairs for row_id in pair}
+        deleted_ids = [row_id for row_id in deleted_ids if row_id not in paired]
+        added_ids = [row_id for row_id in added_ids if row_id not in paired]
+
+    shown_updates = updated_pairs[:limit]
+    return {
+        "fragments": {
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "unchanged": len(set(fragments_before) & set(fragments_after)) - len(changed),
+        },
+        "rows": {
+            "before": before.count_rows(),
+            "after": after.count_rows(),
+            "added": len(added_ids),
+            "deleted": len(deleted_ids),
+            "updated": len(updated_pairs),
+        },
+        "added": [_strip(row) for row in _take(after, added_ids[:limit], columns)],
+        "deleted": [_strip(row) for row in _take(before, deleted_ids[:limit], columns)],
+        "updated": [
+            {"before": _strip(old), "after": _strip(new)}
+            for old, new in zip(
+                _take(before, [old for old, _ in shown_updates], columns),
+                _take(after, [new for _, new in shown_updates], columns),
+            )
+        ],
+    }
@@ -0,0 +1,159 @@
+"""
+Coalescing of many small adds to a table into fewer, larger commits.
+
+Every add is its own Lance commit and fragment, so producers sending a handful of rows at a time leave a
+table of tiny fragments that scan slowly and need constant compaction. A buffer collects the rows of the
+adds to one table and writes them in one commit once it holds max_rows rows or its oldest row waited
+max_delay_seconds. Rows with a key already in the buffer are dropped, the first one wins as with add_data.
+
+With durability "flush" an add is acknowledged once its rows are committed. With "buffer" it is
+acknowledged as soon as the rows are buffered, which is faster but loses them if the process dies first.
+"""
+import logging
+import threading
+import time
+from collections import Counter as Tally
+from concurrent.futures import Future
+from typing import Any, Callable, Collection, Dict, List, Tuple
+
+from routes.metrics import Counter, Histogram, REGISTRY
+from routes.setup import WriteBufferConfig
+
+FLUSH_ROWS = REGISTRY.register(Histogram(
+    "lancedb_write_buffer_flush_rows",
+    "Rows written per write buffer flush by table.",
+    ("table",),
+    buckets=(1, 10, 100, 500, 1000, 5000, 10000, 50000),
+))
+FLUSH_LATENCY = REGISTRY.register(Histogram(
+    "lancedb_write_buffer_flush_seconds",
+    "Latency of write buffer flushes by table.",
+    ("table",),
+))
+BUFFERED_ROWS = REGISTRY.register(Counter(
+    "lancedb_write_buffer_rows_total",
+    "Rows added through write buffers by table and outcome (buffered, deduplicated, failed).",
+    ("table", "outcome"),
+))
+
+
+class TableWriteBuffer:
+    """
+    Buffer of the rows added to one table, flushed by its own thread.
+
+    Args:
+        table_name (str): Name of the table.
+        unique_field (str): Key column, rows are deduplicated on it.
+        write (Callable): Writes a list of rows in one commit, returning the keys actually added.
+        config (WriteBufferConfig): Flush thresholds.
+    """
+
+    def __init__(self, table_name: str, unique_field: str, write: Callable[[List[Dict[str, Any]]], Collection], config: WriteBufferConfig):
+        self.table_name = table_name
+        self.unique_field = unique_field
+        self.config = config
+        self._write = write
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._owners: Dict[Any, Future] = {}  # the add whose row was kept for each key
+        self._waiters: List[Future] = []
+        self._oldest = None
+        self._force = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"write-buffer-{table_name}", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._rows)
+
+    def append(self, rows: List[Dict[str, Any]]) -> Future:
+        """
+        Buffer the rows of one add.
+
+        Returns:
+            Future: Resolves to the number of its rows that were added once they are committed.
+        """
+        future = Future()
+        if not rows:
+            future.set_result(0)
+            return future
+        if any(self.unique_field not in row for row in rows):
+            raise ValueError(f"Every row needs the key column '{self.unique_field}'")
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"The write buffer of '{self.table_name}' is closed")
+            deduplicated = 0
+            for row in rows:
+                key = row[self.unique_field]
+                if key in self._rows:
+                    deduplicated += 1
+                    continue
+                self._rows[key] = row
+                self._owners[key] = future
+            self._waiters.append(future)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._condition.notify()
+        BUFFERED_ROWS.inc(self.table_name, "buffered", amount=len(rows) - deduplicated)
+        if deduplicated:
+            BUFFERED_ROWS.inc(self.table_name, "deduplicated", amount=deduplicated)
+        return future
+
+    def flush(self):
+        """Write the buffered rows now and wait for the commit"""
+        with self._condition:
+            if not self._rows:
+                return
+            future = Future()
+            self._waiters.append(future)
+            self._force = True
+            self._condition.notify()
+        future.result()
+
+    def close(self):
+        """Flush the remaining rows and stop the flush thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _due(self) -> bool:
+        return self._force or self._closed or len(self._rows) >= self.config.max_rows or (
+            time.monotonic() - self._oldest >= self.config.max_delay_seconds
+        )
+
+    def _take(self) -> Tuple[List[Dict[str, Any]], Dict[Any, Future], List[Future]]:
+        with self._condition:
+            while not (self._rows and self._due()):
+                if self._closed and not self._rows:
+                    for future in self._waiters:
+                        future.set_result(0)
+                    self._waiters = []
+                    return [], {}, []
+                timeout = None if not self._rows else max(self.config.max_delay_seconds - (time.monotonic() - self._oldest), 0)
+                self._condition.wait(timeout)
+            batch = (list(self._rows.values()), self._owners, self._waiters)
+            self._rows, self._owners, self._waiters = {}, {}, []
+            self._oldest, self._force = None, False
+            return batch
+
+    def _run(self):
+        while True:
+            rows, owners, waiters = self._take()
+            if not rows:
+                return
+            started = time.perf_counter()
+            try:
+                added = self._write(rows)
+            except Exception as e:
+                logging.exception(f"Flushing {len(rows)} buffered rows to '{self.table_name}' failed: {e}")
+                BUFFERED_ROWS.inc(self.table_name, "failed", amount=len(rows))
+                for future in waiters:
+                    future.set_exception(e)
+                continue
+            FLUSH_LATENCY.observe(time.perf_counter() - started, self.table_name)
+            FLUSH_ROWS.observe(len(rows), self.table_name)
+            counts = Tally(owners[key] for key in added if key in owners)
+            for future in waiters:
+                future.set_result(counts[future])
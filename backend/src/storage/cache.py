@@ -0,0 +1,296 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Optional
+
+import lancedb
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from routes.metrics import REGISTRY, Counter, record_cache
+
+DISK_CACHE_BYTES = REGISTRY.register(Counter(
+    "lancedb_disk_cache_bytes_total",
+    "Bytes of remote table files downloaded into the disk cache or found there already (saved).",
+    ("result",),
+))
+
+# Lance never rewrites a file once it is written: data files, deletion files and index files have unique
+# names and a manifest is never changed after its version is committed. Only the legacy _latest.manifest
+# pointer is overwritten, so it is the one file that is always downloaded again.
+MUTABLE_FILES = ("_latest.manifest",)
+# Transaction files are only read when resolving commit conflicts, which never happens on the read-only mirror
+SKIPPED_DIRECTORIES = ("_transactions/",)
+# A table that takes more than this share of the cache is read remotely, it would evict everything else
+MAX_TABLE_FRACTION = 0.5
+
+
+class TableDiskCache:
+    """
+    Read-through disk cache for the tables of a remote storage provider.
+
+    The files of a table are mirrored into `directory`, which is itself a valid LanceDB database, so reads can
+    open the table from local disk. Mirrors are filled and refreshed on a background thread: a read of a table
+    that is not mirrored yet goes to remote storage and schedules the sync, later reads use the mirror.
+    A mirror older than `refresh_seconds` is still used while it is refreshed in the background, and
+    `invalidate` (called after this process writes to a table) sends reads back to remote storage until the
+    next sync, so writes are always visible to the reads that follow them.
+
+    Whole tables are evicted in least recently used order once the cache holds more than `max_bytes`.
+
+    Worker processes share `directory`, each cache mirrors into a slot of it (`worker-0`, `worker-1`, ...)
+    held with a file lock, so no process syncs or evicts the mirrors another one reads. The lock goes with the
+    process, and a restarted worker reuses the mirrors of the slot it gets.
+    """
+
+    def __init__(self, provider, directory: str, max_bytes: int, refresh_seconds: float = 5.0):
+        self.provider = provider
+        self.directory, self._slot = _claim_slot(directory)
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        # table name -> {relative file path: size}, least recently read first
+        self._tables: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._synced_at: Dict[str, float] = {}
+        self._pins: Dict[str, int] = {}
+        self._pending = set()
+        self._too_large = set()
+        # bumped by invalidate, a sync that started before a write must not mark the mirror up to date
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # one sync at a time, they would download the same files
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="lancedb-disk-cache")
+        self._db = lancedb.connect(self.directory, read_consistency_interval=timedelta(0))
+        self._handles = {}
+        self._stats = {"disk_reads": 0, "remote_reads": 0, "bytes_downloaded": 0, "bytes_saved": 0,
+                       "files_downloaded": 0, "evictions": 0, "sync_errors": 0}
+        self._load_existing()
+
+    def _table_dir(self, table_name: str) -> str:
+        return os.path.join(self.directory, f"{table_name}.lance")
+
+    def _load_existing(self):
+        """Index the mirrors left by a previous run, their files are reused by the first sync"""
+        tables = []
+        for entry in os.scandir(self.directory):
+            if not (entry.is_dir() and entry.name.endswith(".lance")):
+                continue
+            files = {}
+            for root, _, names in os.walk(entry.path):
+                for name in names:
+                    path = os.path.join(root, name)
+                    files[os.path.relpath(path, entry.path).replace(os.sep, "/")] = os.path.getsize(path)
+            tables.append((entry.stat().st_mtime, entry.name[:-len(".lance")], files))
+        for _, table_name, files in sorted(tables):
+            self._tables[table_name] = files
+
+    @property
+    def cached_bytes(self) -> int:
+        with self._lock:
+            return sum(sum(files.values()) for files in self._tables.values())
+
+    @contextmanager
+    def reading(self, table_name: str):
+        """
+        Pin the mirror of a table for the duration of a read.
+
+        Yields:
+            bool: True if the read can use the mirror in `directory`, False if it has to go to remote storage.
+        """
+        with self._lock:
+            synced_at = self._synced_at.get(table_name)
+            use_mirror = synced_at is not None
+            if use_mirror:
+                self._pins[table_name] = self._pins.get(table_name, 0) + 1
+                self._tables.move_to_end(table_name)
+                self._stats["disk_reads"] += 1
+            else:
+                self._stats["remote_reads"] += 1
+            stale = synced_at is None or time.monotonic() - synced_at > self.refresh_seconds
+        record_cache("disk", use_mirror)
+        if stale:
+            self.schedule_sync(table_name)
+        try:
+            yield use_mirror
+        finally:
+            if use_mirror:
+                with self._lock:
+                    self._pins[table_name] -= 1
+
+    def open_table(self, table_name: str):
+        """Open the mirror of a table, only valid inside `reading` when it yielded True"""
+        with self._lock:
+            table = self._handles.get(table_name)
+        if table is None:
+            table = self._db.open_table(table_name)
+            with self._lock:
+                self._handles[table_name] = table
+        return table
+
+    def schedule_sync(self, table_name: str):
+        with self._lock:
+            if table_name in self._pending or table_name in self._too_large:
+                return
+            self._pending.add(table_name)
+        self._executor.submit(self._sync_in_background, table_name)
+
+    def _sync_in_background(self, table_name: str):
+        try:
+            self.sync(table_name)
+        except Exception as e:
+            self._stats["sync_errors"] += 1
+            logging.error(f"Error syncing table '{table_name}' into the disk cache: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(table_name)
+
+    def sync(self, table_name: str) -> bool:
+        """
+        Bring the mirror of a table up to date with remote storage, downloading only the files it doesn't have.
+
+        Args:
+            table_name (str): Name of the table.
+
+        Returns:
+            bool: Whether the table is mirrored, tables larger than half of the cache are not.
+        """
+        with self._sync_lock:
+            return self._sync(table_name)
+
+    def _sync(self, table_name: str) -> bool:
+        prefix = f"{table_name}.lance/"
+        remote = {
+            key[len(prefix):]: size
+            for key, size in self.provider.list_objects(prefix)
+            if not key[len(prefix):].startswith(SKIPPED_DIRECTORIES)
+        }
+        if not remote:
+            self.remove(table_name)
+            return False
+        if sum(remote.values()) > self.max_bytes * MAX_TABLE_FRACTION:
+            logging.info(f"Table '{table_name}' is too large for the disk cache, it is read from remote storage")
+            with self._lock:
+                self._too_large.add(table_name)
+            self.remove(table_name)
+            return False
+
+        table_dir = self._table_dir(table_name)
+        with self._lock:
+            local = dict(self._tables.get(table_name, {}))
+            generation = self._generations.get(table_name, 0)
+        # manifests go last, so a version only becomes visible on disk once all of its files are there
+        for relative_path in sorted(remote, key=lambda path: (path.startswith("_versions/"), path.endswith(MUTABLE_FILES), path)):
+            size = remote[relative_path]
+            if local.get(relative_path) == size and not relative_path.endswith(MUTABLE_FILES):
+                self._stats["bytes_saved"] += size
+                DISK_CACHE_BYTES.inc("saved", amount=size)
+                continue
+            path = os.path.join(table_dir, *relative_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f"{path}.partial"
+            self.provider.download(prefix + relative_path, partial)
+            os.replace(partial, path)
+            local[relative_path] = size
+            self._stats["bytes_downloaded"] += size
+            self._stats["files_downloaded"] += 1
+            DISK_CACHE_BYTES.inc("downloaded", amount=size)
+
+        with self._lock:
+            # files that were removed remotely (compaction, cleanup of old versions) can only be deleted when
+            # no read is using the mirror, otherwise the next sync does it
+            if not self._pins.get(table_name):
+                for relative_path in set(local) - set(remote):
+                    _remove_file(os.path.join(table_dir, *relative_path.split("/")))
+                    del local[relative_path]
+            self._tables[table_name] = local
+            self._tables.move_to_end(table_name)
+            if self._generations.get(table_name, 0) == generation:
+                self._synced_at[table_name] = time.monotonic()
+            self._evict(keep=table_name)
+        return True
+
+    def _evict(self, keep: str):
+        """Remove least recently read tables until the cache fits, must hold the lock"""
+        total = sum(sum(files.values()) for files in self._tables.values())
+        for table_name in list(self._tables):
+            if total <= self.max_bytes:
+                break
+            if table_name == keep or self._pins.get(table_name):
+                continue
+            total -= sum(self._tables.pop(table_name).values())
+            self._synced_at.pop(table_name, None)
+            self._handles.pop(table_name, None)
+            shutil.rmtree(self._table_dir(table_name), ignore_errors=True)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, table_name: str):
+        """Send reads of a table to remote storage until its mirror has been synced again, e.g. after a write"""
+        with self._lock:
+            self._synced_at.pop(table_name, None)
+            self._too_large.discard(table_name)
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+
+    def remove(self, table_name: str):
+        """Forget the mirror of a table and delete its files unless a read is using them"""
+        with self._lock:
+            self._synced_at.pop(table_name, None)
+            if self._pins.get(table_name):
+                return
+            self._tables.pop(table_name, None)
+            self._handles.pop(table_name, None)
+            shutil.rmtree(self._table_dir(table_name), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["tables"] = {
+                table_name: {"bytes": sum(files.values()), "files": len(files), "ready": table_name in self._synced_at}
+                for table_name, files in self._tables.items()
+            }
+        reads = stats["disk_reads"] + stats["remote_reads"]
+        stats["hit_ratio"] = stats["disk_reads"] / reads if reads else None
+        stats["cached_bytes"] = sum(table["bytes"] for table in stats["tables"].values())
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        # closing the lock file releases the slot
+        self._slot.close()
+
+
+def _claim_slot(directory: str):
+    """The first slot directory of `directory` that no other cache holds, and its open, locked lock file"""
+    os.makedirs(directory, exist_ok=True)
+    slot = 0
+    while True:
+        lock_file = open(os.path.join(directory, f"worker-{slot}.lock"), "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            slot += 1
+            continue
+        path = os.path.join(directory, f"worker-{slot}")
+        os.makedirs(path, exist_ok=True)
+        return path, lock_file
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
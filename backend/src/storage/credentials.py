@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Refresh this long before a credential expires, so handles opened just before the refresh still
+# have a valid token for the queries they run
+DEFAULT_REFRESH_MARGIN_SECONDS = 300
+
+
+class CredentialCache:
+    """
+    Caches a set of storage options derived from a short-lived credential and refreshes them before expiry.
+
+    `fetch` returns the options and the unix time they expire at (None if they never expire). As long as
+    the cached options are valid the very same dict is returned, so callers can detect a refresh by identity.
+    """
+
+    def __init__(self, fetch: Callable[[], Tuple[Dict[str, str], Optional[float]]], refresh_margin: float = DEFAULT_REFRESH_MARGIN_SECONDS):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._options: Optional[Dict[str, str]] = None
+        self._expires_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.refresh_count = 0
+
+    def _needs_refresh(self) -> bool:
+        if self._options is None:
+            return True
+        return self._expires_at is not None and time.time() >= self._expires_at - self.refresh_margin
+
+    def get(self) -> Dict[str, str]:
+        if not self._needs_refresh():
+            return self._options
+        with self._lock:
+            if self._needs_refresh():
+                options, expires_at = self._fetch()
+                self._options, self._expires_at = dict(options), expires_at
+                self.refresh_count += 1
+                if expires_at is not None:
+                    logging.info(f"Refreshed storage credentials, valid for {expires_at - time.time():.0f}s")
+            return self._options
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return self._expires_at
+
+
+def azure_token_fetcher(credential, scope: str = "https://storage.azure.com/.default"):
+    """Fetch a bearer token for Azure Storage as lance storage options"""
+    def fetch():
+        token = credential.get_token(scope)
+        return {"azure_storage_token": token.token}, float(token.expires_on)
+    return fetch
+
+
+def boto3_credentials_fetcher(session):
+    """Fetch the (possibly refreshable, e.g. instance role) credentials of a boto3 session as lance storage options"""
+    def fetch():
+        credentials = session.get_credentials()
+        if credentials is None:
+            raise ValueError("No AWS credentials found, pass access_key/secret_key or configure the default credential chain")
+        frozen = credentials.get_frozen_credentials()
+        options = {
+            "aws_access_key_id": frozen.access_key,
+            "aws_secret_access_key": frozen.secret_key,
+        }
+        if frozen.token:
+            options["aws_session_token"] = frozen.token
+        # refreshable credentials (assumed roles, instance profiles) know when they expire, static keys don't
+        expiry = getattr(credentials, "_expiry_time", None)
+        return options, expiry.timestamp() if expiry is not None else None
+    return fetch
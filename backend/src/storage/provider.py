@@ -1,21 +1,42 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from importlib.util import find_spec
 import os
+from typing import Dict, Iterator, Tuple
 from urllib.parse import urlparse
 
-# Check for optional dependencies
-try:
-    from azure.identity import DefaultAzureCredential
-    from azure.storage.blob import BlobServiceClient
-    AZURE_AVAILABLE = True
-except ImportError:
-    AZURE_AVAILABLE = False
+from storage.credentials import CredentialCache, azure_token_fetcher, boto3_credentials_fetcher
 
-try:
-    import boto3
-    S3_AVAILABLE = True
-except ImportError:
-    S3_AVAILABLE = False
+# Check for optional dependencies without importing them, the SDKs are slow to import and only the
+# provider that needs one loads it
+def _module_available(name: str) -> bool:
+    try:
+        return find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+AZURE_AVAILABLE = _module_available("azure.identity") and _module_available("azure.storage.blob")
+S3_AVAILABLE = _module_available("boto3")
+
+@dataclass
+class ObjectStoreTuning:
+    """Object store client settings passed to lance with the storage options of remote providers"""
+    timeout: str = "60s"  # per request
+    connect_timeout: str = "5s"
+    max_retries: int = 10
+    retry_timeout: int = 180  # seconds spent retrying one request
+    pool_max_idle_per_host: int = 64  # idle connections kept open per host
+    pool_idle_timeout: str = "60s"
+
+    def to_storage_options(self) -> Dict[str, str]:
+        return {
+            "timeout": str(self.timeout),
+            "connect_timeout": str(self.connect_timeout),
+            "client_max_retries": str(self.max_retries),
+            "client_retry_timeout": str(self.retry_timeout),
+            "pool_max_idle_per_host": str(self.pool_max_idle_per_host),
+            "pool_idle_timeout": str(self.pool_idle_timeout),
+        }
 
 @dataclass
 class StorageConfig:
@@ -25,9 +46,15 @@ class StorageConfig:
     local_path: str = None
     credentials: dict = None
     uri: str = None  # Add support for direct URIs
+    tuning: ObjectStoreTuning = None
+    cache_dir: str = None  # local read-through cache of remote tables, disabled when not set
+    cache_max_bytes: int = 10 * 1024 ** 3
+    cache_refresh_seconds: float = 5.0
     
     def __post_init__(self):
         """Parse URI if provided"""
+        if isinstance(self.tuning, dict):
+            self.tuning = ObjectStoreTuning(**self.tuning)
         if self.uri:
             parsed = urlparse(self.uri)
             if parsed.scheme == 'file':
@@ -40,7 +67,13 @@ class StorageConfig:
                 self.provider = 's3'
                 self.credentials = {'bucket': parsed.netloc}
 
+# shared so that providers without options always return the same dict
+_NO_STORAGE_OPTIONS = {}
+
 class StorageProvider(ABC):
+    tuning: ObjectStoreTuning = None
+    cache = None  # storage.cache.TableDiskCache of a remote provider, if enabled
+
     @abstractmethod
     def get_uri(self) -> str:
         """Return the URI for LanceDB to connect to"""
@@ -51,6 +84,29 @@ class StorageProvider(ABC):
         """Test if the connection is valid"""
         pass
 
+    def get_storage_options(self) -> Dict[str, str]:
+        """
+        Return the storage_options lance needs to reach this storage: credentials and object store tuning.
+
+        Credentials come from a cache that refreshes them before they expire. While they are valid the same
+        dict is returned, so a caller can tell that credentials were refreshed when it gets a different one.
+        """
+        return _NO_STORAGE_OPTIONS
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """List the keys and sizes of the objects under a prefix, used by the disk cache"""
+        raise NotImplementedError(f"{type(self).__name__} does not support listing objects")
+
+    def download(self, key: str, path: str):
+        """Download an object to a local file, used by the disk cache"""
+        raise NotImplementedError(f"{type(self).__name__} does not support downloading objects")
+
+def _tuning_from(config) -> ObjectStoreTuning:
+    tuning = getattr(config, "tuning", None)
+    if isinstance(tuning, dict):
+        tuning = ObjectStoreTuning(**tuning)
+    return tuning or ObjectStoreTuning()
+
 class LocalStorageProvider(StorageProvider):
     def __init__(self, config: StorageConfig):
         self.path = config.local_path or "lancedb_data"
@@ -69,17 +125,41 @@ class AzureBlobStorageProvider(StorageProvider):
                 "Azure dependencies not installed. Install with: "
                 "pip install azure-identity azure-storage-blob"
             )
+        from azure.identity import DefaultAzureCredential
+        from azure.storage.blob import BlobServiceClient
+        self.tuning = _tuning_from(config)
         if config.connection_string:
             self.client = BlobServiceClient.from_connection_string(config.connection_string)
+            account_key = getattr(self.client.credential, "account_key", None)
+            static_options = {"azure_storage_account_name": self.client.account_name, **self.tuning.to_storage_options()}
+            if account_key:
+                static_options["azure_storage_account_key"] = account_key
+            # connection strings carry a long lived key (or SAS), there is nothing to refresh
+            self._credentials = CredentialCache(lambda: (static_options, None))
         else:
+            credential = DefaultAzureCredential()
             self.client = BlobServiceClient(
                 account_url=config.credentials.get('account_url'),
-                credential=DefaultAzureCredential()
+                credential=credential
             )
+            static_options = {"azure_storage_account_name": self.client.account_name, **self.tuning.to_storage_options()}
+            fetch_token = azure_token_fetcher(credential)
+            self._credentials = CredentialCache(lambda: _merge(static_options, *fetch_token()))
         self.container_name = config.container_name
 
     def get_uri(self) -> str:
         return f"az://{self.container_name}"
+
+    def get_storage_options(self) -> Dict[str, str]:
+        return self._credentials.get()
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        for blob in self.client.get_container_client(self.container_name).list_blobs(name_starts_with=prefix):
+            yield blob.name, blob.size
+
+    def download(self, key: str, path: str):
+        with open(path, "wb") as f:
+            self.client.get_blob_client(self.container_name, key).download_blob().readinto(f)
     
     def validate_connection(self) -> bool:
         try:
@@ -95,15 +175,40 @@ class S3StorageProvider(StorageProvider):
                 "AWS dependencies not installed. Install with: pip install boto3"
             )
         import boto3
-        self.bucket = config.credentials.get('bucket')
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=config.credentials.get('access_key'),
-            aws_secret_access_key=config.credentials.get('secret_key')
+        credentials = config.credentials
+        self.tuning = _tuning_from(config)
+        self.bucket = credentials.get('bucket')
+        # endpoint points at an S3 compatible store instead of AWS, e.g. MinIO or a local stand-in
+        self.endpoint = credentials.get('endpoint')
+        self.region = credentials.get('region') or os.getenv("AWS_REGION") or "us-east-1"
+        session = boto3.Session(
+            aws_access_key_id=credentials.get('access_key'),
+            aws_secret_access_key=credentials.get('secret_key'),
+            aws_session_token=credentials.get('session_token'),
+            region_name=self.region,
         )
+        self.s3_client = session.client('s3', endpoint_url=self.endpoint)
+
+        static_options = {"aws_region": self.region, **self.tuning.to_storage_options()}
+        if self.endpoint:
+            static_options["aws_endpoint"] = self.endpoint
+            static_options["allow_http"] = str(self.endpoint.startswith("http://")).lower()
+        fetch_credentials = boto3_credentials_fetcher(session)
+        self._credentials = CredentialCache(lambda: _merge(static_options, *fetch_credentials()))
 
     def get_uri(self) -> str:
         return f"s3://{self.bucket}"
+
+    def get_storage_options(self) -> Dict[str, str]:
+        return self._credentials.get()
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        for page in self.s3_client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"], item["Size"]
+
+    def download(self, key: str, path: str):
+        self.s3_client.download_file(self.bucket, key, path)
     
     def validate_connection(self) -> bool:
         try:
@@ -112,6 +217,9 @@ class S3StorageProvider(StorageProvider):
         except Exception:
             return False
 
+def _merge(static_options: Dict[str, str], options: Dict[str, str], expires_at):
+    return {**static_options, **options}, expires_at
+
 def create_storage_provider(config: StorageConfig) -> StorageProvider:
     providers = {
         'local': LocalStorageProvider,
@@ -121,4 +229,14 @@ def create_storage_provider(config: StorageConfig) -> StorageProvider:
     provider_class = providers.get(config.provider.lower())
     if not provider_class:
         raise ValueError(f"Unsupported storage provider: {config.provider}")
-    return provider_class(config)
+    provider = provider_class(config)
+    cache_dir = getattr(config, "cache_dir", None)
+    if cache_dir and provider_class is not LocalStorageProvider:
+        from storage.cache import TableDiskCache
+        provider.cache = TableDiskCache(
+            provider,
+            cache_dir,
+            max_bytes=config.cache_max_bytes,
+            refresh_seconds=config.cache_refresh_seconds,
+        )
+    return provider
@@ -0,0 +1,28 @@
+import pyarrow as pa
+import pytest
+
+from routes.aggregation import Aggregation, AggregationError, aggregate_batches, order_and_limit
+
+
+def test_partial_aggregates_merge_across_batches():
+    table = pa.table({
+        "book": ["a", "b", None, "a", "b", "a"],
+        "score": [1.0, None, 3.0, 5.0, 2.0, None],
+    })
+    aggregation = Aggregation(table.schema, ["book"], [
+        {"op": "count"},
+        {"op": "mean", "column": "score", "as": "avg"},
+        {"op": "min", "column": "score"},
+    ])
+    result = aggregate_batches(aggregation, table.to_batches(max_chunksize=2))
+    rows = order_and_limit(result, ["book"], "count:desc", 2).to_pylist()
+    assert rows == [
+        {"book": "a", "count": 3, "avg": 3.0, "min_score": 1.0},
+        {"book": "b", "count": 2, "avg": 2.0, "min_score": 2.0},
+    ]
+
+    empty = aggregate_batches(Aggregation(table.schema, [], [{"op": "count"}, {"op": "max", "column": "score"}]), [])
+    assert empty.to_pylist() == [{"count": 0, "max_score": None}]
+
+    with pytest.raises(AggregationError):
+        Aggregation(table.schema, ["book"], [{"op": "sum", "column": "book"}])
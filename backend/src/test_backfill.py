@@ -0,0 +1,18 @@
+def test_backfill_resumes_after_a_stop(tmp_path, monkeypatch):
+    from routes import backfill, manager as manager_module
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    monkeypatch.setattr(manager_module, "STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(backfill, "BACKFILL_CHUNK_ROWS", 100)
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path / "db")))))
+    manager.db.create_table("t", data=[{"id": i, "text": f"row {i}"} for i in range(350)])
+
+    polls = []
+    stopped = manager.backfill_embeddings("t", "text", "id", should_stop=lambda: polls.append(1) or len(polls) > 2)
+    assert stopped["status"] == "stopped" and stopped["rows_done"] == 200
+
+    done = manager.backfill_embeddings("t", "text", "id")
+    assert done["status"] == "done" and done["rows_done"] == done["rows_total"] == 350 and done["chunks"] == 4
+    assert manager.get_table("t").count_rows("vector IS NULL") == 0
@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import nullcontext
+
+import pytest
+
+from routes import change_feed
+from routes.change_feed import ChangeFeed
+
+
+def _local_manager(path):
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    return LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(path)))))
+
+
+def test_change_feed_pushes_new_rows(tmp_path, monkeypatch):
+    """Two subscribers share one watcher and both receive the appended row"""
+    from fastapi.testclient import TestClient
+    import main
+    from routes import router_changes, router_database
+
+    monkeypatch.setattr(change_feed, "POLL_INTERVAL_SECONDS", 0.05)
+    manager = _local_manager(tmp_path)
+    monkeypatch.setattr(router_database, "db_manager", manager)
+    manager.db.create_table("t", data=[{"user_id": str(i), "v": i} for i in range(5)])
+
+    # one event loop for both connections, like the server has, each connection would otherwise run its own
+    with TestClient(main.app) as client, client.websocket_connect("/api/changes/t/ws?key=user_id") as first, \
+            client.websocket_connect("/api/changes/t/ws?key=user_id&columns_to_exclude=v") as second:
+        assert first.receive_json()["type"] == "subscribed"
+        assert second.receive_json()["type"] == "subscribed"
+        assert len(router_changes.change_feed.stats()["watchers"]) == 1
+        manager.add_data("t", [{"user_id": "new", "v": 9}], unique_field="user_id")
+        event = first.receive_json()
+        assert event["rows"]["delta"] == 1
+        assert event["added"] == [{"user_id": "new", "v": 9}]
+        assert second.receive_json()["added"] == [{"user_id": "new"}]
+    manager.close()
+
+
+def test_watcher_that_failed_to_start_is_not_reused(tmp_path):
+    """A subscription to a missing table fails every time, and leaves no watcher behind"""
+    manager = _local_manager(tmp_path)
+    feed = ChangeFeed(lambda: nullcontext(manager))
+
+    async def subscribe():
+        async with feed.subscribe("missing"):
+            pass
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            asyncio.run(subscribe())
+        assert feed.stats()["watchers"] == []
+    manager.close()
+
+
+def test_connection_change_closes_subscriptions(tmp_path, monkeypatch):
+    """Watchers of the previous database end their subscriptions, new ones watch the new database"""
+    monkeypatch.setattr(change_feed, "POLL_INTERVAL_SECONDS", 0.01)
+    first, second = _local_manager(tmp_path / "first"), _local_manager(tmp_path / "second")
+    for manager, rows in ((first, 5), (second, 2)):
+        manager.db.create_table("t", data=[{"user_id": str(i)} for i in range(rows)])
+    active = {"manager": first}
+    feed = ChangeFeed(lambda: nullcontext(active["manager"]))
+
+    async def run():
+        async with feed.subscribe("t") as (queue, version):
+            active["manager"] = second
+            event = await asyncio.wait_for(queue.get(), 5)
+            assert event["type"] == "closed"
+            # the old watcher is still subscribed to, but a new subscriber gets one of the new database
+            async with feed.subscribe("t") as (_, new_version):
+                assert new_version == second.latest_version("t")
+                assert len(feed.stats()["watchers"]) == 1
+        assert feed.stats()["watchers"] == []
+
+    asyncio.run(run())
+    first.close()
+    second.close()
+
+
+def test_sse_stream_reports_a_table_it_cannot_watch(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from routes import router_changes, router_database
+
+    manager = _local_manager(tmp_path)
+    monkeypatch.setattr(router_database, "db_manager", manager)
+    with TestClient(main.app) as client:
+        response = client.get("/api/changes/missing/")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: error\n")
+    assert router_changes.change_feed.stats()["watchers"] == []
+    manager.close()
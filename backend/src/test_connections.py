@@ -0,0 +1,51 @@
+def test_workers_follow_the_saved_connection(tmp_path, monkeypatch):
+    from routes import router_database
+    from routes.connections import ConnectionStore
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    path = str(tmp_path / "connections.sqlite")
+    first = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path / "first")))))
+    monkeypatch.setattr(router_database, "db_manager", first)
+    monkeypatch.setattr(router_database, "connections", ConnectionStore(path))
+    monkeypatch.setattr(router_database, "_generation", 0)
+    assert router_database.get_db_manager() is first
+
+    # another worker process connects to a second database
+    ConnectionStore(path).save({"provider": "local", "local_path": str(tmp_path / "second")})
+
+    switched = router_database.get_db_manager()
+    assert switched is not first and switched.config.database.storage.local_path == str(tmp_path / "second")
+    assert router_database.get_db_manager() is switched
+
+
+def test_replaced_manager_is_closed_once_its_users_are_done(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    from routes import router_database
+    from routes.connections import ConnectionStore
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    path = str(tmp_path / "connections.sqlite")
+    first = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path / "first")))))
+    closed = threading.Event()
+    monkeypatch.setattr(first, "close", closed.set)
+    monkeypatch.setattr(router_database, "db_manager", first)
+    monkeypatch.setattr(router_database, "connections", ConnectionStore(path))
+    monkeypatch.setattr(router_database, "_generation", 0)
+
+    async def request(scope, receive, send):
+        # a request (or a stream) that took the manager before the switch
+        assert router_database.get_db_manager() is first
+        ConnectionStore(path).save({"provider": "local", "local_path": str(tmp_path / "second")})
+        with router_database.use_db_manager() as job_manager:
+            assert job_manager is not first
+        assert router_database.get_db_manager() is first
+        assert not closed.wait(0.1)
+
+    asyncio.run(router_database.ManagerLeaseMiddleware(request)({"type": "http"}, None, None))
+    assert closed.wait(5)
+    router_database.get_db_manager().close()
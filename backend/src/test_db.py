@@ -66,5 +66,27 @@ def test_local_db():
     
     return db
 
+def test_add_data_raises_errors(tmp_path):
+    """A failed add reaches the caller instead of looking like an add of no rows"""
+    import pytest
+
+    db = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    with pytest.raises(ValueError):
+        db.add_data("missing", [{"id": 1}], unique_field="id")
+    db.close()
+
+
+def test_update_data_applies_repeated_keys_in_order(tmp_path):
+    """The last row of a key wins, as when every row was its own update, and the key is counted once"""
+    db = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    db.db.create_table("t", data=[{"id": key, "x": 0, "y": 0} for key in ("k1", "k2")])
+    rows = [{"id": "k2", "x": 2}, {"id": "k1", "x": 1, "y": 5}, {"id": "k1", "x": 2}]
+    assert db.update_data("t", rows, unique_field="id") == 2
+    assert sorted(db.get_table("t").to_arrow().to_pylist(), key=lambda row: row["id"]) == [
+        {"id": "k1", "x": 2, "y": 5}, {"id": "k2", "x": 2, "y": 0},
+    ]
+    db.close()
+
+
 if __name__ == "__main__":
     db = test_local_db()
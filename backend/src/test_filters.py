@@ -0,0 +1,36 @@
+import pyarrow as pa
+import pytest
+
+from routes.filters import FilterCompiler, FilterError
+
+SCHEMA = pa.schema([("user_id", pa.string()), ("score", pa.float64()), ("n", pa.int64()), ("created", pa.timestamp("us")), ("my col", pa.string())])
+
+
+def test_compiles_to_index_friendly_predicates():
+    compiler = FilterCompiler(SCHEMA, indexed_columns=["user_id"])
+    keys = {"op": "or", "filters": [
+        {"op": "eq", "column": "user_id", "value": "a"},
+        {"op": "or", "filters": [{"op": "in", "column": "user_id", "values": ["b", "a"]}]},
+        {"op": "is_null", "column": "score"},
+    ]}
+    assert compiler.compile(keys) == "(user_id IN ('a', 'b')) OR (score IS NULL)"
+    assert compiler.compile({"op": "prefix", "column": "user_id", "value": "ab"}) == "user_id >= 'ab' AND user_id < 'ac'"
+    assert compiler.compile({"op": "prefix", "column": "my col", "value": "ab"}) == "starts_with(`my col`, 'ab')"
+    assert compiler.compile({"op": "and", "filters": [
+        {"op": "range", "column": "n", "gte": 1, "lt": 10},
+        {"op": "range", "column": "created", "gte": "2024-01-01T00:00:00+02:00"},
+    ]}) == "(n >= 1 AND n < 10) AND (created >= timestamp '2023-12-31 22:00:00')"
+
+
+def test_values_are_quoted_and_checked_against_the_schema():
+    compiler = FilterCompiler(SCHEMA)
+    assert compiler.compile({"op": "eq", "column": "user_id", "value": "x' OR 1=1 --"}) == "user_id = 'x'' OR 1=1 --'"
+    for bad in (
+        {"op": "eq", "column": "n", "value": "1 OR 1=1"},
+        {"op": "eq", "column": "missing", "value": 1},
+        {"op": "range", "column": "score", "gt": float("nan")},
+        {"op": "prefix", "column": "n", "value": "1"},
+        {"op": "drop", "column": "n"},
+    ):
+        with pytest.raises(FilterError):
+            compiler.compile(bad)
@@ -0,0 +1,62 @@
+
+def test_etag_revalidation_and_version_ttl():
+    from routes.http_cache import VersionCache, encoded_etag, etag_matches, make_etag
+
+    etag = make_etag("t", 3, [("page", "2"), ("per_page", "10")])
+    assert etag == make_etag("t", 3, [("per_page", "10"), ("page", "2")])
+    assert etag != make_etag("t", 4, [("page", "2"), ("per_page", "10")])
+    assert etag_matches(f'"other", {etag[2:]}', etag) and etag_matches("*", etag) and not etag_matches(None, etag)
+    # a client revalidating the compressed body sends the ETag with its coding
+    assert encoded_etag(etag, "zstd") == etag[:-1] + '-zstd"'
+    assert etag_matches(encoded_etag(etag, "gzip"), etag) and etag_matches(etag, encoded_etag(etag, "zstd"))
+    assert not etag_matches(encoded_etag(make_etag("t", 4, []), "gzip"), etag)
+
+    loads = []
+    cache = VersionCache(ttl_seconds=60)
+    assert cache.get("t", lambda: loads.append(1) or 7) == 7
+    assert cache.get("t", lambda: loads.append(1) or 8) == 7 and len(loads) == 1
+    cache.invalidate("t")
+    assert cache.get("t", lambda: loads.append(1) or 8) == 8
+
+
+def test_compression_is_negotiated():
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, Response
+    from fastapi.testclient import TestClient
+    from routes.compression import CompressionMiddleware, choose_encoding
+
+    assert choose_encoding("gzip, zstd;q=0.5") == "zstd"
+    assert choose_encoding("gzip, zstd;q=0") == "gzip"
+    assert choose_encoding("br") is None
+
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/rows")
+    async def rows(n: int):
+        return JSONResponse([{"id": i, "text": "row"} for i in range(n)], headers={"ETag": 'W/"abc"', "Vary": "Origin"})
+
+    @app.get("/unchanged")
+    async def unchanged():
+        return Response(status_code=304, headers={"ETag": 'W/"abc"'})
+
+    @app.get("/image")
+    async def image():
+        return Response(b"x" * 2000, media_type="image/png")
+
+    client = TestClient(app)
+    big = client.get("/rows?n=1000", headers={"Accept-Encoding": "gzip"})
+    assert big.headers["content-encoding"] == "gzip" and len(big.json()) == 1000
+    assert int(big.headers["content-length"]) < len(big.content)  # the client decompressed the body
+    small = client.get("/rows?n=1", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    # the compressed body is another representation with its own ETag, every compressible response varies
+    assert big.headers["etag"] == 'W/"abc-gzip"' and big.headers["vary"] == "Origin, Accept-Encoding"
+    assert small.headers["etag"] == 'W/"abc"' and small.headers["vary"] == "Origin, Accept-Encoding"
+    plain = client.get("/rows?n=1000", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] == 'W/"abc"'
+    assert plain.headers["vary"] == "Origin, Accept-Encoding"
+    assert client.get("/rows?n=1000", headers={"Accept-Encoding": "zstd"}).headers["etag"] == 'W/"abc-zstd"'
+    assert client.get("/unchanged", headers={"Accept-Encoding": "gzip"}).headers["vary"] == "Accept-Encoding"
+    assert "vary" not in client.get("/image", headers={"Accept-Encoding": "gzip"}).headers
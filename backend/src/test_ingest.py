@@ -0,0 +1,45 @@
+import hashlib
+
+import pyarrow as pa
+import pytest
+
+
+SCHEMA = pa.schema([
+    pa.field("id", pa.string()),
+    pa.field("name", pa.string(), nullable=False),
+    pa.field("age", pa.int64()),
+    pa.field("vector", pa.list_(pa.float32(), 2)),
+])
+
+
+def test_prepare_rows_casts_derives_and_deduplicates():
+    from routes.ingest import prepare_rows
+
+    rows = [
+        {"name": "a", "age": "1", "vector": [1, 2]},
+        {"name": "b", "age": 2},
+        {"name": "a", "age": 3},
+    ]
+    table = prepare_rows(rows, SCHEMA, "upsert", "id", {"id": ["name", "age"]})
+    assert table.schema == SCHEMA
+    assert table["id"].to_pylist() == [hashlib.sha256(f"{n}{a}".encode()).hexdigest() for n, a in [("a", 1), ("b", 2), ("a", 3)]]
+
+    table = prepare_rows(rows, SCHEMA, "insert", "id", {"id": ["name"]})
+    assert table["age"].to_pylist() == [1, 2]
+
+    ndjson = b'{"name": "c", "vector": [0.5, 1]}\n{"name": "d"}\n'
+    assert prepare_rows(ndjson, SCHEMA).to_pylist()[0] == {"id": None, "name": "c", "age": None, "vector": [0.5, 1.0]}
+
+
+def test_prepare_rows_reports_every_bad_column():
+    from routes.ingest import IngestError, prepare_rows
+
+    with pytest.raises(IngestError) as e:
+        prepare_rows([{"name": "a", "age": "x", "vector": [1, 2, 3]}], SCHEMA)
+    assert set(e.value.columns) == {"age", "vector"}
+    with pytest.raises(IngestError) as e:
+        prepare_rows([{"age": 1, "extra": 1}], SCHEMA)
+    assert set(e.value.columns) == {"extra"}
+    with pytest.raises(IngestError) as e:
+        prepare_rows([{"age": 1}], SCHEMA)
+    assert set(e.value.columns) == {"name"}
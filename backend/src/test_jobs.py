@@ -0,0 +1,122 @@
+import threading
+import time
+
+
+def _wait(queue, job_id, status):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {job['status']}, expected {status}")
+
+
+def test_jobs_limit_cancel_and_survive_a_restart(tmp_path):
+    from routes.jobs import JobCancelled, JobQueue
+
+    release = threading.Event()
+
+    def count(params, context):
+        for done in range(1, params["rows"] + 1):
+            context.progress(done, params["rows"])
+        release.wait(5)
+        if context.cancelled:
+            raise JobCancelled()
+        return {"rows": params["rows"]}
+
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    queue.register("count", count, limit=1, required=("rows",))
+    queue.start()
+
+    first = queue.submit("count", {"rows": 10})
+    second = queue.submit("count", {"rows": 5})
+    third = queue.submit("count", {"rows": 1})
+    _wait(queue, first["id"], "running")
+    assert queue.get(second["id"])["status"] == "queued"  # one job of the type at a time
+
+    assert queue.cancel(third["id"])["status"] == "cancelled"
+    release.set()
+    finished = _wait(queue, first["id"], "succeeded")
+    assert finished["result"] == {"rows": 10} and finished["progress"] == 1.0
+    _wait(queue, second["id"], "succeeded")
+
+    # a job left running by a crashed process is queued again when resumable, interrupted otherwise
+    release.clear()
+    crashed = queue.submit("count", {"rows": 3})
+    _wait(queue, crashed["id"], "running")
+    restarted = JobQueue(path)
+    restarted.register("count", count, resumable=False)
+    restarted.start()
+    assert restarted.get(crashed["id"])["status"] == "interrupted"
+    assert [job["status"] for job in restarted.list(status="succeeded")] == ["succeeded", "succeeded"]
+    release.set()
+
+
+def test_jobs_limit_spans_processes(tmp_path, monkeypatch):
+    from routes import jobs as jobs_module
+    from routes.jobs import JobQueue
+
+    monkeypatch.setattr(jobs_module, "CANCEL_POLL_SECONDS", 0)
+
+    release = threading.Event()
+    path = str(tmp_path / "jobs.sqlite")
+    queues = [JobQueue(path), JobQueue(path)]  # as two worker processes sharing the database
+    for queue in queues:
+        queue.register("wait", lambda params, context: release.wait(5), limit=1)
+        queue.start()
+
+    jobs = [queue.submit("wait", {}) for queue in queues]
+    assert [queues[0].get(job["id"])["status"] for job in jobs] == ["running", "queued"]
+    # cancelling from the other process is recorded for the one running the job
+    assert queues[1].cancel(jobs[0]["id"])["status"] == "running"
+    assert queues[0]._running[jobs[0]["id"]].cancelled
+    release.set()
+
+
+
+def test_jobs_of_a_gone_host_are_recovered_once_their_lease_expires(tmp_path, monkeypatch):
+    """A recreated container has a new hostname, the jobs of the one it replaced don't hold their slots forever"""
+    from routes import jobs as jobs_module
+    from routes.jobs import JobQueue
+
+    monkeypatch.setattr(jobs_module, "HEARTBEAT_SECONDS", 0.02)
+    monkeypatch.setattr(jobs_module, "LEASE_SECONDS", 0.3)
+    path = str(tmp_path / "jobs.sqlite")
+    setup = JobQueue(path)
+    setup.start()
+    now = time.time()
+    for job_id, job_type, status, heartbeat in (
+        ("stale", "once", "running", now - 3600),
+        ("fresh", "once", "running", now),
+        ("slot", "wait", "running", now - 3600),
+        ("waiting", "wait", "queued", None),
+    ):
+        setup._connection.execute(
+            "INSERT INTO jobs (id, type, params, status, created_at, started_at, owner, heartbeat_at) VALUES (?, ?, '{}', ?, ?, ?, ?, ?)",
+            (job_id, job_type, status, now, now - 3600 if heartbeat else None, "old-container:1" if heartbeat else None, heartbeat),
+        )
+    setup.shutdown()
+
+    queue = JobQueue(path)
+    queue.register("wait", lambda params, context: time.sleep(0.6) or "done", limit=1)
+    queue.register("once", lambda params, context: "done")
+    queue.start()
+    assert queue.get("stale")["status"] == "interrupted"
+    assert queue.get("fresh")["status"] == "running"  # its owner may still be alive
+    assert queue.get("slot")["status"] == "interrupted"
+    _wait(queue, "waiting", "running")  # the slot the lost job held is free again
+    _wait(queue, "fresh", "interrupted")  # recovered by the heartbeat thread once the lease expired
+
+    # another process doesn't take a job over whose lease is renewed, though it runs longer than the lease
+    other = JobQueue(path)
+    other.owner = "new-container:1"
+    other.register("wait", lambda params, context: "done", limit=1)
+    other.start()
+    for _ in range(300):
+        if queue.get("waiting")["status"] != "running":
+            break
+        time.sleep(0.01)
+    assert queue.get("waiting")["status"] == "succeeded"
+    queue.shutdown()
+    other.shutdown()
@@ -0,0 +1,33 @@
+import lancedb
+
+from routes.lookup import take_keys, take_row_ids
+
+
+def test_lookups_keep_the_requested_order(tmp_path):
+    table = lancedb.connect(str(tmp_path)).create_table("t", data=[{"id": i, "name": f"n{i % 3}"} for i in range(10)])
+    table.add([{"id": 10, "name": "n0"}])
+    table.delete("id = 4")
+
+    rows = take_row_ids(table, [(1 << 32), 5, 4, 1], ["id"])
+    assert rows.column("id").to_pylist() == [10, 5, 1]
+
+    rows = take_keys(table, "name", ["n2", "n1", "missing"], ["id"])
+    assert rows.column("name").to_pylist() == ["n2"] * 3 + ["n1"] * 2
+    assert take_row_ids(table, [], ["id"]).num_rows == 0
+
+
+def test_similar_rows_search_with_stored_vectors(tmp_path):
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path / "db")))))
+    manager.db.create_table("t", data=[{"id": f"k{i}", "vector": [float(i), 0.0]} for i in range(20)])
+    manager._get_embedder = None  # no embedding call is made
+
+    result = manager.similar_rows("t", key="id", values=["k5", "k6", "missing"], limit=3, columns_to_exclude=["vector"])
+    assert result["missing"] == ["missing"]
+    ids = result["data"]["id"].tolist()
+    assert set(ids[:2]) == {"k4", "k7"} and ids[2] in ("k3", "k8")  # the seeds are left out
+    assert result["data"]["_distance"].tolist() == [1.0, 1.0, 4.0]
+    assert manager.similar_rows("t", row_ids=[0], limit=2)["data"]["id"].tolist() == ["k1", "k2"]
@@ -0,0 +1,48 @@
+import re
+
+
+def _samples(text: str, name: str, route: str):
+    """The samples of a metric for one route, as {suffix and le: value}"""
+    found = {}
+    pattern = re.compile(rf'^{name}(_bucket|_sum|_count)\{{method="GET",route="{re.escape(route)}",status="200"(?:,le="([^"]+)")?\}} (\S+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            suffix, le, value = match.groups()
+            found[(suffix, le)] = float(value)
+    return found
+
+
+def test_metrics_label_requests_by_route_template(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from routes import router_database
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    monkeypatch.setattr(router_database, "db_manager", manager)
+    manager.db.create_table("t", data=[{"user_id": str(i), "v": i} for i in range(5)])
+    name, route = "lancedb_http_request_duration_seconds", "/api/fetch-data/{table}/"
+
+    with TestClient(main.app) as client:
+        before = _samples(client.get("/metrics").text, name, route)
+        for _ in range(2):
+            assert client.get("/api/fetch-data/t/").status_code == 200
+        response = client.get("/metrics")
+    manager.close()
+
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert f"# HELP {name} Latency of HTTP requests by route template." in text
+    assert f"# TYPE {name} histogram" in text
+    assert "# TYPE lancedb_http_response_bytes_total counter" in text
+    assert 'route="/api/fetch-data/t/"' not in text  # the raw path would make a series per table
+
+    after = _samples(text, name, route)
+    buckets = [value for (suffix, le), value in after.items() if suffix == "_bucket" and le != "+Inf"]
+    assert buckets == sorted(buckets)  # cumulative
+    assert after[("_bucket", "+Inf")] == after[("_count", None)] >= buckets[-1]
+    assert after[("_count", None)] - before.get(("_count", None), 0) == 2
+    assert after[("_sum", None)] > before.get(("_sum", None), 0)
@@ -0,0 +1,36 @@
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from routes.near_duplicates import find_clusters, vector_index_metric
+
+
+def _table(path):
+    vectors = np.random.default_rng(0).normal(size=(50, 8)).astype(np.float32)
+    vectors[1] = vectors[0] * 3  # same direction, another length
+    vectors[40] = vectors[0] + 0.001
+    vectors[7] = vectors[6] + 0.001
+    column = pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), 8)
+    table = lancedb.connect(str(path)).create_table("t", pa.table({"vector": column}))
+    table.add(pa.table({"vector": pa.nulls(2, column.type)}))
+    return table
+
+
+def test_blocked_products_find_clusters_across_blocks(tmp_path):
+    table = _table(tmp_path)
+    progress = []
+    clusters = find_clusters(table, "vector", 0.999, block_rows=16, on_progress=lambda done, total: progress.append((done, total)))
+    assert clusters == [[0, 1, 40], [6, 7]]
+    assert progress[-1] == (50 * 49 // 2, 50 * 49 // 2)
+    assert find_clusters(table, "vector", 0.999, block_rows=16, should_stop=lambda: True) is None
+
+
+def test_cosine_index_finds_the_same_clusters(tmp_path):
+    table = _table(tmp_path)
+    table.create_index(metric="cosine", vector_column_name="vector", index_type="IVF_FLAT", num_partitions=2)
+    assert vector_index_metric(table, "vector") == "cosine"
+
+    progress = []
+    clusters = find_clusters(table, "vector", 0.999, neighbors=3, block_rows=16, on_progress=lambda done, total: progress.append((done, total)))
+    assert clusters == [[0, 1, 40], [6, 7]]
+    assert progress[-1] == (50, 50)  # rows searched
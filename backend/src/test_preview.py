@@ -0,0 +1,19 @@
+import pyarrow as pa
+
+
+def test_preview_cuts_long_values_only():
+    from routes.preview import preview_rows
+
+    table = pa.table({
+        "text": ["short", "é" * 10, None],
+        "blob": [b"ab", b"x" * 10, None],
+        "vector": pa.array([[3.0, 4.0, 0.0], [0.0, 0.0, 1.0], None], pa.list_(pa.float32(), 3)),
+    })
+    rows = preview_rows(table, max_bytes=5, vector_values=2)
+
+    assert rows[0]["text"] == "short" and rows[2]["text"] is None
+    assert rows[1]["text"] == {"_truncated": True, "bytes": 20, "preview": "éé"}
+    assert rows[0]["blob"] == "YWI=" and rows[1]["blob"]["bytes"] == 10 and rows[1]["blob"]["_truncated"]
+    assert rows[0]["vector"] == {"_truncated": True, "dims": 3, "norm": 5.0, "head": [3.0, 4.0]}
+    assert rows[2]["vector"] is None
+    assert preview_rows(table, vector_values=3)[1]["vector"] == [0.0, 0.0, 1.0]
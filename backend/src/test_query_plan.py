@@ -0,0 +1,73 @@
+from routes.query_plan import parse_plan, summarize_plan
+
+PREFILTERED_ANN_PLAN = """AnalyzeExec verbose=true, metrics=[], cumulative_cpu=2.121955ms
+  TracedExec, metrics=[], cumulative_cpu=2.121955ms
+    ProjectionExec: expr=[id@2 as id, _distance@0 as _distance], metrics=[output_rows=3, elapsed_compute=1.062µs], cumulative_cpu=2.121955ms
+      Take: columns="_distance, _rowid, (id)", metrics=[output_rows=3, elapsed_compute=74.426µs, batches_processed=1, bytes_read=120, iops=1, requests=1], cumulative_cpu=2.120893ms
+        SortExec: TopK(fetch=3), expr=[_distance@0 ASC NULLS LAST], metrics=[output_rows=3, elapsed_compute=99.664µs, row_replacements=5], cumulative_cpu=2.042687ms
+          ANNSubIndex: name=vector_idx, k=3, deltas=1, metrics=[output_rows=12, elapsed_compute=1.505964ms, index_comparisons=5000, partitions_searched=4], cumulative_cpu=1.943023ms
+            ANNIvfPartition: uuid=f42e0e3d, minimum_nprobes=20, deltas=1, metrics=[output_rows=1, elapsed_compute=131.782µs, partitions_ranked=4], cumulative_cpu=131.782µs
+            ScalarIndexQuery: query=[cat = c1]@cat_idx, metrics=[output_rows=2, elapsed_compute=305.277µs, index_comparisons=4096], cumulative_cpu=305.277µs
+"""
+
+POSTFILTERED_SCAN_PLAN = """ProjectionExec: expr=[id@3 as id, _distance@0 as _distance]
+  GlobalLimitExec: skip=0, fetch=3
+    FilterExec: cat@2 = c1
+      FilterExec: _distance@2 IS NOT NULL
+        KNNVectorDistance: metric=l2
+          LanceRead: uri=t.lance/data, projection=[vector], num_fragments=2, full_filter=--, refine_filter=--
+"""
+
+
+def test_prefiltered_ann_plan_is_summarized_with_totals():
+    nodes = parse_plan(PREFILTERED_ANN_PLAN)
+    assert nodes[5]["operator"] == "ANNSubIndex"
+    assert nodes[5]["metrics"]["elapsed_compute_ms"] == 1.505964
+
+    summary = summarize_plan(nodes)
+    assert summary["access_path"] == "ann_index"
+    assert summary["scalar_indices_used"] == ["cat_idx"]
+    assert summary["prefilter"] is True
+    assert summary["index_comparisons"] == 9096
+    assert summary["bytes_read"] == 120
+    assert [stage["operator"] for stage in summary["stages"]][-1] == "ScalarIndexQuery"
+
+
+def test_explain_plan_of_postfiltered_flat_search():
+    summary = summarize_plan(parse_plan(POSTFILTERED_SCAN_PLAN))
+    assert summary["access_path"] == "flat_knn"
+    assert summary["prefilter"] is False
+    assert summary["analyzed"] is False
+    assert "rows_scanned" not in summary
+
+
+def test_explain_of_a_sorted_fetch_reports_the_sort_path(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from routes import router_database
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    monkeypatch.setattr(router_database, "db_manager", manager)
+    table = manager.db.create_table("t", data=[{"id": i, "score": i % 7} for i in range(50)])
+    table.add([{"id": 50, "score": 3}])
+    body = {"table": "t", "order_by": "score:desc", "filter": "id > 3", "page": 2, "per_page": 10}
+
+    with TestClient(main.app) as client:
+        explained = client.post("/api/explain/", json=body).json()
+        assert explained["sort"] == {"path": "top_k", "depth": 20}
+        assert "score" in explained["plan"] and explained["version"] == table.version
+        assert client.post("/api/explain/", json={**body, "sort_cache": True}).json()["sort"]["path"] == "permutation_build"
+
+        manager.fetch_data("t", page=2, per_page=10, filter="id > 3", order_by="score:desc", sort_cache=True)
+        assert client.post("/api/explain/", json=body).json()["sort"]["path"] == "permutation_cache_hit"
+        # the permutation is per version, the first one has none
+        older = client.post("/api/explain/", json={**body, "version": 1}).json()
+        assert older["version"] == 1 and older["sort"]["path"] == "top_k"
+
+        assert client.post("/api/explain/", json={**body, "order_by": "missing"}).status_code == 400
+        assert client.post("/api/explain/", json={**body, "version": 99}).status_code == 400
+        assert client.post("/api/explain/", json={"table": "t", "kind": "search", "query": "q", "rerank": "nope"}).status_code == 400
+    manager.close()
@@ -0,0 +1,43 @@
+import numpy as np
+import pyarrow as pa
+
+
+def test_mmr_skips_near_copies():
+    from routes.rerank import rerank
+
+    vectors = [[1.0, 0.01], [1.0, 0.02], [1.0, 0.03], [1.0, 0.5], [1.0, -0.5]]
+    candidates = pa.table({"id": list("abcde"), "vector": pa.array(vectors, pa.list_(pa.float32(), 2))})
+    query = np.array([1.0, 0.0])
+
+    assert rerank("cosine", query, candidates, "vector", 3).column("id").to_pylist() == ["a", "b", "c"]
+    assert rerank("mmr", query, candidates, "vector", 3, {"diversity": 0}).column("id").to_pylist() == ["a", "b", "c"]
+    assert rerank("mmr", query, candidates, "vector", 3, {"diversity": 0.7}).column("id").to_pylist() == ["a", "e", "d"]
+    assert rerank("mmr", query, candidates, "vector", 10).num_rows == 5
+
+
+def test_search_and_rerank_use_the_given_vector_column(tmp_path, monkeypatch):
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    class QueryEmbedder:
+        def generate_embeddings(self, texts):
+            return [[1.0, 0.0] for _ in texts]
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    monkeypatch.setattr(manager, "_get_embedder", QueryEmbedder)
+    vector_type = pa.list_(pa.float32(), 2)
+    manager.db.create_table("t", pa.table({
+        "id": list("abc"),
+        "vector": pa.array([[0.0, 1.0], [0.5, 0.5], [1.0, 0.0]], vector_type),
+        "title_vector": pa.array([[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]], vector_type),
+    }))
+
+    for rerank_with in (None, "cosine"):
+        results = manager.vector_search(
+            "t", "query", limit=1, as_pandas=False, columns_to_exclude=["vector", "title_vector"],
+            rerank_with=rerank_with, vector_column="title_vector",
+        )
+        assert [row["id"] for row in results] == ["a"]
+        assert manager.vector_search("t", "query", limit=1, as_pandas=False, rerank_with=rerank_with)[0]["id"] == "c"
+    manager.close()
@@ -0,0 +1,26 @@
+from collections import Counter
+
+import lancedb
+
+from routes.sampling import _allocate, sample_rows
+
+
+def test_samples_are_seeded_and_stratified(tmp_path):
+    table = lancedb.connect(str(tmp_path)).create_table(
+        "t", data=[{"id": i, "cat": "a" if i < 90 else ("b" if i < 98 else None)} for i in range(100)]
+    )
+    table.delete("id = 0")
+
+    first = sample_rows(table, 10, seed=3, columns=["id"])
+    assert first["matched"] == 99 and first["rows"].num_rows == 10
+    assert first["rows"].equals(sample_rows(table, 10, seed=3, columns=["id"])["rows"])
+    assert 0 not in first["rows"].column("id").to_pylist()
+
+    equal = sample_rows(table, 6, seed=3, columns=["id", "cat"], stratify_by="cat", allocation="equal")
+    assert Counter(equal["rows"].column("cat").to_pylist()) == {"a": 2, "b": 2, None: 2}
+    # the rows the smaller strata don't have go to the larger ones
+    equal = sample_rows(table, 20, seed=3, columns=["id", "cat"], stratify_by="cat", allocation="equal")
+    assert Counter(equal["rows"].column("cat").to_pylist()) == {"a": 10, "b": 8, None: 2}
+    assert _allocate({"x": 7, "y": 2}, 10, "equal") == {"x": 7, "y": 2}
+    proportional = sample_rows(table, 10, seed=3, columns=["id", "cat"], filter="id >= 50", stratify_by="cat")
+    assert {s["value"]: s["sampled"] for s in proportional["strata"]} == {"a": 8, "b": 2, None: 0}
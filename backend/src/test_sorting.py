@@ -0,0 +1,62 @@
+import random
+
+import pyarrow as pa
+import pytest
+
+from routes.filters import FilterError
+from routes.sorting import SortCache, parse_order_by, sorted_row_ids, top_k
+
+
+def test_streaming_top_k_matches_a_full_sort():
+    random.seed(7)
+    table = pa.table({
+        "score": [random.randint(0, 20) for _ in range(3000)],
+        "name": [random.choice(["a", "b", None]) for _ in range(3000)],
+        "_rowid": pa.array(range(3000), pa.uint64()),
+    })
+    sort_keys = parse_order_by("score:desc, name", table.schema)
+    assert sort_keys == [("score", "descending"), ("name", "ascending"), ("_rowid", "ascending")]
+
+    expected = sorted_row_ids(table.to_batches(max_chunksize=1000), sort_keys).to_pylist()
+    best = top_k(table.to_batches(max_chunksize=256), sort_keys, 50)
+    assert best.column("_rowid").to_pylist() == expected[:50]
+    assert top_k([], sort_keys, 10) is None
+
+    with pytest.raises(FilterError):
+        parse_order_by("missing", table.schema)
+
+
+def test_sort_cache_evicts_least_recently_used():
+    cache = SortCache(max_bytes=2 * 8 * 100)
+    permutation = pa.array(range(100), pa.uint64())
+    cache.put(("t", 1, None, ()), permutation)
+    cache.put(("t", 2, None, ()), permutation)
+    assert cache.get(("t", 1, None, ())) is not None
+    cache.put(("u", 1, None, ()), permutation)
+    assert cache.get(("t", 2, None, ())) is None
+    cache.invalidate("t")
+    assert cache.get(("t", 1, None, ())) is None and cache.get(("u", 1, None, ())) is not None
+
+
+def test_rows_with_a_null_first_key_are_kept(tmp_path):
+    table = pa.table({
+        "score": [None if i % 5 == 0 else i for i in range(100)],
+        "_rowid": pa.array(range(100), pa.uint64()),
+    })
+    for order_by in ("score", "score:desc"):
+        sort_keys = parse_order_by(order_by, table.schema)
+        expected = sorted_row_ids(table.to_batches(max_chunksize=30), sort_keys).to_pylist()
+        # deeper than the 80 rows with a score, the nulls come last
+        assert top_k(table.to_batches(max_chunksize=30), sort_keys, 90).column("_rowid").to_pylist() == expected[:90]
+
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.provider import StorageConfig
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=StorageConfig(provider="local", local_path=str(tmp_path)))))
+    manager.db.create_table("t", data=[{"id": i, "score": None if i % 5 == 0 else i} for i in range(100)])
+    page = manager.fetch_data("t", as_pandas=False, page=9, per_page=10, order_by="score")
+    assert [row["id"] for row in page] == list(range(0, 50, 5))
+    cached = manager.fetch_data("t", as_pandas=False, page=9, per_page=10, order_by="score", sort_cache=True)
+    assert [row["id"] for row in cached] == [row["id"] for row in page]
+    manager.close()
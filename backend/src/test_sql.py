@@ -0,0 +1,29 @@
+import lancedb
+import pytest
+
+from routes.sql import SqlError, SqlLimits, SqlQuery
+
+pytest.importorskip("duckdb")
+
+
+def test_sql_joins_tables_and_stops_at_the_row_limit(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    db.create_table("events", data=[{"user_id": i % 3, "n": i} for i in range(100)])
+    db.create_table("users", data=[{"user_id": i, "name": f"user {i}"} for i in range(3)])
+
+    def open_datasets(names):
+        return {name: db.open_table(name).to_lance() for name in names}
+
+    query = SqlQuery(
+        "SELECT name, count(*) AS events FROM events JOIN users USING (user_id) GROUP BY name ORDER BY name",
+        open_datasets, ["events", "users"], SqlLimits(max_rows=2),
+    )
+    query.start()
+    batch = query.next_batch()
+    assert batch.to_pylist() == [{"name": "user 0", "events": 34}, {"name": "user 1", "events": 33}]
+    assert query.next_batch() is None and query.truncated
+    query.close()
+
+    for sql in ("DROP TABLE users", "SELECT 1; SELECT 2", "SELECT * FROM read_csv('/etc/passwd')"):
+        with pytest.raises(SqlError):
+            SqlQuery(sql, open_datasets, ["events", "users"]).start()
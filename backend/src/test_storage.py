@@ -0,0 +1,138 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from storage.credentials import CredentialCache
+from storage.provider import LocalStorageProvider, StorageConfig, create_storage_provider
+
+
+def test_credentials_are_cached_until_close_to_expiry():
+    """The same options are returned while valid, and refreshed once within the margin of expiry"""
+    expires = {"at": time.time() + 3600}
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"token": f"token-{len(calls)}"}, expires["at"]
+
+    cache = CredentialCache(fetch, refresh_margin=300)
+    first = cache.get()
+    assert cache.get() is first
+    assert cache.refresh_count == 1
+
+    cache._expires_at = time.time() + 100  # the current token is within the refresh margin
+    refreshed = cache.get()
+    assert refreshed is not first
+    assert refreshed["token"] == "token-2"
+    assert cache.get() is refreshed
+    assert cache.refresh_count == 2
+
+
+def test_static_credentials_never_refresh():
+    cache = CredentialCache(lambda: ({"key": "value"}, None))
+    assert cache.get() is cache.get()
+    assert cache.refresh_count == 1
+
+
+def test_s3_compatible_endpoint():
+    """Create, write and read a table on a local S3 stand-in through the storage options"""
+    pytest.importorskip("moto")
+    from moto.server import ThreadedMotoServer
+    import boto3
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+        boto3.client(
+            "s3", endpoint_url=endpoint, region_name="us-east-1",
+            aws_access_key_id="testing", aws_secret_access_key="testing",
+        ).create_bucket(Bucket="lancedb-test")
+
+        config = StorageConfig(provider="s3", credentials={
+            "bucket": "lancedb-test", "endpoint": endpoint, "region": "us-east-1",
+            "access_key": "testing", "secret_key": "testing",
+        }, tuning={"timeout": "10s", "max_retries": 2})
+        provider = create_storage_provider(config)
+        options = provider.get_storage_options()
+        assert options["allow_http"] == "true"
+        assert options["client_max_retries"] == "2"
+        assert provider.validate_connection()
+
+        manager = LanceDBManager(AppConfig(database=DatabaseConfig(storage=config)))
+        manager.db.create_table("items", data=[{"id": 1, "text": "hello"}, {"id": 2, "text": "world"}])
+        rows = manager.fetch_data("items", page=1, per_page=10)
+        assert sorted(rows["id"]) == [1, 2]
+        manager.close()
+    finally:
+        server.stop()
+
+
+class DirectoryProvider(LocalStorageProvider):
+    """Serves a local directory through the object listing interface of the remote providers"""
+
+    def list_objects(self, prefix):
+        for root, _, names in os.walk(os.path.join(self.path, prefix)):
+            for name in names:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.path).replace(os.sep, "/"), os.path.getsize(path)
+
+    def download(self, key, path):
+        shutil.copyfile(os.path.join(self.path, key), path)
+
+
+def test_disk_cache_mirrors_tables_and_sees_writes(tmp_path):
+    from routes.manager import LanceDBManager
+    from routes.setup import AppConfig, DatabaseConfig
+    from storage.cache import TableDiskCache
+
+    manager = LanceDBManager(AppConfig(database=DatabaseConfig(
+        storage=StorageConfig(provider="local", local_path=str(tmp_path / "remote"))
+    )))
+    manager.storage = DirectoryProvider(StorageConfig(provider="local", local_path=str(tmp_path / "remote")))
+    cache = manager.storage.cache = TableDiskCache(manager.storage, str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+    manager.db.create_table("items", data=[{"user_id": str(i), "score": float(i)} for i in range(100)])
+
+    assert len(manager.fetch_data("items", per_page=-1)) == 100  # not mirrored yet, read remotely
+    assert cache.sync("items")
+    assert len(manager.fetch_data("items", per_page=-1)) == 100  # read from the mirror
+    stats = cache.stats()
+    assert (stats["remote_reads"], stats["disk_reads"]) == (1, 1)
+    assert stats["tables"]["items"]["ready"]
+
+    manager.add_data("items", [{"user_id": "new", "score": 1.0}], unique_field="user_id")
+    assert len(manager.fetch_data("items", per_page=-1)) == 101  # invalidated, read remotely again
+    cache.sync("items")
+    assert len(manager.fetch_data("items", per_page=-1)) == 101
+    stats = cache.stats()
+    assert stats["bytes_saved"] > 0  # the files of the first version were not downloaded again
+    assert stats["hit_ratio"] == 0.5
+
+    cache.max_bytes = stats["cached_bytes"] * 2 + 1  # room for one more table of the same size
+    manager.db.create_table("other", data=[{"user_id": str(i), "score": float(i)} for i in range(100)])
+    manager.db.create_table("third", data=[{"user_id": str(i), "score": float(i)} for i in range(100)])
+    cache.sync("other")
+    cache.sync("third")
+    assert set(cache.stats()["tables"]) == {"other", "third"}  # items was read least recently
+    assert cache.stats()["evictions"] == 1
+    manager.close()
+
+
+def test_disk_caches_sharing_a_directory_use_their_own_slots(tmp_path):
+    from storage.cache import TableDiskCache
+
+    provider = DirectoryProvider(StorageConfig(provider="local", local_path=str(tmp_path / "remote")))
+    first = TableDiskCache(provider, str(tmp_path / "cache"), max_bytes=1024)
+    second = TableDiskCache(provider, str(tmp_path / "cache"), max_bytes=1024)
+    assert (first.directory, second.directory) == (str(tmp_path / "cache" / "worker-0"), str(tmp_path / "cache" / "worker-1"))
+    first.close()
+    # a restarted worker takes the free slot, with the mirrors in it
+    third = TableDiskCache(provider, str(tmp_path / "cache"), max_bytes=1024)
+    assert third.directory == first.directory
+    second.close()
+    third.close()
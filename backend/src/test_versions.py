@@ -0,0 +1,24 @@
+import lancedb
+
+from routes.version_diff import diff_versions
+
+
+def test_diff_reads_only_changed_fragments(tmp_path):
+    """Appends, deletes and updates between two versions are reported per row, unchanged fragments are skipped"""
+    table = lancedb.connect(str(tmp_path)).create_table("t", data=[{"user_id": str(i), "v": i} for i in range(10)])
+    table.add([{"user_id": str(i), "v": i} for i in range(10, 20)])
+    start = table.version
+    table.add([{"user_id": "new", "v": 0}])
+    table.delete("user_id = '3'")
+    table.update(values={"v": -5}, where="user_id = '5'")
+
+    dataset = table.to_lance()
+    diff = diff_versions(dataset.checkout_version(start), dataset, key="user_id")
+    assert diff["fragments"]["unchanged"] == 1  # the second fragment was never touched
+    assert diff["rows"] == {"before": 20, "after": 20, "added": 1, "deleted": 1, "updated": 1}
+    assert diff["added"] == [{"user_id": "new", "v": 0}]
+    assert diff["deleted"] == [{"user_id": "3", "v": 3}]
+    assert diff["updated"] == [{"before": {"user_id": "5", "v": 5}, "after": {"user_id": "5", "v": -5}}]
+
+    # without a key an update is a deleted and an added row
+    assert diff_versions(dataset.checkout_version(start), dataset)["rows"]["deleted"] == 2
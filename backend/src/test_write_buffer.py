@@ -0,0 +1,20 @@
+def test_write_buffer_coalesces_and_deduplicates():
+    from routes.setup import WriteBufferConfig
+    from routes.write_buffer import TableWriteBuffer
+
+    commits = []
+
+    def write(rows):
+        commits.append(rows)
+        return {row["id"] for row in rows if row["id"] != "existing"}
+
+    buffer = TableWriteBuffer("t", "id", write, WriteBufferConfig(tables=("t",), max_rows=4, max_delay_seconds=60))
+    first = buffer.append([{"id": "a"}, {"id": "b"}, {"id": "existing"}])
+    second = buffer.append([{"id": "b", "v": 2}, {"id": "c"}])  # b is already buffered
+    assert first.result(5) == 2 and second.result(5) == 1
+    assert [[row["id"] for row in rows] for rows in commits] == [["a", "b", "existing", "c"]]
+
+    late = buffer.append([{"id": "d"}])
+    assert not late.done()  # below both thresholds
+    buffer.close()
+    assert late.result(5) == 1 and len(commits) == 2